@@ -0,0 +1,640 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import inspect
+import json
+import os
+import ssl
+import threading
+import logging
+from dotenv import dotenv_values
+from typing import Callable, Optional, Dict, Any, AsyncIterator, Tuple, Union
+from connection_state_store import ConnectionStateStore, WriteBehindStateWriter
+from message_router import MessageRouter
+from reconnect_policy import ReconnectPolicy, CIRCUIT_OPEN
+from heartbeat import Heartbeat, ACTION_PING, ACTION_DEAD
+from websocket_client_connector import DEFAULT_DEVICE_NAME, DEFAULT_WS_URL
+from compact_protocol import PROTOCOL_JSON, supported_protocols, is_compact, encode_message, decode_message
+from ws_protocol import (
+    OPCODE_CONTINUATION, OPCODE_TEXT, OPCODE_CLOSE, OPCODE_PING, OPCODE_PONG,
+    CLOSE_NORMAL, CLOSE_GOING_AWAY, CLOSE_PROTOCOL_ERROR, CLOSE_INVALID_PAYLOAD, CLOSE_MESSAGE_TOO_BIG,
+    DEFAULT_MAX_FRAME_SIZE, DEFAULT_COMPRESSION_THRESHOLD,
+    WebSocketProtocolError, PerMessageDeflate, parse_ws_url, create_handshake_key, compute_accept_key, build_client_handshake,
+    parse_http_head, encode_frame, encode_close_payload, decode_close_payload, read_frame
+)
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+class AsyncWebSocketClient:
+    def __init__(self, device_name: str = DEFAULT_DEVICE_NAME, ws_url: str = DEFAULT_WS_URL,
+                 state_writer: Optional[WriteBehindStateWriter] = None,
+                 heartbeat: Optional[Heartbeat] = None, reconnect_delay: float = 5,
+                 max_connection_attempts: int = 5, open_timeout: float = 10, close_timeout: float = 2,
+                 max_size: int = DEFAULT_MAX_FRAME_SIZE, subscriber_queue_size: int = 1000,
+                 reconnect_policy: Optional[ReconnectPolicy] = None, compression: bool = False,
+                 compression_threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+                 compression_context_takeover: bool = True, compact_protocol: bool = False):
+        self.device_name = device_name
+        self.ws_url = ws_url
+        self.state_writer = state_writer
+        self.heartbeat = heartbeat or Heartbeat()
+        self.reconnect_policy = reconnect_policy or ReconnectPolicy(
+            base_delay=reconnect_delay,
+            failure_threshold=max_connection_attempts
+        )
+        self.open_timeout = open_timeout
+        self.close_timeout = close_timeout
+        self.max_size = max_size
+        self.subscriber_queue_size = subscriber_queue_size
+        # permessage-deflate is offered on every handshake; servers that decline it get plain frames
+        self.deflate: Optional[PerMessageDeflate] = None
+        if compression:
+            self.deflate = PerMessageDeflate(True, compression_threshold, compression_context_takeover)
+
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.run_task: Optional[asyncio.Task] = None
+        self.ping_task: Optional[asyncio.Task] = None
+        self.write_lock = asyncio.Lock()
+        self.connected_event = asyncio.Event()
+        self.closed_event = asyncio.Event()
+
+        self.is_running = False
+        self.connected = False
+        self.reconnect_requested = False
+        self.connection_id: Optional[str] = None
+        self.server_registered = False
+        self.compact_protocol = compact_protocol
+        self.wire_protocol = PROTOCOL_JSON
+        self.close_status: Tuple[Optional[int], str] = (None, "")
+
+        self.status_callbacks: list[Callable] = []
+        self.status_subscribers: list[asyncio.Queue] = []
+        self.message_subscribers: list[asyncio.Queue] = []
+
+        self.router = MessageRouter()
+        self.router.register("Save to Database", self._handle_save_to_database)
+        self.router.set_wildcard(self._handle_unhandled_message)
+
+        self.logger = logging.getLogger(__name__)
+
+    async def connect(self, timeout: Optional[float] = None) -> bool:
+        if self.is_running:
+            return self.connected
+
+        self.is_running = True
+        self.run_task = asyncio.create_task(self._run())
+
+        try:
+            await asyncio.wait_for(self.connected_event.wait(), timeout or self.open_timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.logger.warning(f"Initial connection for {self.device_name} not established yet")
+            return False
+
+    async def disconnect(self):
+        self.is_running = False
+        await self._close_transport(CLOSE_NORMAL)
+
+        if self.run_task:
+            self.run_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.run_task
+            self.run_task = None
+
+    async def reconnect(self):
+        if not self.is_running:
+            await self.connect()
+            return
+
+        self.reconnect_requested = True
+        await self._close_transport(CLOSE_GOING_AWAY)
+
+    async def send_message(self, message: Dict[str, Any]) -> bool:
+        if not self.connected:
+            self.logger.warning("Cannot send message - WebSocket not connected")
+            return False
+
+        try:
+            frame = encode_message(message, self.wire_protocol).encode("utf-8")
+            await self._write_frame(OPCODE_TEXT, frame, compress=True)
+            self.logger.debug("Message sent: %s", message)
+            return True
+        except (ConnectionError, OSError) as e:
+            self.logger.error(f"Error sending message: {e}")
+            return False
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def add_status_listener(self, callback: Callable[[str, Any], Any]):
+        self.status_callbacks.append(callback)
+
+    def remove_status_listener(self, callback: Callable[[str, Any], Any]):
+        if callback in self.status_callbacks:
+            self.status_callbacks.remove(callback)
+
+    def add_message_handler(self, message_type: str, handler: Callable[[Dict[str, Any]], Any]):
+        self.router.register(message_type, handler)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "connected": self.connected,
+            "running": self.is_running,
+            "connection_attempts": self.reconnect_policy.attempts,
+            "device_name": self.device_name,
+            "connection_id": self.connection_id,
+            "reconnect_policy": self.reconnect_policy.get_state(),
+            "heartbeat": self.heartbeat.get_state(),
+            "compression": self.deflate.get_metrics() if self.deflate else None,
+            "wire_protocol": self.wire_protocol
+        }
+
+    async def status_events(self) -> AsyncIterator[Tuple[str, Any]]:
+        subscriber = asyncio.Queue(maxsize=self.subscriber_queue_size)
+        self.status_subscribers.append(subscriber)
+        try:
+            while True:
+                yield await subscriber.get()
+        finally:
+            self.status_subscribers.remove(subscriber)
+
+    async def messages(self) -> AsyncIterator[Union[str, bytes]]:
+        subscriber = asyncio.Queue(maxsize=self.subscriber_queue_size)
+        self.message_subscribers.append(subscriber)
+        try:
+            while True:
+                yield await subscriber.get()
+        finally:
+            self.message_subscribers.remove(subscriber)
+
+    def __aiter__(self):
+        return self.messages()
+
+    async def _run(self):
+        while self.is_running:
+            try:
+                await self._open()
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, WebSocketProtocolError) as e:
+                self.logger.error(f"WebSocket error: {e}")
+                await self._notify_status("error", e)
+            except Exception as e:
+                # Anything unexpected still has to end in the reconnect path, never in a dead task
+                self.logger.exception(f"Unexpected error while connecting: {e}")
+                await self._notify_status("error", e)
+            else:
+                try:
+                    await self._receive_loop()
+                except (OSError, asyncio.IncompleteReadError, WebSocketProtocolError) as e:
+                    self.logger.error(f"WebSocket error: {e}")
+                    await self._notify_status("error", e)
+                except Exception as e:
+                    self.logger.exception(f"Unexpected error in receive loop: {e}")
+                    await self._notify_status("error", e)
+                finally:
+                    await self._handle_close()
+
+            if not self.is_running:
+                break
+
+            if self.reconnect_requested:
+                self.reconnect_requested = False
+                continue
+
+            was_open = self.reconnect_policy.state == CIRCUIT_OPEN
+            delay = self.reconnect_policy.next_delay()
+            attempts = self.reconnect_policy.attempts
+
+            if self.reconnect_policy.state == CIRCUIT_OPEN and not was_open:
+                self.logger.error(f"Reconnect circuit opened after {attempts - 1} failed attempts")
+                await self._notify_status("circuit_open", self.reconnect_policy.get_state())
+
+            self.logger.info(f"Scheduling reconnect attempt {attempts} in {delay:.1f} seconds")
+            await asyncio.sleep(delay)
+            self.reconnect_policy.on_attempt()
+
+    async def _open(self):
+        host, port, path, use_ssl = parse_ws_url(self.ws_url)
+        self.logger.info(f"Connecting to WebSocket: {self.ws_url}")
+
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                host, port,
+                ssl=ssl.create_default_context() if use_ssl else None,
+                server_hostname=host if use_ssl else None
+            ),
+            self.open_timeout
+        )
+
+        try:
+            key = create_handshake_key()
+            extra_headers = {"Sec-WebSocket-Extensions": self.deflate.offer()} if self.deflate else None
+            writer.write(build_client_handshake(host, port, path, key, extra_headers))
+            await writer.drain()
+
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.open_timeout)
+            status_line, headers = parse_http_head(head)
+            if status_line.split(" ")[1:2] != ["101"]:
+                raise WebSocketProtocolError(f"Handshake rejected: {status_line}")
+            if headers.get("sec-websocket-accept") != compute_accept_key(key):
+                raise WebSocketProtocolError("Handshake returned an invalid Sec-WebSocket-Accept")
+
+            extensions = headers.get("sec-websocket-extensions")
+            if self.deflate:
+                if self.deflate.accept_response(extensions):
+                    self.logger.info("permessage-deflate negotiated")
+                else:
+                    self.logger.info("Server declined permessage-deflate - sending uncompressed frames")
+            elif extensions:
+                raise WebSocketProtocolError(f"Server negotiated extensions that were not offered: {extensions}")
+
+        except BaseException:
+            writer.close()
+            raise
+
+        self.reader = reader
+        self.writer = writer
+        self.connected = True
+        self.reconnect_policy.record_success()
+        self.close_status = (None, "")
+        self.closed_event.clear()
+        self.connected_event.set()
+        self.heartbeat.reset()
+
+        await self._on_open()
+        self.ping_task = asyncio.create_task(self._ping_loop())
+
+    async def _on_open(self):
+        self.logger.info("WebSocket connection opened")
+        self.wire_protocol = PROTOCOL_JSON
+
+        registration_msg = {
+            "action": "register_device",
+            "message": "Connection Established",
+            "device_name": self.device_name
+        }
+        if self.compact_protocol:
+            registration_msg["protocols"] = supported_protocols()
+
+        if await self.send_message(registration_msg):
+            self.logger.info(f"Device registration sent for: {self.device_name}")
+
+        await self._notify_status("connected", None)
+
+    async def _fail_connection(self, code: int, reason: str):
+        self.close_status = (code, reason)
+        with contextlib.suppress(ConnectionError, OSError):
+            await self._write_frame(OPCODE_CLOSE, encode_close_payload(code, reason))
+        raise WebSocketProtocolError(reason)
+
+    async def _receive_loop(self):
+        fragments: list[bytes] = []
+        message_size = 0
+        message_opcode = OPCODE_TEXT
+        message_compressed = False
+
+        while True:
+            fin, opcode, payload, rsv1 = await read_frame(self.reader, self.max_size)
+            self.heartbeat.record_activity()
+            if rsv1 and (opcode & 0x8 or opcode == OPCODE_CONTINUATION or not self.deflate or not self.deflate.enabled):
+                raise WebSocketProtocolError("Unexpected RSV1 bit on received frame")
+
+            if opcode == OPCODE_PING:
+                await self._write_frame(OPCODE_PONG, payload)
+                continue
+            if opcode == OPCODE_PONG:
+                rtt = self.heartbeat.record_pong()
+                if rtt is not None:
+                    self.logger.debug("Pong received - RTT %.1f ms", rtt * 1000)
+                continue
+            if opcode == OPCODE_CLOSE:
+                self.close_status = decode_close_payload(payload)
+                with contextlib.suppress(ConnectionError, OSError):
+                    await self._write_frame(OPCODE_CLOSE, payload[:2])
+                return
+
+            if opcode == OPCODE_CONTINUATION:
+                if not fragments:
+                    await self._fail_connection(CLOSE_PROTOCOL_ERROR, "Continuation frame without a message to continue")
+                fragments.append(payload)
+                message_size += len(payload)
+            else:
+                if fragments:
+                    await self._fail_connection(CLOSE_PROTOCOL_ERROR, "New message started before the previous one finished")
+                message_opcode = opcode
+                message_compressed = rsv1
+                fragments = [payload]
+                message_size = len(payload)
+
+            # read_frame only bounds single frames; fragmentation must not get around the limit
+            if message_size > self.max_size:
+                await self._fail_connection(CLOSE_MESSAGE_TOO_BIG, f"Message exceeds limit of {self.max_size} bytes")
+
+            if not fin:
+                continue
+
+            data = b"".join(fragments)
+            fragments = []
+            message_size = 0
+            if message_compressed:
+                data = self.deflate.decompress(data, self.max_size)
+            if message_opcode == OPCODE_TEXT:
+                try:
+                    data = data.decode("utf-8")
+                except UnicodeDecodeError:
+                    await self._fail_connection(CLOSE_INVALID_PAYLOAD, "Invalid UTF-8 in text frame")
+            await self._on_message(data)
+
+    async def _on_message(self, message: Union[str, bytes]):
+        for subscriber in self.message_subscribers:
+            self._offer(subscriber, message)
+
+        if isinstance(message, bytes):
+            self.logger.debug("Binary message received: %d bytes", len(message))
+            return
+
+        try:
+            self.logger.debug("Received message: %s", message)
+            if is_compact(message):
+                payload = decode_message(message)
+                handler = self.router.resolve(payload)
+            else:
+                handler, payload = self.router.resolve_frame(message)
+            if handler:
+                result = handler(payload)
+                if inspect.isawaitable(result):
+                    await result
+        except json.JSONDecodeError as e:
+            self.logger.error(f"Invalid JSON message received: {e}")
+        except Exception as e:
+            self.logger.error(f"Error processing message: {e}")
+
+    async def _handle_close(self):
+        was_connected = self.connected
+        self.connected = False
+        self.connected_event.clear()
+        self.closed_event.set()
+
+        if self.ping_task:
+            self.ping_task.cancel()
+            self.ping_task = None
+
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+            self.reader = None
+
+        if was_connected:
+            self.reconnect_policy.record_disconnect()
+            close_status_code, close_msg = self.close_status
+            self.logger.warning(f"WebSocket connection closed: {close_status_code} - {close_msg}")
+            self.connection_id = None
+            if self.state_writer and not self.server_registered:
+                self.state_writer.submit(self.device_name, "")
+            await self._notify_status("disconnected", self.close_status)
+
+    async def _close_transport(self, code: int):
+        if not self.connected or not self.writer:
+            return
+
+        writer = self.writer
+        with contextlib.suppress(ConnectionError, OSError):
+            await self._write_frame(OPCODE_CLOSE, encode_close_payload(code))
+
+        # Let the receive loop see the peer's close echo before dropping the socket
+        try:
+            await asyncio.wait_for(self.closed_event.wait(), self.close_timeout)
+        except asyncio.TimeoutError:
+            writer.close()
+
+    async def _ping_loop(self):
+        while self.connected:
+            await asyncio.sleep(self.heartbeat.tick_interval)
+            if not self.connected:
+                return
+
+            action = self.heartbeat.poll()
+            if action == ACTION_PING:
+                with contextlib.suppress(ConnectionError, OSError):
+                    await self._write_frame(OPCODE_PING, b"")
+                    self.heartbeat.record_ping_sent()
+            elif action == ACTION_DEAD:
+                self.logger.warning(f"No pong after {self.heartbeat.max_missed_pongs} pings - dropping dead connection")
+                await self._notify_status("dead_peer", self.heartbeat.get_state())
+                # The receive loop unblocks with a connection error and _run reconnects
+                if self.writer:
+                    self.writer.transport.abort()
+                return
+
+    async def _write_frame(self, opcode: int, payload: bytes, compress: bool = False):
+        async with self.write_lock:
+            if not self.writer:
+                raise ConnectionError("WebSocket not connected")
+            # Compressed under the write lock so the shared deflate context sees messages in wire order
+            rsv1 = False
+            if compress and self.deflate:
+                payload, rsv1 = self.deflate.compress(payload)
+            self.writer.write(encode_frame(opcode, payload, mask=True, rsv1=rsv1))
+            await self.writer.drain()
+
+    def _offer(self, subscriber: asyncio.Queue, item: Any):
+        if subscriber.full():
+            subscriber.get_nowait()
+        subscriber.put_nowait(item)
+
+    async def _notify_status(self, status: str, data: Any = None):
+        for callback in self.status_callbacks:
+            try:
+                result = callback(status, data)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                self.logger.error(f"Error in status callback: {e}")
+
+        for subscriber in self.status_subscribers:
+            self._offer(subscriber, (status, data))
+
+    def _handle_save_to_database(self, message_data: Dict[str, Any]):
+        self.connection_id = message_data.get("connection_id", "")
+        self.logger.info(f"Received connection ID: {self.connection_id}")
+        if self.compact_protocol:
+            protocol = message_data.get("protocol")
+            self.wire_protocol = protocol if protocol in supported_protocols() else PROTOCOL_JSON
+        # The server registry already stored the mapping, no client write needed
+        self.server_registered = bool(message_data.get("registered"))
+        if self.state_writer and not self.server_registered:
+            self.state_writer.submit(self.device_name, self.connection_id)
+
+    def _handle_unhandled_message(self, message_data: Dict[str, Any]):
+        self.logger.debug("Unhandled message type: %s", message_data)
+
+
+class AsyncWebSocketEngine:
+    def __init__(self, default_ws_url: str = DEFAULT_WS_URL, mongodb_uri: Optional[str] = None,
+                 state_writer: Optional[WriteBehindStateWriter] = None, **client_options):
+        self.default_ws_url = default_ws_url
+        self.client_options = client_options
+        self.clients: Dict[str, AsyncWebSocketClient] = {}
+
+        self.owns_state_writer = state_writer is None
+        if state_writer is None:
+            uri = mongodb_uri or dotenv_values(os.path.join(script_dir, ".env")).get("MONGODB_URI")
+            state_writer = WriteBehindStateWriter(ConnectionStateStore(uri))
+        self.state_writer = state_writer
+
+        self.logger = logging.getLogger(__name__)
+
+    async def add_device(self, device_name: str, ws_url: Optional[str] = None, connect: bool = True) -> AsyncWebSocketClient:
+        client = self.clients.get(device_name)
+        if client is None:
+            if self.owns_state_writer:
+                self.state_writer.start()
+
+            client = AsyncWebSocketClient(
+                device_name=device_name,
+                ws_url=ws_url or self.default_ws_url,
+                state_writer=self.state_writer,
+                **self.client_options
+            )
+            self.clients[device_name] = client
+            self.logger.info(f"Device added: {device_name}")
+
+        if connect:
+            await client.connect()
+        return client
+
+    async def remove_device(self, device_name: str) -> bool:
+        client = self.clients.pop(device_name, None)
+        if client is None:
+            self.logger.warning(f"Cannot remove unknown device: {device_name}")
+            return False
+
+        await client.disconnect()
+        self.logger.info(f"Device removed: {device_name}")
+        return True
+
+    def get_client(self, device_name: str) -> Optional[AsyncWebSocketClient]:
+        return self.clients.get(device_name)
+
+    async def close(self):
+        clients = list(self.clients.values())
+        self.clients.clear()
+        await asyncio.gather(*(client.disconnect() for client in clients), return_exceptions=True)
+
+        if self.owns_state_writer:
+            self.state_writer.stop()
+            self.state_writer.state_store.close()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "device_count": len(self.clients),
+            "connected_count": sum(1 for client in self.clients.values() if client.connected),
+            "devices": {name: client.get_status() for name, client in self.clients.items()},
+            "write_behind": self.state_writer.get_stats()
+        }
+
+
+class AsyncEngineRunner:
+    def __init__(self, engine: Optional[AsyncWebSocketEngine] = None):
+        self.engine = engine or AsyncWebSocketEngine()
+        self.loop = asyncio.new_event_loop()
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.loop.run_forever, name="async-websocket-engine", daemon=True)
+                self.thread.start()
+
+    def run(self, coro, timeout: Optional[float] = None):
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def submit(self, coro):
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self, timeout: float = 5):
+        if self.thread and self.thread.is_alive():
+            self.run(self.engine.close(), timeout)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=timeout)
+
+
+class AsyncEngineClient:
+    def __init__(self, device_name: str = DEFAULT_DEVICE_NAME, runner: Optional[AsyncEngineRunner] = None):
+        self.runner = runner or get_async_engine_runner()
+        self.device_name = device_name
+        self.client = self.runner.run(self.runner.engine.add_device(device_name, connect=False))
+        self.logger = logging.getLogger(__name__)
+
+    def connect(self) -> bool:
+        return self.runner.run(self.client.connect())
+
+    def disconnect(self):
+        self.runner.submit(self.client.disconnect())
+
+    def reconnect(self):
+        self.runner.submit(self.client.reconnect())
+
+    def send_message(self, message: Dict[str, Any],
+                     callback: Optional[Callable[[bool, Optional[Exception]], None]] = None) -> concurrent.futures.Future:
+        future = self.runner.submit(self.client.send_message(message))
+        future.add_done_callback(lambda done: self._on_send_done(done, callback))
+        return future
+
+    def _on_send_done(self, future: concurrent.futures.Future, callback: Optional[Callable[[bool, Optional[Exception]], None]]):
+        # Same (sent, error) contract as WebSocketManager.send_message callbacks
+        if future.cancelled():
+            error: Optional[Exception] = ConnectionError("Send cancelled")
+        else:
+            error = future.exception()
+            if error is None and not future.result():
+                error = ConnectionError("Message not sent")
+
+        if error is not None:
+            self.logger.error(f"Error sending message for {self.device_name}: {error}")
+        if callback:
+            try:
+                callback(error is None, error)
+            except Exception as e:
+                self.logger.error(f"Error in send callback: {e}")
+
+    def is_connected(self) -> bool:
+        return self.client.is_connected()
+
+    def add_status_listener(self, callback: Callable[[str, Any], None]):
+        self.client.add_status_listener(callback)
+
+    def get_status(self) -> Dict[str, Any]:
+        return self.client.get_status()
+
+
+_engine_runner: Optional[AsyncEngineRunner] = None
+_engine_client: Optional[AsyncEngineClient] = None
+
+def get_async_engine_runner() -> AsyncEngineRunner:
+    global _engine_runner
+    if _engine_runner is None:
+        _engine_runner = AsyncEngineRunner()
+    return _engine_runner
+
+def get_async_engine_client() -> AsyncEngineClient:
+    global _engine_client
+    if _engine_client is None:
+        _engine_client = AsyncEngineClient()
+    return _engine_client
+
+def websocket_run() -> bool:
+    return get_async_engine_client().connect()
+
+def disconnect_websocket():
+    get_async_engine_client().disconnect()
+
+def is_websocket_connected() -> bool:
+    return get_async_engine_client().is_connected()
+
+def get_websocket_status() -> Dict[str, Any]:
+    return get_async_engine_client().get_status()
@@ -0,0 +1,284 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+# Configured before the manager's logging pipeline so benchmark runs never touch websocket_manager.log
+logging.basicConfig(level=logging.WARNING, handlers=[logging.StreamHandler()])
+
+from echo_server import EchoServer
+from websocket_client_connector import WebSocketManager
+from reconnect_policy import ReconnectPolicy, JITTER_NONE
+from connection_state_store import ConnectionStateStore, WriteBehindStateWriter
+from message_dispatcher import MessageDispatcher
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=repo_dir, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def create_manager(url, device_name, **options):
+    options.setdefault("reconnect_policy", ReconnectPolicy(base_delay=0.05, min_delay=0.05, jitter=JITTER_NONE))
+    return WebSocketManager(device_name=device_name, ws_url=url, persist_connection_state=False, **options)
+
+
+def start_connected(manager, timeout=10):
+    manager.start_manager()
+    if not manager.wait_for_state("connected", timeout):
+        raise RuntimeError(f"{manager.device_name} did not connect")
+    deadline = time.monotonic() + timeout
+    while not manager.status.current.connection_id and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def bench_send_echo(url, count, payload_bytes):
+    manager = create_manager(url, "bench-send")
+    latencies = []
+    done = threading.Event()
+
+    def on_echo(message):
+        latencies.append(time.perf_counter() - message["sent_at"])
+        if len(latencies) >= count:
+            done.set()
+
+    manager.add_message_handler("bench_echo", on_echo)
+    start_connected(manager)
+
+    padding = "x" * payload_bytes
+    started = time.perf_counter()
+    for sequence in range(count):
+        manager.send_message({"message": "bench_echo", "seq": sequence, "sent_at": time.perf_counter(), "padding": padding})
+    sent = time.perf_counter()
+    completed = done.wait(60)
+    finished = time.perf_counter()
+    manager.stop_manager()
+
+    return {
+        "messages": count,
+        "payload_bytes": payload_bytes,
+        "completed": completed,
+        "enqueue_per_sec": count / (sent - started),
+        "round_trips_per_sec": len(latencies) / (finished - started),
+        "latency_p50_ms": percentile(latencies, 0.5) * 1000 if latencies else None,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+        "latency_max_ms": max(latencies) * 1000 if latencies else None
+    }
+
+
+def bench_send_latency(url, count, payload_bytes):
+    # One message in flight at a time, so latency excludes queueing behind a burst
+    manager = create_manager(url, "bench-latency")
+    latencies = []
+    echoed = threading.Event()
+
+    def on_echo(message):
+        latencies.append(time.perf_counter() - message["sent_at"])
+        echoed.set()
+
+    manager.add_message_handler("bench_echo", on_echo)
+    start_connected(manager)
+
+    padding = "x" * payload_bytes
+    for sequence in range(count):
+        echoed.clear()
+        manager.send_message({"message": "bench_echo", "seq": sequence, "sent_at": time.perf_counter(), "padding": padding})
+        if not echoed.wait(5):
+            break
+    manager.stop_manager()
+
+    return {
+        "messages": count,
+        "completed": len(latencies),
+        "latency_p50_ms": percentile(latencies, 0.5) * 1000 if latencies else None,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None
+    }
+
+
+def bench_inbound_dispatch(url, count):
+    manager = create_manager(url, "bench-inbound")
+    received = [0]
+    done = threading.Event()
+
+    def on_inbound(message):
+        received[0] += 1
+        if received[0] >= count:
+            done.set()
+
+    manager.add_message_handler("bench_inbound", on_inbound)
+    start_connected(manager)
+
+    frames = [json.dumps({"message": "bench_inbound", "seq": sequence}) for sequence in range(count)]
+    started = time.perf_counter()
+    for frame in frames:
+        manager._on_message(manager.ws_instance, frame)
+    receive_done = time.perf_counter()
+    completed = done.wait(60)
+    finished = time.perf_counter()
+
+    metrics = manager.get_dispatcher_metrics()
+    manager.stop_manager()
+
+    return {
+        "messages": count,
+        "completed": completed,
+        "receive_path_per_sec": count / (receive_done - started),
+        "dispatched_per_sec": received[0] / (finished - started),
+        "dispatcher": metrics
+    }
+
+
+def bench_reconnect(url, server, rounds):
+    manager = create_manager(url, "bench-reconnect")
+    start_connected(manager)
+    samples = []
+
+    for _ in range(rounds):
+        previous = manager.status.current.connection_id
+        dropped = time.perf_counter()
+        server.drop_all()
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            status = manager.status.current
+            if status.connected and status.connection_id and status.connection_id != previous:
+                samples.append(time.perf_counter() - dropped)
+                break
+            time.sleep(0.0005)
+        # Past the policy's stable_uptime the attempt counter resets like a real long-lived connection
+        manager.reconnect_policy.reset()
+
+    manager.stop_manager()
+    return {
+        "rounds": rounds,
+        "completed": len(samples),
+        "time_to_registered_mean_ms": statistics.mean(samples) * 1000 if samples else None,
+        "time_to_registered_p50_ms": percentile(samples, 0.5) * 1000 if samples else None,
+        "time_to_registered_max_ms": max(samples) * 1000 if samples else None
+    }
+
+
+def bench_footprint(url, connections, shared):
+    gc.collect()
+    threads_before = threading.active_count()
+    rss_before = rss_bytes()
+    tracemalloc.start()
+    heap_before = tracemalloc.get_traced_memory()[0]
+
+    options = {}
+    if shared:
+        state_writer = WriteBehindStateWriter(ConnectionStateStore(None))
+        dispatcher = MessageDispatcher()
+        dispatcher.start()
+        options = {"state_writer": state_writer, "dispatcher": dispatcher}
+
+    managers = [create_manager(url, f"bench-footprint-{index}", **options) for index in range(connections)]
+    for manager in managers:
+        start_connected(manager)
+
+    gc.collect()
+    heap_after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    threads_after = threading.active_count()
+    rss_after = rss_bytes()
+
+    for manager in managers:
+        manager.stop_manager()
+    if shared:
+        options["dispatcher"].stop()
+
+    return {
+        "connections": connections,
+        "shared_components": shared,
+        "threads_per_connection": (threads_after - threads_before) / connections,
+        "python_heap_kb_per_connection": (heap_after - heap_before) / connections / 1024,
+        "rss_kb_per_connection": (rss_after - rss_before) / connections / 1024 if rss_before and rss_after else None
+    }
+
+
+def compare(baseline, current, prefix=""):
+    rows = []
+    for key, value in current.items():
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            rows.extend(compare(old or {}, value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and isinstance(old, (int, float)) and old:
+            rows.append((f"{prefix}{key}", old, value, (value - old) / old * 100))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocketManager send/receive/reconnect benchmarks against a local echo server")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--payload-bytes", type=int, default=256)
+    parser.add_argument("--reconnects", type=int, default=10)
+    parser.add_argument("--connections", type=int, default=10)
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run to diff against")
+    args = parser.parse_args()
+
+    server = EchoServer()
+    url = server.start_in_thread()
+
+    try:
+        results = {
+            "commit": git_commit(),
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": {
+                "send_echo": bench_send_echo(url, args.messages, args.payload_bytes),
+                "send_latency": bench_send_latency(url, min(args.messages, 1000), args.payload_bytes),
+                "inbound_dispatch": bench_inbound_dispatch(url, args.messages),
+                "reconnect": bench_reconnect(url, server, args.reconnects),
+                "footprint": bench_footprint(url, args.connections, shared=False),
+                "footprint_shared": bench_footprint(url, args.connections, shared=True)
+            }
+        }
+    finally:
+        server.stop()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    print(output)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print(f"\n{'metric':<60}{'baseline':>14}{'current':>14}{'change':>10}", file=sys.stderr)
+        for name, old, new, change in compare(baseline["results"], results["results"]):
+            print(f"{name:<60}{old:>14.3f}{new:>14.3f}{change:>9.1f}%", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+logging.basicConfig(level=logging.WARNING, handlers=[logging.StreamHandler()])
+
+from echo_server import EchoServer
+from async_websocket_client import AsyncWebSocketClient
+
+
+def telemetry_message(sequence, readings):
+    return {
+        "message": "telemetry",
+        "device_name": "bench-compression",
+        "seq": sequence,
+        "timestamp": time.time(),
+        "readings": [
+            {"sensor": f"sensor-{index}", "unit": "celsius", "status": "ok", "value": round(random.uniform(20, 30), 2)}
+            for index in range(readings)
+        ]
+    }
+
+
+async def run_case(server_compression, client_compression, count, readings, threshold, context_takeover):
+    server = EchoServer(compression=server_compression, compression_threshold=threshold)
+    url = server.start_in_thread()
+    client = AsyncWebSocketClient(
+        device_name="bench-compression", ws_url=url, compression=client_compression,
+        compression_threshold=threshold, compression_context_takeover=context_takeover
+    )
+    received = 0
+    done = asyncio.Event()
+
+    def on_echo(message):
+        nonlocal received
+        received += 1
+        if received >= count:
+            done.set()
+
+    client.add_message_handler("telemetry", on_echo)
+    try:
+        if not await client.connect():
+            raise RuntimeError("Client did not connect")
+
+        messages = [telemetry_message(sequence, readings) for sequence in range(count)]
+        raw_bytes = sum(len(json.dumps(message)) for message in messages)
+        started = time.perf_counter()
+        for message in messages:
+            await client.send_message(message)
+        await asyncio.wait_for(done.wait(), 60)
+        elapsed = time.perf_counter() - started
+    finally:
+        await client.disconnect()
+        server.stop()
+
+    compression = client.get_status()["compression"]
+    return {
+        "server_compression": server_compression,
+        "client_compression": client_compression,
+        "negotiated": bool(compression and compression["enabled"]),
+        "messages": count,
+        "raw_payload_bytes": raw_bytes,
+        "bytes_on_wire_upstream": server.bytes_received,
+        "bytes_on_wire_downstream": server.bytes_sent,
+        "round_trips_per_sec": count / elapsed,
+        "client": compression
+    }
+
+
+async def run(args):
+    cases = [(False, False), (False, True), (True, False), (True, True)]
+    results = []
+    for server_compression, client_compression in cases:
+        results.append(await run_case(server_compression, client_compression, args.messages, args.readings,
+                                      args.threshold, not args.no_context_takeover))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="permessage-deflate negotiation, fallback and bytes-on-wire benchmark")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--readings", type=int, default=8, help="sensor readings per telemetry message")
+    parser.add_argument("--threshold", type=int, default=256)
+    parser.add_argument("--no-context-takeover", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'server':<8}{'client':<8}{'negotiated':<12}{'raw bytes':>12}{'upstream':>12}{'ratio':>8}{'round trips/s':>16}")
+    for result in results:
+        print(f"{str(result['server_compression']):<8}{str(result['client_compression']):<8}{str(result['negotiated']):<12}"
+              f"{result['raw_payload_bytes']:>12}{result['bytes_on_wire_upstream']:>12}"
+              f"{result['bytes_on_wire_upstream'] / result['raw_payload_bytes']:>8.2f}{result['round_trips_per_sec']:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import threading
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from ws_protocol import (
+    OPCODE_TEXT, OPCODE_CLOSE, OPCODE_PING, OPCODE_PONG, DEFAULT_COMPRESSION_THRESHOLD,
+    PerMessageDeflate, build_server_handshake, parse_http_head, encode_frame, read_frame
+)
+
+
+class EchoServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, compression: bool = False,
+                 compression_threshold: int = DEFAULT_COMPRESSION_THRESHOLD):
+        self.host = host
+        self.port = port
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        self.compressed_connections = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.writers = set()
+        self.connection_count = 0
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/"
+
+    async def _handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            _, headers = parse_http_head(head)
+            deflate = PerMessageDeflate(False, self.compression_threshold) if self.compression else None
+            accepted = deflate.accept_offer(headers.get("sec-websocket-extensions")) if deflate else None
+            if accepted:
+                self.compressed_connections += 1
+            else:
+                deflate = None
+            extra_headers = {"Sec-WebSocket-Extensions": accepted} if accepted else None
+            writer.write(build_server_handshake(headers["sec-websocket-key"], extra_headers))
+            await writer.drain()
+        except (asyncio.IncompleteReadError, KeyError, ConnectionError):
+            writer.close()
+            return
+
+        self.connection_count += 1
+        self.writers.add(writer)
+        try:
+            while True:
+                _, opcode, payload, rsv1 = await read_frame(reader)
+                self.bytes_received += len(payload)
+                if rsv1:
+                    payload = deflate.decompress(payload)
+                if opcode == OPCODE_CLOSE:
+                    writer.write(encode_frame(OPCODE_CLOSE, payload[:2], mask=False))
+                    break
+                if opcode == OPCODE_PING:
+                    writer.write(encode_frame(OPCODE_PONG, payload, mask=False))
+                    continue
+                if opcode != OPCODE_TEXT:
+                    continue
+
+                # Registration is answered the way the server-side registry does, everything else is echoed
+                if payload.startswith(b'{"action": "register_device"'):
+                    payload = json.dumps({"message": "Save to Database", "connection_id": f"bench-{self.connection_count}",
+                                          "registered": True}).encode("utf-8")
+                compressed = False
+                if deflate:
+                    payload, compressed = deflate.compress(payload)
+                self.bytes_sent += len(payload)
+                writer.write(encode_frame(OPCODE_TEXT, payload, mask=False, rsv1=compressed))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    def drop_all(self):
+        # Abrupt close, as if the gateway or network dropped every connection
+        def drop():
+            for writer in list(self.writers):
+                writer.transport.abort()
+        self.loop.call_soon_threadsafe(drop)
+
+    def start_in_thread(self) -> str:
+        started = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.server = self.loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+            self.port = self.server.sockets[0].getsockname()[1]
+            started.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name="echo-server", daemon=True)
+        self.thread.start()
+        started.wait()
+        return self.url
+
+    def stop(self):
+        if self.loop:
+            with contextlib.suppress(RuntimeError):
+                self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=5)
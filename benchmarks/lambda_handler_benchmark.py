@@ -0,0 +1,132 @@
+import argparse
+import importlib
+import json
+import os
+import statistics
+import sys
+import time
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+import websockets
+
+ROUTES = ("$connect", "$default", "register_device", "$disconnect")
+
+
+class StubGoneException(Exception):
+    pass
+
+
+class StubExceptions:
+    GoneException = StubGoneException
+
+
+class StubApiGatewayClient:
+    exceptions = StubExceptions
+
+    def __init__(self, endpoint_url):
+        self.endpoint_url = endpoint_url
+        self.posted = 0
+
+    def post_to_connection(self, ConnectionId, Data):
+        self.posted += 1
+        return {}
+
+
+def stub_factory(endpoint_url):
+    return StubApiGatewayClient(endpoint_url)
+
+
+def boto3_stub_factory(endpoint_url):
+    # Real client construction cost, but nothing leaves the process
+    import boto3
+    client = boto3.client("apigatewaymanagementapi", endpoint_url=endpoint_url, region_name="ap-south-1")
+    client.post_to_connection = lambda **kwargs: {}
+    return client
+
+
+def build_event(route_key):
+    body = {"action": route_key, "message": "Connection Established", "device_name": "bench"}
+    return {
+        "requestContext": {
+            "routeKey": route_key,
+            "connectionId": "bench-connection",
+            "domainName": "example.execute-api.ap-south-1.amazonaws.com",
+            "stage": "production"
+        },
+        "body": json.dumps(body)
+    }
+
+
+def invoke(event, per_invocation_client):
+    if per_invocation_client:
+        # Baseline: the handler used to build a client on every invocation
+        websockets.clear_apigw_clients()
+        context = event["requestContext"]
+        websockets.get_apigw_client(context["domainName"], context["stage"])
+    websockets.websocket_handler(event, None)
+
+
+def measure(route_key, iterations, per_invocation_client):
+    event = build_event(route_key)
+
+    websockets.clear_apigw_clients()
+    started = time.perf_counter()
+    invoke(event, per_invocation_client)
+    cold = time.perf_counter() - started
+
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        invoke(event, per_invocation_client)
+        samples.append(time.perf_counter() - started)
+
+    samples.sort()
+    return {
+        "route": route_key,
+        "cold_ms": cold * 1000,
+        "warm_mean_ms": statistics.mean(samples) * 1000,
+        "warm_p50_ms": samples[len(samples) // 2] * 1000,
+        "warm_p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold/warm latency of websocket_handler with a stubbed management client")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--boto3", action="store_true", help="construct real boto3 clients with post_to_connection stubbed")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    importlib.reload(websockets)
+    websockets.apigw_client_factory = boto3_stub_factory if args.boto3 else stub_factory
+
+    # Silence the handler's per-invocation prints while timing
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        results = {
+            "client": "boto3" if args.boto3 else "stub",
+            "iterations": args.iterations,
+            "before": [measure(route, args.iterations, True) for route in ROUTES],
+            "after": [measure(route, args.iterations, False) for route in ROUTES]
+        }
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"client={results['client']} iterations={results['iterations']}")
+    print(f"{'route':<18}{'mode':<8}{'cold ms':>10}{'warm mean':>12}{'warm p50':>10}{'warm p99':>10}")
+    for mode in ("before", "after"):
+        for row in results[mode]:
+            print(f"{row['route']:<18}{mode:<8}{row['cold_ms']:>10.3f}{row['warm_mean_ms']:>12.4f}"
+                  f"{row['warm_p50_ms']:>10.4f}{row['warm_p99_ms']:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
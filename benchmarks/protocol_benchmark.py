@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+import websockets
+from compact_protocol import PROTOCOL_JSON, PROTOCOL_MSGPACK, supported_protocols, encode_message, decode_message
+from lambda_handler_benchmark import stub_factory
+
+CONTROL_MESSAGES = {
+    "register_device": {"action": "register_device", "message": "Connection Established", "device_name": "windows11",
+                        "protocols": ["msgpack", "json"]},
+    "unregister_device": {"action": "unregister_device", "message": "Disconnect Connection", "device_name": "windows11"},
+    "save_to_database": {"message": "Save to Database", "connection_id": "Yx3kPfS0hcwCF8Q=", "registered": True,
+                         "protocol": "msgpack"},
+    "remove_from_database": {"message": "Remove from Database", "connection_id": "Yx3kPfS0hcwCF8Q="},
+    "send_to_devices": {"action": "send_to_devices", "device_names": ["kitchen-sensor", "garage-sensor"],
+                        "data": {"command": "report", "interval": 30}}
+}
+
+HANDLER_ROUTES = ("unregister_device", "send_to_devices")
+
+
+def time_calls(function, argument, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        function(argument)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def encode_frame(message, protocol):
+    # Both formats go out as UTF-8 text frames, so the str -> bytes step is part of the cost
+    return encode_message(message, protocol).encode("utf-8")
+
+
+def build_event(route_key, message, protocol):
+    frame = encode_frame(message, protocol)
+    event = {
+        "requestContext": {
+            "routeKey": route_key,
+            "connectionId": "bench-connection",
+            "domainName": "example.execute-api.ap-south-1.amazonaws.com",
+            "stage": "production"
+        },
+        "isBase64Encoded": False,
+        "body": frame.decode("utf-8")
+    }
+    # A compact body has no JSON action to route-select on, API Gateway hands it to $default
+    if protocol == PROTOCOL_MSGPACK:
+        event["requestContext"]["routeKey"] = "$default"
+    return event
+
+
+def measure_messages(protocols, iterations):
+    results = []
+    for name, message in CONTROL_MESSAGES.items():
+        row = {"message": name}
+        for protocol in protocols:
+            frame = encode_frame(message, protocol)
+            wire_frame = frame.decode("utf-8")
+            row[protocol] = {
+                "bytes": len(frame),
+                "encode_us": time_calls(lambda m: encode_frame(m, protocol), message, iterations),
+                "decode_us": time_calls(decode_message, wire_frame, iterations)
+            }
+        results.append(row)
+    return results
+
+
+def measure_handler(protocols, iterations):
+    websockets.apigw_client_factory = stub_factory
+    websockets.fanout_authorizer = lambda request: True
+    results = []
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        for route_key in HANDLER_ROUTES:
+            row = {"route": route_key}
+            for protocol in protocols:
+                event = build_event(route_key, CONTROL_MESSAGES[route_key], protocol)
+                row[protocol] = {"handler_us": time_calls(lambda e: websockets.websocket_handler(e, None), event, iterations)}
+            results.append(row)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON vs compact MessagePack control messages: bytes, encode/decode and handler cost")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    protocols = [PROTOCOL_JSON] + [protocol for protocol in supported_protocols() if protocol != PROTOCOL_JSON]
+    if len(protocols) == 1:
+        print("msgpack is not installed - only the JSON fallback is measured", file=sys.stderr)
+
+    results = {
+        "iterations": args.iterations,
+        "messages": measure_messages(protocols, args.iterations),
+        "handler": measure_handler(protocols, args.iterations // 4)
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"iterations={args.iterations}")
+    print(f"{'message':<24}{'protocol':<10}{'bytes':>8}{'encode us':>12}{'decode us':>12}")
+    for row in results["messages"]:
+        for protocol in protocols:
+            cost = row[protocol]
+            print(f"{row['message']:<24}{protocol:<10}{cost['bytes']:>8}{cost['encode_us']:>12.2f}{cost['decode_us']:>12.2f}")
+
+    print(f"\n{'route':<24}{'protocol':<10}{'handler us':>12}")
+    for row in results["handler"]:
+        for protocol in protocols:
+            print(f"{row['route']:<24}{protocol:<10}{row[protocol]['handler_us']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
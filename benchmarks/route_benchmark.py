@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+import websockets
+from connection_registry import InMemoryConnectionRegistry
+from lambda_handler_benchmark import stub_factory
+
+SYNTHETIC_BODIES = {
+    "$connect": None,
+    "$disconnect": None,
+    "$default": {"action": "$default", "message": "hello"},
+    "register_device": {"action": "register_device", "message": "Connection Established", "device_name": "bench"},
+    "unregister_device": {"action": "unregister_device", "device_name": "bench"},
+    "send_to_devices": {"action": "send_to_devices", "connection_ids": ["target-1", "target-2"], "data": {"command": "ping"}},
+    "broadcast": {"action": "broadcast", "connection_ids": ["target-1"], "data": {"command": "ping"}},
+    "batch": {"action": "batch", "messages": [{"action": "$default", "message": str(i)} for i in range(10)]},
+    "unknown_route": {"action": "unknown_route"}
+}
+
+
+def build_event(route_key, body):
+    event = {
+        "requestContext": {
+            "routeKey": route_key,
+            "connectionId": "bench-connection",
+            "domainName": "example.execute-api.ap-south-1.amazonaws.com",
+            "stage": "production"
+        }
+    }
+    if body is not None:
+        event["body"] = json.dumps(body)
+    return event
+
+
+def time_calls(function, argument, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        function(argument)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-route overhead of websocket_handler on synthetic API Gateway events")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    websockets.apigw_client_factory = stub_factory
+    # Fan-out targets must be registered, and the sender's own registration is churned by the device routes
+    registry = InMemoryConnectionRegistry()
+    for target_id in ("target-1", "target-2"):
+        registry.register(f"bench-{target_id}", target_id)
+    websockets.connection_registry = registry
+    websockets.fanout_authorizer = lambda request: True
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        results = []
+        for route_key, body in SYNTHETIC_BODIES.items():
+            event = build_event(route_key, body)
+            handler_us = time_calls(lambda e: websockets.websocket_handler(e, None), event, args.iterations)
+            dispatch_us = time_calls(lambda e: websockets.dispatch(websockets.LambdaRequest(e, None)), event, args.iterations)
+            results.append({
+                "route": route_key,
+                "handler_us": handler_us,
+                "dispatch_us": dispatch_us,
+                "pipeline_overhead_us": handler_us - dispatch_us
+            })
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    if args.json:
+        print(json.dumps({"iterations": args.iterations, "routes": results}, indent=2))
+        return
+
+    print(f"iterations={args.iterations}")
+    print(f"{'route':<20}{'handler us':>12}{'dispatch us':>13}{'overhead us':>13}")
+    for row in results:
+        print(f"{row['route']:<20}{row['handler_us']:>12.2f}{row['dispatch_us']:>13.2f}{row['pipeline_overhead_us']:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
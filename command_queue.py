@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional, Dict, Any, Tuple, Iterable, List
+
+CONTROL_COMMANDS = frozenset({"connect", "disconnect", "reconnect", "ping"})
+
+POLICY_BLOCK = "block"
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_REJECT = "reject"
+
+RESULT_QUEUED = "queued"
+RESULT_DROPPED_OLDEST = "dropped_oldest"
+RESULT_REJECTED = "rejected"
+RESULT_TIMEOUT = "timeout"
+RESULT_CLOSED = "closed"
+
+
+class CommandQueue:
+    def __init__(self, max_data_size: int = 1000, overflow_policy: str = POLICY_BLOCK,
+                 block_timeout: Optional[float] = None, control_commands: Iterable[str] = CONTROL_COMMANDS):
+        if overflow_policy not in (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_REJECT):
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+
+        self.max_data_size = max_data_size
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.control_commands = frozenset(control_commands)
+
+        self.condition = threading.Condition()
+        self.control_items: deque = deque()
+        self.data_items: deque = deque()
+        self.is_closed = False
+        # Called after every accepted put, so a shared worker can pick the queue up without polling
+        self.listener: Optional[Callable[[], None]] = None
+
+        self.enqueued = 0
+        self.dequeued = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def put(self, command: str, data: Any = None, timeout: Optional[float] = None) -> str:
+        return self._put(command, data, blocking=True, timeout=self.block_timeout if timeout is None else timeout)
+
+    def try_put(self, command: str, data: Any = None) -> str:
+        return self._put(command, data, blocking=False, timeout=None)
+
+    def _put(self, command: str, data: Any, blocking: bool, timeout: Optional[float]) -> str:
+        result = self._put_item(command, data, blocking, timeout)
+        if self.listener and result in (RESULT_QUEUED, RESULT_DROPPED_OLDEST):
+            self.listener()
+        return result
+
+    def _put_item(self, command: str, data: Any, blocking: bool, timeout: Optional[float]) -> str:
+        item = (command, data, time.monotonic())
+
+        with self.condition:
+            if self.is_closed:
+                return RESULT_CLOSED
+
+            if command in self.control_commands:
+                self.control_items.append(item)
+                return self._enqueued(RESULT_QUEUED)
+
+            result = RESULT_QUEUED
+            if len(self.data_items) >= self.max_data_size:
+                if self.overflow_policy == POLICY_DROP_OLDEST:
+                    self.data_items.popleft()
+                    self.dropped += 1
+                    result = RESULT_DROPPED_OLDEST
+                elif self.overflow_policy == POLICY_REJECT or not blocking:
+                    self.rejected += 1
+                    return RESULT_REJECTED
+                else:
+                    has_room = self.condition.wait_for(
+                        lambda: self.is_closed or len(self.data_items) < self.max_data_size,
+                        timeout=timeout
+                    )
+                    if self.is_closed:
+                        return RESULT_CLOSED
+                    if not has_room:
+                        self.rejected += 1
+                        return RESULT_TIMEOUT
+
+            self.data_items.append(item)
+            return self._enqueued(result)
+
+    def _enqueued(self, result: str) -> str:
+        self.enqueued += 1
+        depth = len(self.control_items) + len(self.data_items)
+        if depth > self.max_depth:
+            self.max_depth = depth
+        self.condition.notify_all()
+        return result
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Tuple[str, Any]]:
+        with self.condition:
+            ready = self.condition.wait_for(
+                lambda: self.is_closed or self.control_items or self.data_items,
+                timeout=timeout
+            )
+            if not ready or self.is_closed:
+                return None
+
+            source = self.control_items if self.control_items else self.data_items
+            command, data, enqueued_at = source.popleft()
+            self.dequeued += 1
+
+            waited = time.monotonic() - enqueued_at
+            self.wait_count += 1
+            self.wait_total += waited
+            if waited > self.wait_max:
+                self.wait_max = waited
+
+            # Wake producers blocked on a full data queue
+            self.condition.notify_all()
+            return command, data
+
+    def close(self):
+        with self.condition:
+            self.is_closed = True
+            self.condition.notify_all()
+
+    def open(self):
+        with self.condition:
+            self.is_closed = False
+
+    def drain(self) -> List[Tuple[str, Any]]:
+        # get() stops handing out items once closed, so whatever was still queued is collected here
+        with self.condition:
+            items = [(command, data) for command, data, _ in self.control_items]
+            items.extend((command, data) for command, data, _ in self.data_items)
+            self.control_items.clear()
+            self.data_items.clear()
+            self.condition.notify_all()
+            return items
+
+    def clear(self) -> int:
+        with self.condition:
+            cleared = len(self.control_items) + len(self.data_items)
+            self.control_items.clear()
+            self.data_items.clear()
+            self.condition.notify_all()
+            return cleared
+
+    def qsize(self) -> int:
+        with self.condition:
+            return len(self.control_items) + len(self.data_items)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self.condition:
+            return {
+                "control_depth": len(self.control_items),
+                "data_depth": len(self.data_items),
+                "max_depth": self.max_depth,
+                "max_data_size": self.max_data_size,
+                "overflow_policy": self.overflow_policy,
+                "enqueued": self.enqueued,
+                "dequeued": self.dequeued,
+                "dropped": self.dropped,
+                "rejected": self.rejected,
+                "wait_avg_ms": (self.wait_total / self.wait_count * 1000) if self.wait_count else 0.0,
+                "wait_max_ms": self.wait_max * 1000
+            }
@@ -0,0 +1,105 @@
+import threading
+import logging
+from collections import deque
+from typing import Callable, Optional, Dict, Any, List
+
+# A session's runner handles at most this many commands before yielding the thread to other sessions
+DEFAULT_COMMAND_SLICE = 32
+
+
+class CommandWorker:
+    def __init__(self, workers: int = 2, name: str = "command-worker"):
+        self.worker_count = workers
+        self.name = name
+
+        self.condition = threading.Condition()
+        self.ready: deque = deque()
+        self.scheduled: set = set()
+        self.rerun: set = set()
+        self.threads: List[threading.Thread] = []
+        self.is_running = False
+
+        self.runs = 0
+        self.failed_runs = 0
+        self.max_ready = 0
+
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        with self.condition:
+            if self.is_running:
+                return
+            self.is_running = True
+            self.threads = []
+            for index in range(self.worker_count):
+                thread = threading.Thread(target=self._worker_loop, name=f"{self.name}-{index}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+        self.logger.info(f"Command worker started with {self.worker_count} threads")
+
+    def stop(self, timeout: float = 5):
+        with self.condition:
+            if not self.is_running:
+                return
+            self.is_running = False
+            threads = self.threads
+            self.condition.notify_all()
+
+        for thread in threads:
+            thread.join(timeout=timeout)
+
+        self.logger.info("Command worker stopped")
+
+    def schedule(self, runner: Callable[[], bool]):
+        # A runner is never on two threads at once, which keeps each session's commands in order
+        with self.condition:
+            if runner in self.scheduled:
+                self.rerun.add(runner)
+                return
+            self.scheduled.add(runner)
+            self.ready.append(runner)
+            self.max_ready = max(self.max_ready, len(self.ready))
+            self.condition.notify()
+
+    def wait_idle(self, runner: Callable[[], bool], timeout: Optional[float] = None) -> bool:
+        with self.condition:
+            return self.condition.wait_for(lambda: runner not in self.scheduled, timeout)
+
+    def _worker_loop(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: not self.is_running or self.ready)
+                if not self.is_running:
+                    return
+                runner = self.ready.popleft()
+                self.rerun.discard(runner)
+
+            more = False
+            try:
+                more = runner()
+                self.runs += 1
+            except Exception as e:
+                self.failed_runs += 1
+                self.logger.error(f"Error in command runner: {e}")
+
+            with self.condition:
+                # Work that arrived while the runner was busy must not wait for the next put
+                if more or runner in self.rerun:
+                    self.rerun.discard(runner)
+                    self.ready.append(runner)
+                else:
+                    self.scheduled.discard(runner)
+                self.condition.notify_all()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self.condition:
+            return {
+                "threads": self.worker_count,
+                "running": self.is_running,
+                "ready": len(self.ready),
+                "scheduled": len(self.scheduled),
+                "max_ready": self.max_ready,
+                "runs": self.runs,
+                "failed_runs": self.failed_runs
+            }
@@ -0,0 +1,120 @@
+import base64
+import json
+from typing import Optional, Dict, Any, Iterable, List
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+PROTOCOL_JSON = "json"
+PROTOCOL_MSGPACK = "msgpack"
+
+# API Gateway closes the socket (1003) on inbound binary frames, so compact messages travel
+# as base64 text behind a marker that can never start a JSON document
+COMPACT_PREFIX = "~"
+
+TYPE_REGISTER_DEVICE = 1
+TYPE_UNREGISTER_DEVICE = 2
+TYPE_SAVE_TO_DATABASE = 3
+TYPE_REMOVE_FROM_DATABASE = 4
+TYPE_BROADCAST = 5
+TYPE_SEND_TO_DEVICES = 6
+TYPE_BATCH = 7
+
+# Fields implied by each type code, so the long English markers never go on the wire
+MESSAGE_TYPES: Dict[int, Dict[str, Any]] = {
+    TYPE_REGISTER_DEVICE: {"action": "register_device", "message": "Connection Established"},
+    TYPE_UNREGISTER_DEVICE: {"action": "unregister_device", "message": "Disconnect Connection"},
+    TYPE_SAVE_TO_DATABASE: {"message": "Save to Database"},
+    TYPE_REMOVE_FROM_DATABASE: {"message": "Remove from Database"},
+    TYPE_BROADCAST: {"action": "broadcast"},
+    TYPE_SEND_TO_DEVICES: {"action": "send_to_devices"},
+    TYPE_BATCH: {"action": "batch"}
+}
+
+# Integer keys cannot collide with application fields, which are always strings
+TYPE_KEY = 0
+FIELD_CODES = {
+    "device_name": 1,
+    "connection_id": 2,
+    "registered": 3,
+    "protocol": 4,
+    "protocols": 5,
+    "message": 6,
+    "action": 7,
+    "data": 8,
+    "device_names": 9,
+    "connection_ids": 10,
+    "include_sender": 11,
+    "messages": 12
+}
+FIELD_NAMES = {code: name for name, code in FIELD_CODES.items()}
+
+_TYPES_BY_ACTION = {fields["action"]: code for code, fields in MESSAGE_TYPES.items() if "action" in fields}
+_TYPES_BY_MESSAGE = {fields["message"]: code for code, fields in MESSAGE_TYPES.items() if "action" not in fields}
+
+
+def supported_protocols() -> List[str]:
+    return [PROTOCOL_MSGPACK, PROTOCOL_JSON] if msgpack else [PROTOCOL_JSON]
+
+
+def negotiate_protocol(offered: Optional[Iterable[str]]) -> str:
+    # Peers without msgpack installed, or that never offered it, stay on JSON
+    supported = supported_protocols()
+    for protocol in offered or ():
+        if protocol in supported:
+            return protocol
+    return PROTOCOL_JSON
+
+
+def to_compact(message: Dict[str, Any]) -> Dict[Any, Any]:
+    code = _TYPES_BY_ACTION.get(message.get("action")) or _TYPES_BY_MESSAGE.get(message.get("message"))
+    implied = MESSAGE_TYPES.get(code, {})
+    # A type code is only used when decoding it would restore exactly the same fields
+    if any(message.get(name) != value for name, value in implied.items()):
+        code, implied = None, {}
+
+    compact = {TYPE_KEY: code} if code else {}
+    for name, value in message.items():
+        if name not in implied:
+            compact[FIELD_CODES.get(name, name)] = value
+    # Batched messages are compacted too, otherwise a batch would carry every long marker again
+    if code == TYPE_BATCH and isinstance(message.get("messages"), list):
+        compact[FIELD_CODES["messages"]] = [to_compact(inner) if isinstance(inner, dict) else inner
+                                            for inner in message["messages"]]
+    return compact
+
+
+def from_compact(compact: Dict[Any, Any]) -> Dict[str, Any]:
+    message = dict(MESSAGE_TYPES.get(compact.get(TYPE_KEY), ()))
+    for code, value in compact.items():
+        if code != TYPE_KEY:
+            message[FIELD_NAMES.get(code, code)] = value
+    if compact.get(TYPE_KEY) == TYPE_BATCH and isinstance(message.get("messages"), list):
+        message["messages"] = [from_compact(inner) if isinstance(inner, dict) else inner
+                               for inner in message["messages"]]
+    return message
+
+
+def is_compact(frame: str) -> bool:
+    return frame.startswith(COMPACT_PREFIX)
+
+
+def encode_message(message: Dict[str, Any], protocol: str = PROTOCOL_JSON) -> str:
+    if protocol == PROTOCOL_MSGPACK:
+        packed = msgpack.packb(to_compact(message), use_bin_type=True)
+        return COMPACT_PREFIX + base64.b64encode(packed).decode("ascii")
+    return json.dumps(message)
+
+
+def decode_message(frame: str) -> Any:
+    # Every frame is text; the prefix alone tells compact MessagePack apart from JSON
+    if not frame.startswith(COMPACT_PREFIX):
+        return json.loads(frame)
+    if msgpack is None:
+        raise ValueError("Compact message received but msgpack is not installed")
+
+    decoded = msgpack.unpackb(base64.b64decode(frame[len(COMPACT_PREFIX):], validate=True),
+                              raw=False, strict_map_key=False)
+    return from_compact(decoded) if isinstance(decoded, dict) else decoded
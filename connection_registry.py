@@ -0,0 +1,258 @@
+import json
+import os
+import threading
+import time
+import logging
+from abc import ABC, abstractmethod
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+
+REGISTRY_MEMORY = "memory"
+REGISTRY_FILE = "file"
+REGISTRY_MONGO = "mongo"
+
+
+class ConnectionRegistry(ABC):
+    @abstractmethod
+    def record_connect(self, connection_id: str):
+        pass
+
+    @abstractmethod
+    def register(self, device_name: str, connection_id: str) -> bool:
+        pass
+
+    @abstractmethod
+    def unregister_connection(self, connection_id: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def get_connections(self, device_names: Iterable[str]) -> Dict[str, str]:
+        pass
+
+    @abstractmethod
+    def get_devices(self, connection_ids: Iterable[str]) -> Dict[str, str]:
+        pass
+
+    @abstractmethod
+    def list_connections(self) -> List[Tuple[str, str]]:
+        pass
+
+    @abstractmethod
+    def remove_connections(self, connection_ids: Iterable[str]) -> int:
+        pass
+
+    def get_connection(self, device_name: str) -> Optional[str]:
+        return self.get_connections([device_name]).get(device_name)
+
+
+class InMemoryConnectionRegistry(ConnectionRegistry):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.devices: Dict[str, Dict[str, Any]] = {}
+        self.connections: Dict[str, Optional[str]] = {}
+
+    def _changed(self):
+        pass
+
+    def record_connect(self, connection_id: str):
+        with self.lock:
+            self.connections.setdefault(connection_id, None)
+            self._changed()
+
+    def register(self, device_name: str, connection_id: str) -> bool:
+        with self.lock:
+            previous = self.devices.get(device_name)
+            if previous and previous["connection_id"] != connection_id:
+                self.connections.pop(previous["connection_id"], None)
+
+            self.devices[device_name] = {"connection_id": connection_id, "last_updated": time.time()}
+            self.connections[connection_id] = device_name
+            self._changed()
+            return True
+
+    def _drop_connection(self, connection_id: str) -> Optional[str]:
+        device_name = self.connections.pop(connection_id, None)
+        # A newer registration for the same device must survive a late $disconnect
+        if device_name and self.devices.get(device_name, {}).get("connection_id") == connection_id:
+            del self.devices[device_name]
+        return device_name
+
+    def unregister_connection(self, connection_id: str) -> Optional[str]:
+        with self.lock:
+            device_name = self._drop_connection(connection_id)
+            self._changed()
+            return device_name
+
+    def get_connections(self, device_names: Iterable[str]) -> Dict[str, str]:
+        devices = self.devices
+        return {
+            device_name: devices[device_name]["connection_id"]
+            for device_name in device_names if device_name in devices
+        }
+
+    def get_devices(self, connection_ids: Iterable[str]) -> Dict[str, str]:
+        connections = self.connections
+        return {
+            connection_id: connections[connection_id]
+            for connection_id in connection_ids if connections.get(connection_id)
+        }
+
+    def list_connections(self) -> List[Tuple[str, str]]:
+        with self.lock:
+            return [(device_name, entry["connection_id"]) for device_name, entry in self.devices.items()]
+
+    def remove_connections(self, connection_ids: Iterable[str]) -> int:
+        with self.lock:
+            removed = 0
+            for connection_id in connection_ids:
+                if connection_id in self.connections:
+                    self._drop_connection(connection_id)
+                    removed += 1
+            self._changed()
+            return removed
+
+
+class LocalFileConnectionRegistry(InMemoryConnectionRegistry):
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+            self.devices = data.get("devices", {})
+            self.connections = data.get("connections", {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Error loading connection registry {self.path}: {e}")
+
+    def _changed(self):
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w") as file:
+                json.dump({"devices": self.devices, "connections": self.connections}, file)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            self.logger.error(f"Error saving connection registry {self.path}: {e}")
+
+
+class MongoConnectionRegistry(ConnectionRegistry):
+    def __init__(self, mongodb_uri: str, database_name: str = "AWS_Webhook",
+                 collection_name: str = "Webhook_Details", max_pool_size: int = 10,
+                 server_selection_timeout_ms: int = 5000):
+        self.mongodb_uri = mongodb_uri
+        self.database_name = database_name
+        self.collection_name = collection_name
+        self.max_pool_size = max_pool_size
+        self.server_selection_timeout_ms = server_selection_timeout_ms
+
+        self.lock = threading.Lock()
+        self._client = None
+        self._collection = None
+
+        self.logger = logging.getLogger(__name__)
+
+    def _get_collection(self):
+        if self._collection is not None:
+            return self._collection
+
+        with self.lock:
+            if self._collection is None:
+                # Imported here so in-memory registries never load the driver on cold start
+                from pymongo import MongoClient, ASCENDING
+
+                self._client = MongoClient(
+                    self.mongodb_uri,
+                    serverSelectionTimeoutMS=self.server_selection_timeout_ms,
+                    maxPoolSize=self.max_pool_size,
+                    retryWrites=True
+                )
+                collection = self._client[self.database_name][self.collection_name]
+                # _id is the device name; $disconnect and stale cleanup look up by connection_id
+                collection.create_index([("connection_id", ASCENDING)], name="connection_id")
+                collection.create_index([("is_connected", ASCENDING), ("device_name", ASCENDING)], name="connected_devices")
+                self._collection = collection
+            return self._collection
+
+    def record_connect(self, connection_id: str):
+        # The device is unknown until register_device, nothing worth a write yet
+        pass
+
+    def register(self, device_name: str, connection_id: str) -> bool:
+        self._get_collection().update_one(
+            {"_id": device_name},
+            {"$set": {
+                "device_name": device_name,
+                "connection_id": connection_id,
+                "is_connected": True,
+                "last_updated": time.time()
+            }},
+            upsert=True
+        )
+        return True
+
+    def unregister_connection(self, connection_id: str) -> Optional[str]:
+        # Matching on connection_id keeps a late $disconnect from clobbering a newer registration
+        document = self._get_collection().find_one_and_update(
+            {"connection_id": connection_id},
+            {"$set": {"connection_id": "", "is_connected": False, "last_updated": time.time()}},
+            projection={"device_name": True}
+        )
+        return document["device_name"] if document else None
+
+    def get_connections(self, device_names: Iterable[str]) -> Dict[str, str]:
+        cursor = self._get_collection().find(
+            {"_id": {"$in": list(device_names)}, "is_connected": True},
+            projection={"connection_id": True}
+        )
+        return {document["_id"]: document["connection_id"] for document in cursor}
+
+    def get_devices(self, connection_ids: Iterable[str]) -> Dict[str, str]:
+        cursor = self._get_collection().find(
+            {"connection_id": {"$in": list(connection_ids)}, "is_connected": True},
+            projection={"connection_id": True}
+        )
+        return {document["connection_id"]: document["_id"] for document in cursor}
+
+    def list_connections(self) -> List[Tuple[str, str]]:
+        cursor = self._get_collection().find(
+            {"is_connected": True},
+            projection={"connection_id": True}
+        )
+        return [(document["_id"], document["connection_id"]) for document in cursor]
+
+    def remove_connections(self, connection_ids: Iterable[str]) -> int:
+        result = self._get_collection().update_many(
+            {"connection_id": {"$in": list(connection_ids)}},
+            {"$set": {"connection_id": "", "is_connected": False, "last_updated": time.time()}}
+        )
+        return result.modified_count
+
+    def close(self):
+        with self.lock:
+            if self._client:
+                self._client.close()
+            self._client = None
+            self._collection = None
+
+
+def create_connection_registry(kind: Optional[str] = None, **options) -> Optional[ConnectionRegistry]:
+    kind = kind or os.environ.get("CONNECTION_REGISTRY")
+    if not kind:
+        return None
+
+    if kind == REGISTRY_MEMORY:
+        return InMemoryConnectionRegistry()
+    if kind == REGISTRY_FILE:
+        path = options.get("path") or os.environ.get("CONNECTION_REGISTRY_PATH", "/tmp/connection_registry.json")
+        return LocalFileConnectionRegistry(path)
+    if kind == REGISTRY_MONGO:
+        mongodb_uri = options.get("mongodb_uri") or os.environ.get("MONGODB_URI")
+        if not mongodb_uri:
+            raise ValueError("MONGODB_URI is required for the mongo connection registry")
+        return MongoConnectionRegistry(mongodb_uri)
+
+    raise ValueError(f"Unknown connection registry: {kind}")
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Dict, Any, Iterable
+
+
+class ConnectionResolver:
+    def __init__(self, source, ttl: float = 30, negative_ttl: float = 5, max_entries: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        # source is anything with get_connections(device_names) -> {device_name: connection_id},
+        # e.g. a ConnectionRegistry whose Mongo implementation issues a single $in query
+        self.source = source
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        self.entries: OrderedDict = OrderedDict()
+        self.devices_by_connection: Dict[str, str] = {}
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.lookups = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def resolve(self, device_name: str) -> Optional[str]:
+        return self.resolve_many([device_name]).get(device_name)
+
+    def resolve_many(self, device_names: Iterable[str]) -> Dict[str, str]:
+        resolved = {}
+        missing = []
+        now = self.clock()
+
+        with self.lock:
+            for device_name in dict.fromkeys(device_names):
+                entry = self.entries.get(device_name)
+                if entry is None or entry[1] <= now:
+                    missing.append(device_name)
+                    continue
+
+                self.entries.move_to_end(device_name)
+                if entry[0] is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+                    resolved[device_name] = entry[0]
+
+            self.misses += len(missing)
+
+        if missing:
+            found = self.source.get_connections(missing)
+            self.lookups += 1
+
+            with self.lock:
+                now = self.clock()
+                for device_name in missing:
+                    connection_id = found.get(device_name) or None
+                    # Offline devices are cached briefly so a hot loop cannot hammer the store
+                    self._store(device_name, connection_id, now + (self.ttl if connection_id else self.negative_ttl))
+                    if connection_id:
+                        resolved[device_name] = connection_id
+
+        return resolved
+
+    def _store(self, device_name: str, connection_id: Optional[str], expires_at: float):
+        self._forget(device_name)
+        self.entries[device_name] = (connection_id, expires_at)
+        if connection_id:
+            self.devices_by_connection[connection_id] = device_name
+
+        while len(self.entries) > self.max_entries:
+            evicted, (evicted_connection, _) = self.entries.popitem(last=False)
+            if evicted_connection:
+                self.devices_by_connection.pop(evicted_connection, None)
+            self.evictions += 1
+
+    def _forget(self, device_name: str) -> bool:
+        entry = self.entries.pop(device_name, None)
+        if entry is None:
+            return False
+        if entry[0]:
+            self.devices_by_connection.pop(entry[0], None)
+        return True
+
+    def invalidate(self, device_name: str):
+        with self.lock:
+            if self._forget(device_name):
+                self.invalidations += 1
+
+    def invalidate_connection(self, connection_id: str):
+        with self.lock:
+            device_name = self.devices_by_connection.get(connection_id)
+            if device_name and self._forget(device_name):
+                self.invalidations += 1
+
+    def invalidate_connections(self, connection_ids: Iterable[str]):
+        for connection_id in connection_ids:
+            self.invalidate_connection(connection_id)
+
+    def prime(self, device_name: str, connection_id: str):
+        with self.lock:
+            self._store(device_name, connection_id, self.clock() + self.ttl)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.devices_by_connection.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            requests = self.hits + self.negative_hits + self.misses
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.negative_hits) / requests if requests else 0.0,
+                "lookups": self.lookups,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
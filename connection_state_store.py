@@ -0,0 +1,298 @@
+import threading
+import time
+import logging
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import PyMongoError
+from typing import Optional, Dict, Any, List
+from metrics import MetricsRegistry, get_metrics_registry
+
+
+class ConnectionStateStore:
+    def __init__(self, mongodb_uri: Optional[str],
+                 database_name: str = "AWS_Webhook",
+                 collection_name: str = "Webhook_Details",
+                 max_pool_size: int = 10,
+                 min_pool_size: int = 1,
+                 server_selection_timeout_ms: int = 5000,
+                 metrics: Optional[MetricsRegistry] = None):
+        self.mongodb_uri = mongodb_uri
+        self.database_name = database_name
+        self.collection_name = collection_name
+        self.max_pool_size = max_pool_size
+        self.min_pool_size = min_pool_size
+        self.server_selection_timeout_ms = server_selection_timeout_ms
+
+        self.lock = threading.Lock()
+        self._client: Optional[MongoClient] = None
+        self._collection = None
+
+        self.is_healthy = False
+        self.consecutive_failures = 0
+        self.total_writes = 0
+        self.failed_writes = 0
+        self.last_error: Optional[str] = None
+        self.last_success_time: Optional[float] = None
+
+        registry = metrics or get_metrics_registry()
+        self.metric_write_time = registry.histogram("mongo_write_seconds", "Latency of state store writes", ["operation"])
+        self.metric_write_failures = registry.counter("mongo_write_failures_total", "Failed state store writes", ["operation"])
+        self.metric_documents = registry.counter("mongo_documents_written_total", "Device documents written")
+
+        self.logger = logging.getLogger(__name__)
+
+    def _get_collection(self):
+        with self.lock:
+            if self._collection is not None:
+                return self._collection
+
+            if not self.mongodb_uri:
+                self.logger.error("MongoDB URI not configured")
+                return None
+
+            try:
+                # MongoClient connects in the background, the first write
+                # performs server selection on the pooled socket.
+                self._client = MongoClient(
+                    self.mongodb_uri,
+                    serverSelectionTimeoutMS=self.server_selection_timeout_ms,
+                    maxPoolSize=self.max_pool_size,
+                    minPoolSize=self.min_pool_size,
+                    retryWrites=True
+                )
+                self._collection = self._client[self.database_name][self.collection_name]
+                self.logger.info("Connection state store client created")
+                return self._collection
+
+            except Exception as e:
+                self._record_failure(e)
+                self.logger.error(f"Database connection error: {e}")
+                return None
+
+    def _record_success(self):
+        self.is_healthy = True
+        self.consecutive_failures = 0
+        self.last_success_time = time.time()
+
+    def _record_failure(self, error: Exception):
+        self.is_healthy = False
+        self.consecutive_failures += 1
+        self.failed_writes += 1
+        self.last_error = str(error)
+
+    @staticmethod
+    def build_state(device_name: str, connection_id: str) -> Dict[str, Any]:
+        return {
+            "device_name": device_name,
+            "connection_id": connection_id,
+            "is_connected": bool(connection_id),
+            "last_updated": time.time()
+        }
+
+    def bulk_update_device_states(self, states: List[Dict[str, Any]]) -> bool:
+        if not states:
+            return True
+
+        collection = self._get_collection()
+        if collection is None:
+            return False
+
+        operations = [
+            UpdateOne({"_id": state["device_name"]}, {"$set": state}, upsert=True)
+            for state in states
+        ]
+
+        started = time.perf_counter()
+
+        try:
+            collection.bulk_write(operations, ordered=False)
+            self.metric_write_time.labels("bulk").observe(time.perf_counter() - started)
+            self.metric_documents.inc(len(operations))
+            self.total_writes += len(operations)
+            self._record_success()
+            return True
+
+        except PyMongoError as e:
+            self.metric_write_failures.labels("bulk").inc()
+            self._record_failure(e)
+            self.logger.error(f"Database bulk update error: {e}")
+            return False
+
+    def ping(self) -> bool:
+        collection = self._get_collection()
+        if collection is None:
+            return False
+
+        try:
+            self._client.admin.command("ping")
+            self._record_success()
+            return True
+        except PyMongoError as e:
+            self._record_failure(e)
+            self.logger.warning(f"Database health check failed: {e}")
+            return False
+
+    def get_health(self) -> Dict[str, Any]:
+        return {
+            "connected": self._client is not None,
+            "healthy": self.is_healthy,
+            "consecutive_failures": self.consecutive_failures,
+            "total_writes": self.total_writes,
+            "failed_writes": self.failed_writes,
+            "last_error": self.last_error,
+            "last_success_time": self.last_success_time
+        }
+
+    def close(self):
+        with self.lock:
+            if self._client is None:
+                return
+
+            try:
+                self._client.close()
+                self.logger.info("Connection state store closed")
+            except Exception as e:
+                self.logger.error(f"Error closing connection state store: {e}")
+            finally:
+                self._client = None
+                self._collection = None
+                self.is_healthy = False
+
+
+class WriteBehindStateWriter:
+    def __init__(self, state_store: ConnectionStateStore, flush_interval: float = 0.5, max_pending: int = 500,
+                 health_check_interval: Optional[float] = 30, max_retry_delay: float = 30):
+        self.state_store = state_store
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.health_check_interval = health_check_interval
+        self.last_health_check = time.monotonic()
+        self.max_retry_delay = max_retry_delay
+        self.retry_delay = 0.0
+        self.next_retry_at = 0.0
+        self.consecutive_failures = 0
+
+        self.condition = threading.Condition()
+        self.flush_lock = threading.Lock()
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.flush_thread: Optional[threading.Thread] = None
+        self.is_running = False
+
+        self.submitted_writes = 0
+        self.coalesced_writes = 0
+        self.flushed_writes = 0
+        self.flush_count = 0
+        self.failed_flushes = 0
+
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        with self.condition:
+            if self.is_running:
+                return
+            self.is_running = True
+
+        self.flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.flush_thread.start()
+        self.logger.info("Write-behind state writer started")
+
+    def stop(self, timeout: float = 5):
+        with self.condition:
+            self.is_running = False
+            self.condition.notify_all()
+
+        if self.flush_thread and self.flush_thread.is_alive():
+            self.flush_thread.join(timeout=timeout)
+        self.flush_thread = None
+
+        self.flush()
+        self.logger.info("Write-behind state writer stopped")
+
+    def submit(self, device_name: str, connection_id: str):
+        state = ConnectionStateStore.build_state(device_name, connection_id)
+
+        with self.condition:
+            self.submitted_writes += 1
+            if device_name in self.pending:
+                self.coalesced_writes += 1
+            self.pending[device_name] = state
+
+            if len(self.pending) >= self.max_pending:
+                self.condition.notify_all()
+
+        if not self.is_running:
+            self.flush()
+
+    def flush(self) -> int:
+        with self.flush_lock:
+            with self.condition:
+                if not self.pending:
+                    return 0
+                batch = self.pending
+                self.pending = {}
+
+            if self.state_store.bulk_update_device_states(list(batch.values())):
+                self.flushed_writes += len(batch)
+                self.flush_count += 1
+                # A successful write is as good as a ping
+                self.last_health_check = time.monotonic()
+                self.consecutive_failures = 0
+                self.retry_delay = 0.0
+                self.next_retry_at = 0.0
+                return len(batch)
+
+            self.failed_flushes += 1
+            self.consecutive_failures += 1
+            # Exponential backoff so an unreachable database is not hammered every flush_interval
+            self.retry_delay = min(self.max_retry_delay, self.flush_interval * 2 ** self.consecutive_failures)
+            self.next_retry_at = time.monotonic() + self.retry_delay
+            self.logger.warning(f"Write-behind flush failed {self.consecutive_failures} time(s) - "
+                                f"retrying {len(batch)} state(s) in {self.retry_delay:.1f} seconds")
+            with self.condition:
+                # Keep newer states submitted while the flush was in flight
+                for device_name, state in batch.items():
+                    self.pending.setdefault(device_name, state)
+            return 0
+
+    def _flush_loop(self):
+        while True:
+            with self.condition:
+                if not self.is_running:
+                    break
+                self.condition.wait(timeout=max(self.flush_interval, self.next_retry_at - time.monotonic()))
+                if not self.is_running:
+                    break
+                # A max_pending wakeup must not cut a backoff short
+                backing_off = time.monotonic() < self.next_retry_at
+
+            try:
+                if not backing_off:
+                    self.flush()
+                self._check_health()
+            except Exception as e:
+                self.logger.error(f"Write-behind flush error: {e}")
+
+    def _check_health(self):
+        # Writes only happen on connect/disconnect, so an idle store is pinged to keep get_health honest
+        if self.health_check_interval is None or not self.state_store.mongodb_uri:
+            return
+        now = time.monotonic()
+        if now - self.last_health_check < self.health_check_interval:
+            return
+        self.last_health_check = now
+        self.state_store.ping()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.condition:
+            pending = len(self.pending)
+
+        return {
+            "pending": pending,
+            "submitted_writes": self.submitted_writes,
+            "coalesced_writes": self.coalesced_writes,
+            "flushed_writes": self.flushed_writes,
+            "flush_count": self.flush_count,
+            "failed_flushes": self.failed_flushes,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_delay": self.retry_delay,
+            "last_error": self.state_store.last_error
+        }
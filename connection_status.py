@@ -0,0 +1,56 @@
+import threading
+import time
+from typing import Optional, Dict, Any, NamedTuple, Iterable, Union
+
+STATE_IDLE = "idle"
+STATE_CONNECTING = "connecting"
+STATE_CONNECTED = "connected"
+STATE_DISCONNECTED = "disconnected"
+STATE_RECONNECTING = "reconnecting"
+STATE_CIRCUIT_OPEN = "circuit_open"
+STATE_STOPPED = "stopped"
+
+
+class ConnectionStatus(NamedTuple):
+    state: str = STATE_IDLE
+    device_name: Optional[str] = None
+    running: bool = False
+    connection_id: Optional[str] = None
+    connection_attempts: int = 0
+    last_rtt_ms: Optional[float] = None
+    last_error: Optional[str] = None
+    updated_at: float = 0.0
+
+    @property
+    def connected(self) -> bool:
+        return self.state == STATE_CONNECTED
+
+    def to_dict(self) -> Dict[str, Any]:
+        status = self._asdict()
+        status["connected"] = self.connected
+        return status
+
+
+class StatusPublisher:
+    def __init__(self, initial: Optional[ConnectionStatus] = None):
+        # Readers only ever load this attribute; a tuple swap is atomic under the GIL
+        self.current = (initial or ConnectionStatus())._replace(updated_at=time.time())
+        self.condition = threading.Condition()
+        self.transitions = 0
+
+    def publish(self, **changes) -> ConnectionStatus:
+        with self.condition:
+            snapshot = self.current._replace(updated_at=time.time(), **changes)
+            if snapshot.state != self.current.state:
+                self.transitions += 1
+            self.current = snapshot
+            self.condition.notify_all()
+            return snapshot
+
+    def wait_for_state(self, state: Union[str, Iterable[str]], timeout: Optional[float] = None) -> bool:
+        states = {state} if isinstance(state, str) else set(state)
+        if self.current.state in states:
+            return True
+
+        with self.condition:
+            return self.condition.wait_for(lambda: self.current.state in states, timeout=timeout)
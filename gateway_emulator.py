@@ -0,0 +1,370 @@
+import argparse
+import asyncio
+import base64
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Dict, Any, Iterable
+import websockets as lambda_handler
+from ws_protocol import (
+    OPCODE_CONTINUATION, OPCODE_TEXT, OPCODE_BINARY, OPCODE_CLOSE, OPCODE_PING, OPCODE_PONG,
+    CLOSE_NORMAL, CLOSE_GOING_AWAY, CLOSE_UNSUPPORTED_DATA, CLOSE_INVALID_PAYLOAD, DEFAULT_MAX_FRAME_SIZE, DEFAULT_COMPRESSION_THRESHOLD,
+    WebSocketProtocolError, PerMessageDeflate, build_server_handshake, parse_http_head, encode_frame, encode_close_payload, read_frame
+)
+
+
+class GoneException(Exception):
+    pass
+
+
+class EmulatorExceptions:
+    GoneException = GoneException
+
+
+class EmulatorManagementClient:
+    exceptions = EmulatorExceptions
+
+    def __init__(self, emulator: "ApiGatewayEmulator", endpoint_url: str):
+        self.emulator = emulator
+        self.endpoint_url = endpoint_url
+
+    def post_to_connection(self, ConnectionId: str, Data: bytes) -> Dict[str, Any]:
+        self.emulator.post_to_connection(ConnectionId, Data)
+        return {}
+
+    def delete_connection(self, ConnectionId: str) -> Dict[str, Any]:
+        self.emulator.delete_connection(ConnectionId)
+        return {}
+
+
+class EmulatedConnection:
+    def __init__(self, connection_id: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 source_ip: str, deflate: Optional[PerMessageDeflate] = None):
+        self.connection_id = connection_id
+        self.reader = reader
+        self.writer = writer
+        self.source_ip = source_ip
+        self.deflate = deflate
+        self.connected_at = time.time()
+        self.write_lock = asyncio.Lock()
+
+    async def send(self, opcode: int, payload: bytes, compress: bool = False):
+        async with self.write_lock:
+            rsv1 = False
+            if compress and self.deflate:
+                payload, rsv1 = self.deflate.compress(payload)
+            self.writer.write(encode_frame(opcode, payload, mask=False, rsv1=rsv1))
+            await self.writer.drain()
+
+
+class ApiGatewayEmulator:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, stage: str = "production",
+                 handler: Optional[Callable[[Dict[str, Any], Any], Dict[str, Any]]] = None,
+                 routes: Optional[Iterable[str]] = None, route_selection_key: str = "action",
+                 max_concurrency: int = 32, max_size: int = DEFAULT_MAX_FRAME_SIZE,
+                 idle_timeout: Optional[float] = 600, compression: bool = False,
+                 compression_threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+                 compression_context_takeover: bool = True):
+        self.host = host
+        self.port = port
+        self.stage = stage
+        self.handler = handler or lambda_handler.websocket_handler
+        self.routes = frozenset(routes if routes is not None else lambda_handler.ROUTES)
+        self.route_selection_key = route_selection_key
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        # API Gateway itself never negotiates permessage-deflate, so the emulator only does when asked
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        self.compression_context_takeover = compression_context_takeover
+        self.api_id = uuid.uuid4().hex[:10]
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.thread: Optional[threading.Thread] = None
+        # Stands in for concurrent Lambda invocations
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="lambda")
+        self.connections: Dict[str, EmulatedConnection] = {}
+        self.pending_invocations: set = set()
+
+        self.invocations = 0
+        self.invocation_time = 0.0
+        self.failed_invocations = 0
+        self.messages_received = 0
+        self.posts = 0
+        self.gone_posts = 0
+        self.total_connections = 0
+        self.compressed_connections = 0
+
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def domain_name(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/{self.stage}"
+
+    def install(self):
+        # Routes every management API call the handler makes back into this emulator
+        lambda_handler.apigw_client_factory = lambda endpoint_url: EmulatorManagementClient(self, endpoint_url)
+        lambda_handler.clear_apigw_clients()
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.install()
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.logger.info(f"API Gateway emulator listening on {self.url}")
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+        for connection in list(self.connections.values()):
+            with contextlib.suppress(ConnectionError, OSError):
+                await connection.send(OPCODE_CLOSE, encode_close_payload(CLOSE_GOING_AWAY))
+            connection.writer.close()
+
+    def start_in_thread(self) -> str:
+        started = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            started.set()
+            loop.run_forever()
+            loop.run_until_complete(self.stop())
+            loop.close()
+
+        self.thread = threading.Thread(target=run, name="gateway-emulator", daemon=True)
+        self.thread.start()
+        started.wait()
+        return self.url
+
+    def stop_thread(self):
+        if self.loop and self.thread:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=5)
+            self.thread = None
+        self.executor.shutdown(wait=False)
+
+    def _build_event(self, route_key: str, event_type: str, connection: EmulatedConnection,
+                     body: Optional[str] = None) -> Dict[str, Any]:
+        now = time.time()
+        event = {
+            "requestContext": {
+                "routeKey": route_key,
+                "eventType": event_type,
+                "messageId": base64.b64encode(os.urandom(9)).decode("ascii") if event_type == "MESSAGE" else None,
+                "extendedRequestId": uuid.uuid4().hex,
+                "requestTime": time.strftime("%d/%b/%Y:%H:%M:%S +0000", time.gmtime(now)),
+                "messageDirection": "IN",
+                "stage": self.stage,
+                "connectedAt": int(connection.connected_at * 1000),
+                "requestTimeEpoch": int(now * 1000),
+                "identity": {"sourceIp": connection.source_ip},
+                "requestId": uuid.uuid4().hex,
+                "domainName": self.domain_name,
+                "connectionId": connection.connection_id,
+                "apiId": self.api_id
+            },
+            "isBase64Encoded": False
+        }
+        if body is not None:
+            event["body"] = body
+        return event
+
+    async def _invoke(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            result = await self.loop.run_in_executor(self.executor, self.handler, event, None)
+            return result or {"statusCode": 200}
+        except Exception as e:
+            self.failed_invocations += 1
+            self.logger.error(f"Handler error on {event['requestContext']['routeKey']}: {e}")
+            return {"statusCode": 502}
+        finally:
+            self.invocations += 1
+            self.invocation_time += time.perf_counter() - started
+
+    def _select_route(self, body: str) -> str:
+        # Mirrors the $request.body.action route selection expression
+        try:
+            route_key = json.loads(body).get(self.route_selection_key)
+        except (ValueError, AttributeError):
+            return "$default"
+        return route_key if route_key in self.routes else "$default"
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername") or ("127.0.0.1", 0)
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+            _, headers = parse_http_head(head)
+            key = headers.get("sec-websocket-key")
+            if not key:
+                raise WebSocketProtocolError("Missing Sec-WebSocket-Key")
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError, WebSocketProtocolError):
+            writer.close()
+            return
+
+        deflate = None
+        extension_headers = None
+        if self.compression:
+            deflate = PerMessageDeflate(False, self.compression_threshold, self.compression_context_takeover)
+            accepted = deflate.accept_offer(headers.get("sec-websocket-extensions"))
+            if accepted:
+                extension_headers = {"Sec-WebSocket-Extensions": accepted}
+            else:
+                deflate = None
+
+        connection_id = base64.b64encode(os.urandom(9)).decode("ascii")
+        connection = EmulatedConnection(connection_id, reader, writer, peer[0], deflate)
+
+        response = await self._invoke(self._build_event("$connect", "CONNECT", connection))
+        if not 200 <= response.get("statusCode", 200) < 300:
+            writer.write(b"HTTP/1.1 403 Forbidden\r\nContent-Length: 0\r\n\r\n")
+            with contextlib.suppress(ConnectionError, OSError):
+                await writer.drain()
+            writer.close()
+            return
+
+        writer.write(build_server_handshake(key, extension_headers))
+        await writer.drain()
+        self.connections[connection_id] = connection
+        self.total_connections += 1
+        if deflate:
+            self.compressed_connections += 1
+
+        try:
+            await self._receive_loop(connection)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, OSError, WebSocketProtocolError):
+            pass
+        finally:
+            if self.connections.pop(connection_id, None) is not None:
+                await self._invoke(self._build_event("$disconnect", "DISCONNECT", connection))
+            writer.close()
+
+    async def _receive_loop(self, connection: EmulatedConnection):
+        fragments: list[bytes] = []
+        message_compressed = False
+
+        while True:
+            fin, opcode, payload, rsv1 = await asyncio.wait_for(read_frame(connection.reader, self.max_size), self.idle_timeout)
+            if rsv1 and (opcode & 0x8 or opcode == OPCODE_CONTINUATION or not connection.deflate):
+                raise WebSocketProtocolError("Unexpected RSV1 bit on received frame")
+
+            if opcode == OPCODE_PING:
+                await connection.send(OPCODE_PONG, payload)
+                continue
+            if opcode == OPCODE_PONG:
+                continue
+            if opcode == OPCODE_CLOSE:
+                with contextlib.suppress(ConnectionError, OSError):
+                    await connection.send(OPCODE_CLOSE, payload[:2] or encode_close_payload(CLOSE_NORMAL))
+                return
+
+            if opcode == OPCODE_BINARY:
+                # API Gateway WebSocket APIs do not accept inbound binary frames and drop the client
+                self.logger.warning(f"Binary frame from {connection.connection_id} - closing with 1003")
+                with contextlib.suppress(ConnectionError, OSError):
+                    await connection.send(OPCODE_CLOSE, encode_close_payload(CLOSE_UNSUPPORTED_DATA, "Binary frames are not supported"))
+                return
+
+            if opcode == OPCODE_CONTINUATION:
+                fragments.append(payload)
+            else:
+                message_compressed = rsv1
+                fragments = [payload]
+            if not fin:
+                continue
+
+            data = b"".join(fragments)
+            fragments = []
+            if message_compressed:
+                data = connection.deflate.decompress(data, self.max_size)
+            self.messages_received += 1
+
+            try:
+                body = data.decode("utf-8")
+            except UnicodeDecodeError:
+                self.logger.warning(f"Invalid UTF-8 text frame from {connection.connection_id} - closing with 1007")
+                with contextlib.suppress(ConnectionError, OSError):
+                    await connection.send(OPCODE_CLOSE, encode_close_payload(CLOSE_INVALID_PAYLOAD, "Invalid UTF-8 in text frame"))
+                return
+            event = self._build_event(self._select_route(body), "MESSAGE", connection, body)
+
+            # Lambda invocations for one connection are not ordered either, so do not wait here
+            task = asyncio.ensure_future(self._invoke(event))
+            self.pending_invocations.add(task)
+            task.add_done_callback(self.pending_invocations.discard)
+
+    def post_to_connection(self, connection_id: str, data: bytes):
+        connection = self.connections.get(connection_id)
+        if connection is None:
+            self.gone_posts += 1
+            raise GoneException(f"Connection {connection_id} is gone")
+
+        future = asyncio.run_coroutine_threadsafe(connection.send(OPCODE_TEXT, bytes(data), compress=True), self.loop)
+        try:
+            future.result(timeout=10)
+        except (ConnectionError, OSError):
+            self.gone_posts += 1
+            raise GoneException(f"Connection {connection_id} is gone")
+        self.posts += 1
+
+    def delete_connection(self, connection_id: str):
+        connection = self.connections.get(connection_id)
+        if connection is None:
+            raise GoneException(f"Connection {connection_id} is gone")
+        self.loop.call_soon_threadsafe(connection.writer.close)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "active_connections": len(self.connections),
+            "total_connections": self.total_connections,
+            "compressed_connections": self.compressed_connections,
+            "messages_received": self.messages_received,
+            "invocations": self.invocations,
+            "failed_invocations": self.failed_invocations,
+            "invocation_avg_ms": (self.invocation_time / self.invocations * 1000) if self.invocations else 0.0,
+            "posts": self.posts,
+            "gone_posts": self.gone_posts
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local API Gateway WebSocket emulator for websocket_handler")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--stage", default="production")
+    parser.add_argument("--compression", action="store_true", help="accept permessage-deflate offers")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    emulator = ApiGatewayEmulator(args.host, args.port, args.stage, compression=args.compression)
+
+    async def serve():
+        await emulator.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await emulator.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
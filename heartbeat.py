@@ -0,0 +1,123 @@
+import threading
+import time
+from typing import Optional, Dict, Any
+
+API_GATEWAY_IDLE_TIMEOUT = 600
+
+ACTION_PING = "ping"
+ACTION_DEAD = "dead"
+
+
+class Heartbeat:
+    def __init__(self, interval: float = 30, min_interval: float = 10, max_interval: float = 120,
+                 pong_timeout: float = 10, max_missed_pongs: int = 2,
+                 idle_timeout: float = API_GATEWAY_IDLE_TIMEOUT, growth_factor: float = 1.5):
+        # Never let the interval drift past the gateway idle timeout
+        self.max_interval = min(max_interval, idle_timeout * 0.8)
+        self.min_interval = min(min_interval, self.max_interval)
+        self.initial_interval = max(self.min_interval, min(interval, self.max_interval))
+        self.pong_timeout = pong_timeout
+        self.max_missed_pongs = max_missed_pongs
+        self.growth_factor = growth_factor
+
+        self.lock = threading.Lock()
+        self.interval = self.initial_interval
+        self.last_ping_sent: Optional[float] = None
+        self.last_received: Optional[float] = None
+        self.next_ping_due = time.monotonic() + self.interval
+        self.awaiting_pong = False
+        self.missed_pongs = 0
+        self.last_rtt: Optional[float] = None
+        self.average_rtt: Optional[float] = None
+
+        self.pings_sent = 0
+        self.pongs_received = 0
+        self.pings_skipped = 0
+        self.dead_peers_detected = 0
+
+    @property
+    def tick_interval(self) -> float:
+        return max(1.0, min(self.pong_timeout, self.min_interval) / 2)
+
+    def reset(self):
+        with self.lock:
+            self.interval = self.initial_interval
+            self.last_ping_sent = None
+            self.last_received = time.monotonic()
+            self.next_ping_due = self.last_received + self.interval
+            self.awaiting_pong = False
+            self.missed_pongs = 0
+
+    def record_activity(self):
+        self.last_received = time.monotonic()
+
+    def record_ping_sent(self):
+        with self.lock:
+            self.last_ping_sent = time.monotonic()
+            self.awaiting_pong = True
+            self.pings_sent += 1
+
+    def record_pong(self) -> Optional[float]:
+        with self.lock:
+            now = time.monotonic()
+            self.last_received = now
+            if not self.awaiting_pong or self.last_ping_sent is None:
+                return None
+
+            rtt = now - self.last_ping_sent
+            self.awaiting_pong = False
+            self.missed_pongs = 0
+            self.pongs_received += 1
+            self.last_rtt = rtt
+            self.average_rtt = rtt if self.average_rtt is None else self.average_rtt * 0.8 + rtt * 0.2
+            self.interval = min(self.max_interval, self.interval * self.growth_factor)
+            self.next_ping_due = self.last_ping_sent + self.interval
+            return rtt
+
+    def poll(self) -> Optional[str]:
+        with self.lock:
+            now = time.monotonic()
+
+            if self.awaiting_pong:
+                if now - self.last_ping_sent < self.pong_timeout:
+                    return None
+
+                self.awaiting_pong = False
+                self.missed_pongs += 1
+                self.interval = self.min_interval
+                if self.missed_pongs >= self.max_missed_pongs:
+                    self.dead_peers_detected += 1
+                    return ACTION_DEAD
+                return self._ping_requested(now)
+
+            if now < self.next_ping_due:
+                return None
+
+            # Inbound traffic already proves the peer is alive, no ping needed
+            if self.last_received is not None and now - self.last_received < self.interval:
+                self.pings_skipped += 1
+                self.next_ping_due = self.last_received + self.interval
+                return None
+
+            return self._ping_requested(now)
+
+    def _ping_requested(self, now: float) -> str:
+        # In flight from the moment it is requested, so a slow sender never gets a second ping
+        # queued behind the first; record_ping_sent moves the clock to the real send time
+        self.awaiting_pong = True
+        self.last_ping_sent = now
+        return ACTION_PING
+
+    def get_state(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "interval": self.interval,
+                "awaiting_pong": self.awaiting_pong,
+                "missed_pongs": self.missed_pongs,
+                "last_rtt_ms": self.last_rtt * 1000 if self.last_rtt is not None else None,
+                "average_rtt_ms": self.average_rtt * 1000 if self.average_rtt is not None else None,
+                "pings_sent": self.pings_sent,
+                "pongs_received": self.pongs_received,
+                "pings_skipped": self.pings_skipped,
+                "dead_peers_detected": self.dead_peers_detected
+            }
@@ -0,0 +1,79 @@
+import atexit
+import gzip
+import os
+import queue
+import shutil
+import threading
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class DeferredQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue never leaves the process, so formatting is left to the listener thread
+        return record
+
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    def __init__(self, filename: str, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5,
+                 compress: bool = False, encoding: Optional[str] = "utf-8"):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding)
+        self.compress = compress
+        if compress:
+            self.namer = self._gzip_name
+            self.rotator = self._gzip_rotate
+
+    @staticmethod
+    def _gzip_name(name: str) -> str:
+        return name + ".gz"
+
+    @staticmethod
+    def _gzip_rotate(source: str, destination: str):
+        with open(source, "rb") as source_file, gzip.open(destination, "wb") as destination_file:
+            shutil.copyfileobj(source_file, destination_file)
+        os.remove(source)
+
+
+_listener: Optional[QueueListener] = None
+_listener_lock = threading.Lock()
+
+def setup_logging(log_path: str, level: int = logging.INFO, max_bytes: int = 10 * 1024 * 1024,
+                  backup_count: int = 5, compress: bool = False, console: bool = True,
+                  force: bool = False) -> Optional[QueueListener]:
+    global _listener
+    with _listener_lock:
+        root = logging.getLogger()
+        # Like basicConfig, an application that configured logging first keeps its own handlers
+        if _listener is not None or (root.handlers and not force):
+            return _listener
+
+        formatter = logging.Formatter(LOG_FORMAT)
+        handlers = [CompressingRotatingFileHandler(log_path, max_bytes, backup_count, compress)]
+        if console:
+            handlers.append(logging.StreamHandler())
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        records = queue.SimpleQueue()
+        _listener = QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+
+        # Callers only enqueue; file writes, rotation and compression happen on the listener thread
+        root.addHandler(DeferredQueueHandler(records))
+        root.setLevel(level)
+
+        atexit.register(stop_logging)
+        return _listener
+
+def stop_logging():
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,136 @@
+import queue
+import threading
+import logging
+import itertools
+from typing import Callable, Optional, Dict, Any, Hashable
+
+
+class MessageDispatcher:
+    def __init__(self, max_workers: int = 4, max_queue_size: int = 1000, enqueue_timeout: float = 0.5):
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.enqueue_timeout = enqueue_timeout
+
+        self.lock = threading.Lock()
+        self.lanes: list[queue.Queue] = []
+        self.workers: list[threading.Thread] = []
+        self.handler_limits: Dict[str, threading.BoundedSemaphore] = {}
+        self.round_robin = itertools.count()
+        self.is_running = False
+
+        self.dispatched_tasks = 0
+        self.completed_tasks = 0
+        self.failed_tasks = 0
+        self.rejected_tasks = 0
+        self.receive_blocked_count = 0
+        self.receive_blocked_total = 0.0
+        self.receive_blocked_max = 0.0
+        self.receive_blocked_last = 0.0
+
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        with self.lock:
+            if self.is_running:
+                return
+            self.is_running = True
+
+            # One lane per worker, tasks sharing a key always land on the same
+            # lane so they run in submission order.
+            self.lanes = [queue.Queue(maxsize=self.max_queue_size) for _ in range(self.max_workers)]
+            self.workers = []
+            for index, lane in enumerate(self.lanes):
+                worker = threading.Thread(target=self._worker_loop, args=(lane,), name=f"dispatch-worker-{index}", daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+        self.logger.info(f"Message dispatcher started with {self.max_workers} workers")
+
+    def stop(self, timeout: float = 5):
+        with self.lock:
+            if not self.is_running:
+                return
+            self.is_running = False
+            lanes = self.lanes
+            workers = self.workers
+
+        for lane in lanes:
+            try:
+                lane.put(None, timeout=timeout)
+            except queue.Full:
+                self.logger.warning("Dispatcher lane full while stopping")
+
+        for worker in workers:
+            worker.join(timeout=timeout)
+
+        self.logger.info("Message dispatcher stopped")
+
+    def set_handler_limit(self, name: str, max_concurrency: int):
+        self.handler_limits[name] = threading.BoundedSemaphore(max_concurrency)
+
+    def dispatch(self, handler: Callable, *args, key: Optional[Hashable] = None, name: Optional[str] = None) -> bool:
+        if not self.is_running:
+            self._run_task(handler, args, name)
+            return True
+
+        lanes = self.lanes
+        if key is None:
+            lane = lanes[next(self.round_robin) % len(lanes)]
+        else:
+            lane = lanes[hash(key) % len(lanes)]
+
+        try:
+            lane.put((handler, args, name or getattr(handler, "__name__", "handler")), timeout=self.enqueue_timeout)
+            self.dispatched_tasks += 1
+            return True
+        except queue.Full:
+            self.rejected_tasks += 1
+            self.logger.error(f"Dispatcher queue full - dropped task for key: {key}")
+            return False
+
+    def record_receive_blocked(self, duration: float):
+        self.receive_blocked_count += 1
+        self.receive_blocked_total += duration
+        self.receive_blocked_last = duration
+        if duration > self.receive_blocked_max:
+            self.receive_blocked_max = duration
+
+    def _worker_loop(self, lane: queue.Queue):
+        while True:
+            task = lane.get()
+            if task is None:
+                break
+
+            handler, args, name = task
+            self._run_task(handler, args, name)
+
+    def _run_task(self, handler: Callable, args: tuple, name: Optional[str]):
+        limit = self.handler_limits.get(name) if name else None
+        if limit:
+            limit.acquire()
+
+        try:
+            handler(*args)
+            self.completed_tasks += 1
+        except Exception as e:
+            self.failed_tasks += 1
+            self.logger.error(f"Error in dispatched handler '{name}': {e}")
+        finally:
+            if limit:
+                limit.release()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        count = self.receive_blocked_count
+
+        return {
+            "workers": self.max_workers,
+            "queue_depth": sum(lane.qsize() for lane in self.lanes),
+            "dispatched_tasks": self.dispatched_tasks,
+            "completed_tasks": self.completed_tasks,
+            "failed_tasks": self.failed_tasks,
+            "rejected_tasks": self.rejected_tasks,
+            "receive_blocked_count": count,
+            "receive_blocked_avg_ms": (self.receive_blocked_total / count * 1000) if count else 0.0,
+            "receive_blocked_max_ms": self.receive_blocked_max * 1000,
+            "receive_blocked_last_ms": self.receive_blocked_last * 1000
+        }
@@ -0,0 +1,99 @@
+import json
+import re
+import logging
+from typing import Callable, Optional, Dict, Any, Tuple, List
+
+
+class MessageRouter:
+    def __init__(self, type_key: str = "message", action_key: str = "action"):
+        self.type_key = type_key
+        self.action_key = action_key
+
+        self.type_handlers: Dict[Any, Callable] = {}
+        self.action_handlers: Dict[Any, Callable] = {}
+        self.raw_handlers: Dict[str, Callable[[str], None]] = {}
+        self.predicate_handlers: List[Tuple[Callable[[Dict[str, Any]], bool], Callable]] = []
+        self.wildcard_handler: Optional[Callable] = None
+
+        # Sniffs the type marker out of a frame without decoding the whole payload; anchored to the
+        # first key of the top-level object, so a nested "message" field can never match
+        self._type_pattern = re.compile(r'\s*\{\s*"%s"\s*:\s*"((?:[^"\\]|\\.)*)"' % re.escape(type_key))
+
+        self.logger = logging.getLogger(__name__)
+
+    def register(self, message_type: Any, handler: Callable[[Dict[str, Any]], None]):
+        self.type_handlers[message_type] = handler
+
+    def register_action(self, action: Any, handler: Callable[[Dict[str, Any]], None]):
+        self.action_handlers[action] = handler
+
+    def register_raw(self, message_type: str, handler: Callable[[str], None]):
+        self.raw_handlers[message_type] = handler
+
+    def register_predicate(self, predicate: Callable[[Dict[str, Any]], bool], handler: Callable[[Dict[str, Any]], None]):
+        self.predicate_handlers.append((predicate, handler))
+
+    def set_wildcard(self, handler: Optional[Callable[[Dict[str, Any]], None]]):
+        self.wildcard_handler = handler
+
+    def unregister(self, message_type: Any):
+        self.type_handlers.pop(message_type, None)
+        self.raw_handlers.pop(message_type, None)
+
+    def unregister_action(self, action: Any):
+        self.action_handlers.pop(action, None)
+
+    def resolve(self, message_data: Any) -> Optional[Callable]:
+        if isinstance(message_data, dict):
+            handler = self.type_handlers.get(message_data.get(self.type_key))
+            if handler is not None:
+                return handler
+
+            handler = self.action_handlers.get(message_data.get(self.action_key))
+            if handler is not None:
+                return handler
+
+            for predicate, predicate_handler in self.predicate_handlers:
+                try:
+                    if predicate(message_data):
+                        return predicate_handler
+                except Exception as e:
+                    self.logger.error(f"Error in route predicate: {e}")
+
+        return self.wildcard_handler
+
+    def resolve_frame(self, frame: str) -> Tuple[Optional[Callable], Any]:
+        if self.raw_handlers:
+            match = self._type_pattern.match(frame)
+            if match:
+                message_type = match.group(1)
+                if "\\" in message_type:
+                    message_type = json.loads(f'"{message_type}"')
+                handler = self.raw_handlers.get(message_type)
+                if handler is not None:
+                    return handler, frame
+
+        message_data = json.loads(frame)
+        # Frames whose type is not the first key still reach their raw handler, just after a full decode
+        if self.raw_handlers and isinstance(message_data, dict):
+            message_type = message_data.get(self.type_key)
+            handler = self.raw_handlers.get(message_type) if isinstance(message_type, str) else None
+            if handler is not None:
+                return handler, frame
+        return self.resolve(message_data), message_data
+
+    def route(self, message_data: Any) -> bool:
+        handler = self.resolve(message_data)
+        if handler is None:
+            return False
+
+        handler(message_data)
+        return True
+
+    def route_frame(self, frame: str) -> bool:
+        handler, payload = self.resolve_frame(frame)
+        if handler is None:
+            return False
+
+        handler(payload)
+        return True
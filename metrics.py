@@ -0,0 +1,367 @@
+import bisect
+import threading
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from abc import ABC, abstractmethod
+from typing import Callable, Optional, Dict, Any, List, Tuple, Iterable
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class CounterChild:
+    __slots__ = ("lock", "value")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        with self.lock:
+            self.value += amount
+
+
+class GaugeChild:
+    __slots__ = ("lock", "value", "functions")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+        self.functions: Dict[Any, Callable[[], float]] = {}
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self.lock:
+            self.value -= amount
+
+    def set_function(self, function: Callable[[], float], owner: Any = None):
+        # Evaluated only at scrape time, so the hot path pays nothing
+        with self.lock:
+            self.functions.pop(owner, None)
+            self.functions[owner] = function
+
+    def clear_function(self, owner: Any = None):
+        with self.lock:
+            self.functions.pop(owner, None)
+
+    def get(self) -> float:
+        functions = self.functions
+        if functions:
+            # The most recent owner's function wins until that owner releases it
+            function = list(functions.values())[-1]
+            try:
+                return function()
+            except Exception:
+                return float("nan")
+        return self.value
+
+
+class HistogramChild:
+    __slots__ = ("lock", "buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self.lock:
+            return list(self.counts), self.sum, self.count
+
+
+class Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.children: Dict[Tuple[str, ...], Any] = {}
+        self.owners: Dict[Tuple[str, ...], set] = {}
+        self._default = None if self.labelnames else self._get_child(())
+
+    @abstractmethod
+    def _new_child(self):
+        pass
+
+    def _get_child(self, labelvalues: Tuple[str, ...]):
+        child = self.children.get(labelvalues)
+        if child is None:
+            with self.lock:
+                child = self.children.get(labelvalues)
+                if child is None:
+                    child = self._new_child()
+                    self.children[labelvalues] = child
+        return child
+
+    def _label_key(self, labelvalues, labelkwargs) -> Tuple[str, ...]:
+        if labelkwargs:
+            labelvalues = tuple(str(labelkwargs[name]) for name in self.labelnames)
+        else:
+            labelvalues = tuple(str(value) for value in labelvalues)
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return labelvalues
+
+    def labels(self, *labelvalues, **labelkwargs):
+        return self._get_child(self._label_key(labelvalues, labelkwargs))
+
+    def bind(self, owner: Any, *labelvalues, **labelkwargs):
+        # Owned children stay exported until every owner that bound them has released them
+        key = self._label_key(labelvalues, labelkwargs)
+        child = self._get_child(key)
+        with self.lock:
+            self.owners.setdefault(key, set()).add(owner)
+        return child
+
+    def release(self, owner: Any, *labelvalues, **labelkwargs):
+        key = self._label_key(labelvalues, labelkwargs)
+        with self.lock:
+            child = self.children.get(key)
+            if isinstance(child, GaugeChild):
+                child.clear_function(owner)
+            owners = self.owners.get(key)
+            if owners is None:
+                return
+            owners.discard(owner)
+            if not owners:
+                del self.owners[key]
+                self.children.pop(key, None)
+
+    def remove(self, *labelvalues):
+        key = tuple(str(value) for value in labelvalues)
+        with self.lock:
+            self.children.pop(key, None)
+            self.owners.pop(key, None)
+
+    def _items(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        with self.lock:
+            return list(self.children.items())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+    def collect(self) -> Dict[str, Any]:
+        return {",".join(labels): child.value for labels, child in self._items()}
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(child.value)}"
+                for labels, child in self._items()]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return GaugeChild()
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._default.dec(amount)
+
+    def set_function(self, function: Callable[[], float], owner: Any = None):
+        self._default.set_function(function, owner)
+
+    def collect(self) -> Dict[str, Any]:
+        return {",".join(labels): child.get() for labels, child in self._items()}
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(child.get())}"
+                for labels, child in self._items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def collect(self) -> Dict[str, Any]:
+        collected = {}
+        for labels, child in self._items():
+            counts, total, count = child.snapshot()
+            cumulative = 0
+            buckets = {}
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                buckets[_format_value(bound)] = cumulative
+            collected[",".join(labels)] = {"count": count, "sum": total, "buckets": buckets}
+        return collected
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, child in self._items():
+            counts, total, count = child.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric_class, name: str, documentation: str, labelnames: Iterable[str], **options) -> Metric:
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = metric_class(name, documentation, labelnames, **options)
+                self.metrics[name] = metric
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {metric.name: {"type": metric.kind, "labels": list(metric.labelnames), "values": metric.collect()}
+                for metric in metrics}
+
+    def render_prometheus(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server: Optional[ThreadingHTTPServer] = None
+        self.thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        if self.server:
+            return
+
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-server", daemon=True)
+        self.thread.start()
+        self.logger.info(f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+_metrics_registry: Optional[MetricsRegistry] = None
+_metrics_servers: Dict[Tuple[str, int], MetricsServer] = {}
+_metrics_lock = threading.Lock()
+
+def get_metrics_registry() -> MetricsRegistry:
+    global _metrics_registry
+    with _metrics_lock:
+        if _metrics_registry is None:
+            _metrics_registry = MetricsRegistry()
+        return _metrics_registry
+
+def start_metrics_server(port: int = 9464, host: str = "127.0.0.1",
+                         registry: Optional[MetricsRegistry] = None) -> MetricsServer:
+    registry = registry or get_metrics_registry()
+    with _metrics_lock:
+        server = _metrics_servers.get((host, port))
+        if server is None:
+            server = MetricsServer(registry, host, port)
+            server.start()
+            _metrics_servers[(host, port)] = server
+        elif server.registry is not registry:
+            raise ValueError(f"Metrics endpoint {host}:{port} already serves another registry")
+        return server
@@ -0,0 +1,148 @@
+import threading
+import logging
+import os
+from dotenv import dotenv_values
+from typing import Callable, Optional, Dict, Any, List
+from command_queue import RESULT_QUEUED, RESULT_DROPPED_OLDEST
+from command_worker import CommandWorker
+from connection_state_store import ConnectionStateStore, WriteBehindStateWriter
+from message_dispatcher import MessageDispatcher
+from websocket_client_connector import WebSocketManager, DEFAULT_WS_URL
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+class MultiDeviceManager:
+    def __init__(self, default_ws_url: str = DEFAULT_WS_URL, max_workers: int = 8, mongodb_uri: Optional[str] = None,
+                 spool_directory: Optional[str] = None, command_workers: int = 2):
+        self.default_ws_url = default_ws_url
+        self.spool_directory = spool_directory
+        self.MONGODB_URI = mongodb_uri or dotenv_values(os.path.join(script_dir, ".env")).get("MONGODB_URI")
+
+        self.lock = threading.Lock()
+        self.sessions: Dict[str, WebSocketManager] = {}
+        self.is_running = False
+
+        self.state_store = ConnectionStateStore(self.MONGODB_URI, max_pool_size=max(10, max_workers))
+        self.state_writer = WriteBehindStateWriter(self.state_store)
+        self.dispatcher = MessageDispatcher(max_workers=max_workers)
+        # Every session's commands run here rather than on a command thread per device
+        self.command_worker = CommandWorker(workers=command_workers)
+
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        with self.lock:
+            if self.is_running:
+                return
+            self.is_running = True
+            sessions = list(self.sessions.values())
+
+        self.state_writer.start()
+        self.dispatcher.start()
+        self.command_worker.start()
+
+        for session in sessions:
+            session.start_manager()
+
+        self.logger.info("MultiDeviceManager started")
+
+    def stop(self):
+        self.logger.info("Stopping MultiDeviceManager")
+
+        with self.lock:
+            self.is_running = False
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+
+        for session in sessions:
+            self._stop_session(session)
+
+        self.command_worker.stop()
+        self.dispatcher.stop()
+        self.state_writer.stop()
+        self.state_store.close()
+        self.logger.info("MultiDeviceManager stopped")
+
+    def add_device(self, device_name: str, ws_url: Optional[str] = None, auto_start: bool = True,
+                   status_callback: Optional[Callable[[str, Any], None]] = None) -> WebSocketManager:
+        with self.lock:
+            if device_name in self.sessions:
+                self.logger.info(f"Device already registered: {device_name}")
+                return self.sessions[device_name]
+
+            session = WebSocketManager(
+                device_name=device_name,
+                ws_url=ws_url or self.default_ws_url,
+                state_store=self.state_store,
+                state_writer=self.state_writer,
+                dispatcher=self.dispatcher,
+                command_worker=self.command_worker,
+                spool_directory=self.spool_directory
+            )
+            if status_callback:
+                session.add_status_callback(status_callback)
+            self.sessions[device_name] = session
+            start_session = auto_start and self.is_running
+
+        self.logger.info(f"Device added: {device_name}")
+        if start_session:
+            session.start_manager()
+        return session
+
+    def remove_device(self, device_name: str) -> bool:
+        with self.lock:
+            session = self.sessions.pop(device_name, None)
+
+        if session is None:
+            self.logger.warning(f"Cannot remove unknown device: {device_name}")
+            return False
+
+        self._stop_session(session)
+        self.logger.info(f"Device removed: {device_name}")
+        return True
+
+    def _stop_session(self, session: WebSocketManager):
+        try:
+            session.stop_manager()
+        except Exception as e:
+            self.logger.error(f"Error stopping device {session.device_name}: {e}")
+
+    def get_session(self, device_name: str) -> Optional[WebSocketManager]:
+        with self.lock:
+            return self.sessions.get(device_name)
+
+    def list_devices(self) -> List[str]:
+        with self.lock:
+            return list(self.sessions.keys())
+
+    def send_command(self, device_name: str, command: str, data: Any = None) -> bool:
+        session = self.get_session(device_name)
+        if session is None:
+            self.logger.warning(f"Cannot send command '{command}' - unknown device: {device_name}")
+            return False
+
+        return session.send_command(command, data) in (RESULT_QUEUED, RESULT_DROPPED_OLDEST)
+
+    def get_status(self) -> Dict[str, Any]:
+        with self.lock:
+            sessions = list(self.sessions.values())
+
+        return {
+            "running": self.is_running,
+            "device_count": len(sessions),
+            "connected_count": sum(1 for session in sessions if session.is_websocket_connected()),
+            "devices": {
+                session.device_name: {
+                    "connected": bool(session.is_websocket_connected()),
+                    "running": session.is_running,
+                    "connection_attempts": session.connection_attempts,
+                    "ws_url": session.ws_url
+                }
+                for session in sessions
+            },
+            "database": self.state_store.get_health(),
+            "write_behind": self.state_writer.get_stats(),
+            "dispatcher": self.dispatcher.get_metrics(),
+            "command_worker": self.command_worker.get_metrics()
+        }
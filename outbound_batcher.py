@@ -0,0 +1,82 @@
+from typing import Callable, Optional, Dict, Any, List, NamedTuple, Tuple
+from compact_protocol import PROTOCOL_JSON, is_compact, encode_message
+
+BATCH_ACTION = "batch"
+
+
+class OutboundMessage(NamedTuple):
+    payload: Dict[str, Any]
+    callback: Optional[Callable[[bool, Optional[Exception]], None]] = None
+
+
+class OutboundBatcher:
+    def __init__(self, window: float = 0.05, max_messages: int = 50, max_bytes: int = 32 * 1024,
+                 action: str = BATCH_ACTION):
+        self.window = window
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.action = action
+
+        self._prefix = '{"action": "%s", "messages": [' % action
+        self._suffix = "]}"
+        self._overhead = len(self._prefix) + len(self._suffix)
+
+        self.pending: List[OutboundMessage] = []
+        self.pending_frames: List[str] = []
+        self.pending_bytes = 0
+
+        self.batches_sent = 0
+        self.messages_batched = 0
+        self.frames_saved = 0
+
+    def has_pending(self) -> bool:
+        return bool(self.pending)
+
+    def fits(self, frame: str) -> bool:
+        # +1 for the separating comma
+        return self._overhead + self.pending_bytes + len(frame) + 1 <= self.max_bytes
+
+    def add(self, message: OutboundMessage, frame: str) -> bool:
+        self.pending.append(message)
+        self.pending_frames.append(frame)
+        self.pending_bytes += len(frame) + 1
+        return len(self.pending) >= self.max_messages or self.pending_bytes + self._overhead >= self.max_bytes
+
+    def envelope(self, messages: List[OutboundMessage]) -> Dict[str, Any]:
+        return {"action": self.action, "messages": [message.payload for message in messages]}
+
+    def drain(self, protocol: str = PROTOCOL_JSON) -> Tuple[Optional[str], List[OutboundMessage]]:
+        if not self.pending:
+            return None, []
+
+        messages = self.pending
+        frames = self.pending_frames
+        self.pending = []
+        self.pending_frames = []
+        self.pending_bytes = 0
+
+        if len(frames) == 1:
+            return frames[0], messages
+
+        self.batches_sent += 1
+        self.messages_batched += len(frames)
+        self.frames_saved += len(frames) - 1
+
+        # Compact frames cannot be spliced into a JSON array, so those batches are encoded as one message
+        if protocol != PROTOCOL_JSON or any(is_compact(frame) for frame in frames):
+            return encode_message(self.envelope(messages), protocol), messages
+
+        # Payloads are already serialized, so the envelope is built by joining strings
+        return self._prefix + ",".join(frames) + self._suffix, messages
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "window": self.window,
+            "max_messages": self.max_messages,
+            "max_bytes": self.max_bytes,
+            "pending": len(self.pending),
+            "batches_sent": self.batches_sent,
+            "messages_batched": self.messages_batched,
+            "frames_saved": self.frames_saved
+        }
+
@@ -0,0 +1,261 @@
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+import logging
+from typing import Callable, Optional, Dict, Any, Iterator, Tuple, BinaryIO
+
+RECORD_HEADER = struct.Struct("!IdI")
+CURSOR_FILE = "cursor"
+SEGMENT_PATTERN = re.compile(r"^segment-(\d{8})\.log$")
+
+
+class SpooledForReplay(Exception):
+    # Handed to send callbacks in place of the send error: the frame is on disk and goes out
+    # on the next replay, unless max_age or max_total_bytes drop it first
+    def __init__(self, cause: Exception):
+        super().__init__(f"Spooled for replay after send failure: {cause}")
+        self.cause = cause
+
+
+class OutboundSpool:
+    def __init__(self, directory: str, segment_max_bytes: int = 1024 * 1024,
+                 max_total_bytes: int = 64 * 1024 * 1024, max_age: Optional[float] = 24 * 60 * 60,
+                 fsync: bool = False):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.max_total_bytes = max_total_bytes
+        self.max_age = max_age
+        self.fsync = fsync
+
+        self.lock = threading.Lock()
+        self.segments: list[int] = []
+        self.active_file: Optional[BinaryIO] = None
+        self.active_size = 0
+        self.cursor_segment = 0
+        self.cursor_offset = 0
+
+        self.appended_records = 0
+        self.replayed_records = 0
+        self.expired_records = 0
+        self.dropped_segments = 0
+
+        self.logger = logging.getLogger(__name__)
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_state()
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment_id:08d}.log")
+
+    def _load_state(self):
+        for name in os.listdir(self.directory):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                self.segments.append(int(match.group(1)))
+        self.segments.sort()
+
+        cursor_path = os.path.join(self.directory, CURSOR_FILE)
+        try:
+            with open(cursor_path, "r") as file:
+                segment_id, offset = file.read().split()
+                self.cursor_segment, self.cursor_offset = int(segment_id), int(offset)
+        except (OSError, ValueError):
+            self.cursor_segment, self.cursor_offset = (self.segments[0] if self.segments else 1), 0
+
+        # Segments older than the cursor were fully acknowledged before a restart
+        for segment_id in [s for s in self.segments if s < self.cursor_segment]:
+            self._delete_segment(segment_id)
+
+        if not self.segments:
+            self.segments.append(max(self.cursor_segment, 1))
+            self.cursor_segment, self.cursor_offset = self.segments[0], 0
+
+        if self.cursor_segment not in self.segments:
+            self.cursor_segment, self.cursor_offset = self.segments[0], 0
+
+        self._truncate_torn_tail(self.segments[-1])
+        self._open_active()
+
+    def _truncate_torn_tail(self, segment_id: int):
+        # A crash mid-append can leave a partial record that would block replay
+        valid_end = 0
+        for next_offset, _, _ in self._read_records(segment_id, 0):
+            valid_end = next_offset
+
+        path = self._segment_path(segment_id)
+        if os.path.exists(path) and os.path.getsize(path) > valid_end:
+            self.logger.warning(f"Truncating torn tail of spool segment {segment_id}")
+            with open(path, "r+b") as file:
+                file.truncate(valid_end)
+
+    def _open_active(self):
+        path = self._segment_path(self.segments[-1])
+        self.active_file = open(path, "ab")
+        self.active_size = self.active_file.tell()
+
+    def _save_cursor(self):
+        cursor_path = os.path.join(self.directory, CURSOR_FILE)
+        temp_path = cursor_path + ".tmp"
+        with open(temp_path, "w") as file:
+            file.write(f"{self.cursor_segment} {self.cursor_offset}")
+        os.replace(temp_path, cursor_path)
+
+    def _delete_segment(self, segment_id: int):
+        try:
+            os.remove(self._segment_path(segment_id))
+        except FileNotFoundError:
+            pass
+        if segment_id in self.segments:
+            self.segments.remove(segment_id)
+
+    def _roll_segment(self):
+        self.active_file.close()
+        self.segments.append(self.segments[-1] + 1)
+        self._open_active()
+
+    def append(self, frame: str) -> bool:
+        payload = frame.encode("utf-8")
+        record = RECORD_HEADER.pack(len(payload), time.time(), zlib.crc32(payload)) + payload
+
+        with self.lock:
+            try:
+                if self.active_file is None:
+                    self._open_active()
+                if self.active_size and self.active_size + len(record) > self.segment_max_bytes:
+                    self._roll_segment()
+
+                self.active_file.write(record)
+                self.active_file.flush()
+                if self.fsync:
+                    os.fsync(self.active_file.fileno())
+                self.active_size += len(record)
+                self.appended_records += 1
+
+                self._enforce_size_limit()
+                return True
+
+            except OSError as e:
+                self.logger.error(f"Error appending to outbound spool: {e}")
+                return False
+
+    def _pending_bytes(self) -> int:
+        total = 0
+        for segment_id in self.segments:
+            if segment_id == self.segments[-1]:
+                total += self.active_size
+            else:
+                try:
+                    total += os.path.getsize(self._segment_path(segment_id))
+                except OSError:
+                    pass
+        return total - self.cursor_offset
+
+    def _enforce_size_limit(self):
+        while len(self.segments) > 1 and self._pending_bytes() > self.max_total_bytes:
+            oldest = self.segments[0]
+            self._delete_segment(oldest)
+            self.dropped_segments += 1
+            self.cursor_segment, self.cursor_offset = self.segments[0], 0
+            self.logger.warning(f"Outbound spool over {self.max_total_bytes} bytes - dropped segment {oldest}")
+
+    def _read_records(self, segment_id: int, start: int) -> Iterator[Tuple[int, float, bytes]]:
+        path = self._segment_path(segment_id)
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            return
+
+        with file:
+            size = os.fstat(file.fileno()).st_size
+            if size <= start:
+                return
+
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                offset = start
+                while offset + RECORD_HEADER.size <= size:
+                    length, timestamp, checksum = RECORD_HEADER.unpack_from(mapped, offset)
+                    body_start = offset + RECORD_HEADER.size
+                    body_end = body_start + length
+                    if body_end > size:
+                        break
+
+                    payload = mapped[body_start:body_end]
+                    if zlib.crc32(payload) != checksum:
+                        self.logger.error(f"Corrupt record in spool segment {segment_id} at offset {offset}")
+                        break
+
+                    offset = body_end
+                    yield offset, timestamp, payload
+
+    def replay(self, send: Callable[[str], bool], max_records: Optional[int] = None) -> int:
+        sent = 0
+
+        with self.lock:
+            cursor = (self.cursor_segment, self.cursor_offset)
+            now = time.time()
+            if self.active_file is None:
+                self._open_active()
+            self.active_file.flush()
+
+            for segment_id in list(self.segments):
+                is_active = segment_id == self.segments[-1]
+                start = self.cursor_offset if segment_id == self.cursor_segment else 0
+
+                for next_offset, timestamp, payload in self._read_records(segment_id, start):
+                    if self.max_age is not None and now - timestamp > self.max_age:
+                        self.expired_records += 1
+                    elif max_records is not None and sent >= max_records:
+                        self._save_cursor()
+                        return sent
+                    elif not send(payload.decode("utf-8")):
+                        self._save_cursor()
+                        return sent
+                    else:
+                        sent += 1
+                        self.replayed_records += 1
+
+                    self.cursor_segment, self.cursor_offset = segment_id, next_offset
+
+                # Everything in this segment is acknowledged, compact it away; an empty
+                # active segment has nothing to reclaim, rolling it would only burn segment ids
+                if is_active:
+                    if self.active_size and self.cursor_offset >= self.active_size:
+                        self._roll_segment()
+                        self._delete_segment(segment_id)
+                        self.cursor_segment, self.cursor_offset = self.segments[-1], 0
+                else:
+                    self._delete_segment(segment_id)
+                    self.cursor_segment, self.cursor_offset = self.segments[0], 0
+
+            if (self.cursor_segment, self.cursor_offset) != cursor:
+                self._save_cursor()
+
+        if sent:
+            self.logger.info(f"Replayed {sent} spooled messages")
+        return sent
+
+    def has_pending(self) -> bool:
+        with self.lock:
+            return self._pending_bytes() > 0
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "segments": len(self.segments),
+                "pending_bytes": self._pending_bytes(),
+                "appended_records": self.appended_records,
+                "replayed_records": self.replayed_records,
+                "expired_records": self.expired_records,
+                "dropped_segments": self.dropped_segments
+            }
+
+    def close(self):
+        with self.lock:
+            if self.active_file:
+                self.active_file.close()
+                self.active_file = None
+            self._save_cursor()
@@ -2,7 +2,6 @@ import win32serviceutil
 import win32service
 import win32event
 import servicemanager
-import threading
 import time
 import os
 import sys
@@ -26,6 +25,7 @@ if r"D:\Websocket_API_Manager" not in sys.path:
 
 #from websocket_client_connector import get_websocket_manager
 from websocket_manager import WebSocketManager
+from timer_scheduler import get_timer_scheduler
 
 class EnhancedPowerService(win32serviceutil.ServiceFramework):
     _svc_name_ = "EnhancedPowerService"
@@ -38,8 +38,9 @@ class EnhancedPowerService(win32serviceutil.ServiceFramework):
         self.hWaitStop = win32event.CreateEvent(None, 0, 0, None)
         self.is_running = True
         self.shutdown_handled = False
-        self.power_thread = None
-        self.keep_alive_thread = None
+        self.scheduler = get_timer_scheduler()
+        self.power_timer = None
+        self.keep_alive_timer = None
         
         logging.info("Running __init__")
         
@@ -62,11 +63,8 @@ class EnhancedPowerService(win32serviceutil.ServiceFramework):
             servicemanager.LogErrorMsg(f"Error stopping WebSocket manager: {e}")
             logging.error(f"Error stopping WebSocket manager: {e}")
         
-        if self.power_thread and self.power_thread.is_alive():
-            self.power_thread.join(timeout=5)
-            
-        if self.keep_alive_thread and self.keep_alive_thread.is_alive():
-            self.keep_alive_thread.join(timeout=5)
+        self.scheduler.cancel(self.power_timer)
+        self.scheduler.cancel(self.keep_alive_timer)
             
         win32event.SetEvent(self.hWaitStop)
         
@@ -110,7 +108,10 @@ class EnhancedPowerService(win32serviceutil.ServiceFramework):
         self.start_power_monitoring()
         self.start_keep_alive_monitor()
         
-        win32event.WaitForSingleObject(self.hWaitStop, win32event.INFINITE)
+        # The service thread doubles as a watchdog for the shared timer thread
+        while win32event.WaitForSingleObject(self.hWaitStop, 30000) == win32event.WAIT_TIMEOUT:
+            if self.is_running:
+                self.scheduler.start()
         
         servicemanager.LogInfoMsg("Enhanced Power & Shutdown service stopped")
         logging.info("Enhanced Power & Shutdown service stopped")
@@ -258,59 +259,45 @@ class EnhancedPowerService(win32serviceutil.ServiceFramework):
             logging.error(f"Error handling resume: {e}")
         
     def start_power_monitoring(self):
-        if self.power_thread is None or not self.power_thread.is_alive():
-            self.power_thread = threading.Thread(target=self.power_monitor)
-            self.power_thread.daemon = True
-            self.power_thread.start()
-            servicemanager.LogInfoMsg("Power monitoring thread started")
-            logging.info("Power monitoring thread started")
+        if self.power_timer is None or self.power_timer.cancelled:
+            self.power_timer = self.scheduler.call_every(10, self.power_monitor, initial_delay=0, name="power_monitor")
+            servicemanager.LogInfoMsg("Power monitoring timer started")
+            logging.info("Power monitoring timer started")
             
     def start_keep_alive_monitor(self):
         def monitor():
-            while self.is_running:
-                try:
-                    if self.power_thread is None or not self.power_thread.is_alive():
-                        servicemanager.LogWarningMsg("Power monitoring thread died - restarting automatically")
-                        logging.info("Power monitoring thread died - restarting automatically")
-                        self.start_power_monitoring()
-                        
-                    # if not self.ws_manager.is_websocket_connected():
-                    #     servicemanager.LogWarningMsg("WebSocket disconnected - attempting reconnect")
-                    #     logging.warning("WebSocket disconnected - attempting reconnect")
-                        
-                    #     self.ws_manager.send_command("reconnect")
-                        
-                    for _ in range(30):
-                        if not self.is_running:
-                            break
-                        time.sleep(1)
-                        
-                except Exception as e:
-                    servicemanager.LogErrorMsg(f"Keep-alive monitor error: {e}")
-                    logging.error(f"Keep-alive monitor error: {e}")
-                    time.sleep(10)
+            try:
+                if self.is_running and (self.power_timer is None or self.power_timer.cancelled):
+                    servicemanager.LogWarningMsg("Power monitoring timer stopped - restarting automatically")
+                    logging.info("Power monitoring timer stopped - restarting automatically")
+                    self.start_power_monitoring()
+                    
+                # if not self.ws_manager.is_websocket_connected():
+                #     servicemanager.LogWarningMsg("WebSocket disconnected - attempting reconnect")
+                #     logging.warning("WebSocket disconnected - attempting reconnect")
+                    
+                #     self.ws_manager.send_command("reconnect")
                     
-        self.keep_alive_thread = threading.Thread(target=monitor)
-        self.keep_alive_thread.daemon = True
-        self.keep_alive_thread.start()
+            except Exception as e:
+                servicemanager.LogErrorMsg(f"Keep-alive monitor error: {e}")
+                logging.error(f"Keep-alive monitor error: {e}")
+                
+        self.scheduler.cancel(self.keep_alive_timer)
+        self.keep_alive_timer = self.scheduler.call_every(30, monitor, name="keep_alive_monitor")
         servicemanager.LogInfoMsg("Keep-alive monitor started - will auto-restart failed components")
         logging.info("Keep-alive monitor started - will auto-restart failed components")
         
     def power_monitor(self):
         try:
-            servicemanager.LogInfoMsg("Power monitor thread running")
-            logging.info("Power monitor thread running")
-            
-            while self.is_running:
-                status = self.ws_manager.get_connection_status()
-                if not status["connected"] and status["running"]:
-                    servicemanager.LogWarningMsg("WebSocket not connected but manager running")
-                    logging.warning("WebSocket not connected but manager running")
-                time.sleep(10)
+            # Lock-free snapshot read, never contends with the send path
+            status = self.ws_manager.status.current
+            if not status.connected and status.running:
+                servicemanager.LogWarningMsg("WebSocket not connected but manager running")
+                logging.warning("WebSocket not connected but manager running")
                 
         except Exception as e:
-            servicemanager.LogErrorMsg(f"Power monitoring thread error: {e}")
-            logging.error(f"Power monitoring thread error: {e}")
+            servicemanager.LogErrorMsg(f"Power monitoring error: {e}")
+            logging.error(f"Power monitoring error: {e}")
             
     @classmethod
     def install_service(cls):
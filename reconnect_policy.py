@@ -0,0 +1,113 @@
+import random
+import threading
+import time
+from typing import Optional, Dict, Any
+
+JITTER_NONE = "none"
+JITTER_FULL = "full"
+JITTER_DECORRELATED = "decorrelated"
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class ReconnectPolicy:
+    def __init__(self, base_delay: float = 5, max_delay: float = 60, min_delay: float = 1,
+                 jitter: str = JITTER_FULL, failure_threshold: int = 5, open_duration: float = 300,
+                 stable_uptime: float = 60, rng: Optional[random.Random] = None):
+        if jitter not in (JITTER_NONE, JITTER_FULL, JITTER_DECORRELATED):
+            raise ValueError(f"Unknown jitter mode: {jitter}")
+
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.min_delay = min_delay
+        self.jitter = jitter
+        self.failure_threshold = failure_threshold
+        self.open_duration = open_duration
+        self.stable_uptime = stable_uptime
+        self.rng = rng or random.Random()
+
+        self.lock = threading.Lock()
+        self.state = CIRCUIT_CLOSED
+        self.attempts = 0
+        self.previous_delay = base_delay
+        self.last_delay: Optional[float] = None
+        self.opened_at: Optional[float] = None
+        self.connected_at: Optional[float] = None
+        self.circuit_opens = 0
+
+    def next_delay(self) -> float:
+        with self.lock:
+            self.attempts += 1
+
+            if self.state == CIRCUIT_HALF_OPEN or (self.state == CIRCUIT_CLOSED and self.attempts > self.failure_threshold):
+                # Stop hammering the gateway, a single probe goes out after open_duration
+                self.state = CIRCUIT_OPEN
+                self.opened_at = time.monotonic()
+                self.circuit_opens += 1
+                delay = self._spread(self.open_duration)
+            elif self.state == CIRCUIT_OPEN:
+                remaining = self.open_duration - (time.monotonic() - self.opened_at)
+                delay = max(remaining, self.min_delay)
+            else:
+                delay = self._backoff()
+
+            self.last_delay = delay
+            return delay
+
+    def _backoff(self) -> float:
+        if self.jitter == JITTER_DECORRELATED:
+            delay = self.rng.uniform(self.base_delay, self.previous_delay * 3)
+            delay = min(self.max_delay, delay)
+            self.previous_delay = delay
+        else:
+            delay = min(self.max_delay, self.base_delay * (2 ** (self.attempts - 1)))
+            if self.jitter == JITTER_FULL:
+                delay = self.rng.uniform(0, delay)
+
+        return max(self.min_delay, delay)
+
+    def _spread(self, delay: float) -> float:
+        if self.jitter == JITTER_NONE:
+            return delay
+        return self.rng.uniform(delay / 2, delay)
+
+    def on_attempt(self):
+        with self.lock:
+            if self.state == CIRCUIT_OPEN and time.monotonic() - self.opened_at >= self.open_duration / 2:
+                self.state = CIRCUIT_HALF_OPEN
+
+    def record_success(self):
+        with self.lock:
+            self.connected_at = time.monotonic()
+            if self.state != CIRCUIT_CLOSED:
+                self.state = CIRCUIT_CLOSED
+                self.opened_at = None
+
+    def record_disconnect(self):
+        with self.lock:
+            if self.connected_at is not None and time.monotonic() - self.connected_at >= self.stable_uptime:
+                self._reset()
+            self.connected_at = None
+
+    def reset(self):
+        with self.lock:
+            self._reset()
+
+    def _reset(self):
+        self.attempts = 0
+        self.previous_delay = self.base_delay
+        self.state = CIRCUIT_CLOSED
+        self.opened_at = None
+
+    def get_state(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "circuit": self.state,
+                "attempts": self.attempts,
+                "jitter": self.jitter,
+                "last_delay": self.last_delay,
+                "circuit_opens": self.circuit_opens,
+                "uptime": (time.monotonic() - self.connected_at) if self.connected_at is not None else None
+            }
@@ -0,0 +1,246 @@
+import asyncio
+import inspect
+import threading
+import time
+import logging
+from collections import deque
+from typing import Callable, Optional, Dict, Any, Iterable, List
+
+class StatusSubscription:
+    def __init__(self, callback: Callable[[str, Any], Any], events: Optional[Iterable[str]] = None,
+                 coalesce: Iterable[str] = (), max_queue_size: int = 100,
+                 loop: Optional[asyncio.AbstractEventLoop] = None, slow_threshold: float = 0.5,
+                 name: Optional[str] = None):
+        self.callback = callback
+        self.events = frozenset(events) if events is not None else None
+        self.coalesce = frozenset(coalesce)
+        self.max_queue_size = max_queue_size
+        self.loop = loop
+        self.slow_threshold = slow_threshold
+        self.name = name or getattr(callback, "__qualname__", "status_subscriber")
+
+        self.condition = threading.Condition()
+        self.pending: deque = deque()
+        self.is_closed = False
+        # Bumped on every start, so a consumer left over from before a reopen retires itself
+        self.generation = 0
+        self.thread: Optional[threading.Thread] = None
+        self.wakeup: Optional[asyncio.Event] = None
+
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.slow_calls = 0
+        self.callback_total = 0.0
+        self.callback_max = 0.0
+        self.latency_max = 0.0
+
+        self.logger = logging.getLogger(__name__)
+
+    def wants(self, status: str) -> bool:
+        return self.events is None or status in self.events
+
+    def start(self):
+        with self.condition:
+            self.is_closed = False
+            self.generation += 1
+            generation = self.generation
+            # Wakes a consumer still parked from before a close, so it can see it was replaced
+            self.condition.notify_all()
+
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self._consume_async(generation), self.loop)
+        else:
+            self.thread = threading.Thread(target=self._consume, args=(generation,), name=f"status-{self.name}", daemon=True)
+            self.thread.start()
+
+    def offer(self, status: str, data: Any):
+        with self.condition:
+            if self.is_closed:
+                return
+
+            if status in self.coalesce:
+                # Only the latest event of a coalesced type is worth delivering
+                stale = [item for item in self.pending if item[0] == status]
+                for item in stale:
+                    self.pending.remove(item)
+                self.coalesced += len(stale)
+
+            if len(self.pending) >= self.max_queue_size:
+                self.pending.popleft()
+                self.dropped += 1
+
+            self.pending.append((status, data, time.monotonic()))
+            self.condition.notify()
+
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        if self.wakeup:
+            self.wakeup.set()
+
+    def _take(self) -> List[tuple]:
+        items = list(self.pending)
+        self.pending.clear()
+        if items:
+            self.condition.notify_all()
+        return items
+
+    def _consume(self, generation: int):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.is_closed or self.pending or self.generation != generation)
+                if self.is_closed or self.generation != generation:
+                    return
+                items = self._take()
+
+            for status, data, queued_at in items:
+                started = time.monotonic()
+                try:
+                    self.callback(status, data)
+                except Exception as e:
+                    self.failed += 1
+                    self.logger.error(f"Error in status callback '{self.name}': {e}")
+                self._record(started, queued_at)
+
+    async def _consume_async(self, generation: int):
+        self.wakeup = asyncio.Event()
+
+        while not self.is_closed and self.generation == generation:
+            with self.condition:
+                items = self._take()
+
+            if not items:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+
+            for status, data, queued_at in items:
+                started = time.monotonic()
+                try:
+                    result = self.callback(status, data)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception as e:
+                    self.failed += 1
+                    self.logger.error(f"Error in status callback '{self.name}': {e}")
+                self._record(started, queued_at)
+
+    def _record(self, started: float, queued_at: float):
+        finished = time.monotonic()
+        duration = finished - started
+        self.delivered += 1
+        self.callback_total += duration
+        self.callback_max = max(self.callback_max, duration)
+        self.latency_max = max(self.latency_max, finished - queued_at)
+
+        if duration >= self.slow_threshold:
+            self.slow_calls += 1
+            self.logger.warning(f"Slow status subscriber '{self.name}' took {duration * 1000:.0f} ms")
+
+    def drain(self, timeout: float) -> bool:
+        with self.condition:
+            return self.condition.wait_for(lambda: self.is_closed or not self.pending, timeout)
+
+    def close(self):
+        with self.condition:
+            self.is_closed = True
+            self.pending.clear()
+            self.condition.notify_all()
+
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._wake)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self.condition:
+            pending = len(self.pending)
+
+        return {
+            "name": self.name,
+            "consumer": "asyncio" if self.loop is not None else "thread",
+            "pending": pending,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "slow_calls": self.slow_calls,
+            "slow": self.slow_calls > 0 or pending >= self.max_queue_size,
+            "callback_avg_ms": (self.callback_total / self.delivered * 1000) if self.delivered else 0.0,
+            "callback_max_ms": self.callback_max * 1000,
+            "latency_max_ms": self.latency_max * 1000
+        }
+
+
+class StatusEventBus:
+    def __init__(self, max_queue_size: int = 100, slow_threshold: float = 0.5):
+        self.max_queue_size = max_queue_size
+        self.slow_threshold = slow_threshold
+        self.subscriptions: List[StatusSubscription] = []
+        self.closed_subscriptions: List[StatusSubscription] = []
+        self.is_closed = False
+        self.published = 0
+
+    def subscribe(self, callback: Callable[[str, Any], Any], events: Optional[Iterable[str]] = None,
+                  coalesce: Iterable[str] = (), loop: Optional[asyncio.AbstractEventLoop] = None,
+                  max_queue_size: Optional[int] = None, name: Optional[str] = None) -> StatusSubscription:
+        subscription = StatusSubscription(
+            callback, events, coalesce,
+            max_queue_size=max_queue_size or self.max_queue_size,
+            loop=loop,
+            slow_threshold=self.slow_threshold,
+            name=name
+        )
+        subscription.start()
+        # Copy-on-write so publish can iterate without a lock
+        self.subscriptions = self.subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, callback: Callable[[str, Any], Any]) -> bool:
+        matches = lambda s: s.callback == callback or s is callback
+        removed = [s for s in self.subscriptions + self.closed_subscriptions if matches(s)]
+        if not removed:
+            return False
+
+        self.subscriptions = [s for s in self.subscriptions if s not in removed]
+        # Unsubscribing while closed must also keep reopen from bringing it back
+        self.closed_subscriptions = [s for s in self.closed_subscriptions if s not in removed]
+        for subscription in removed:
+            subscription.close()
+        return True
+
+    def publish(self, status: str, data: Any = None):
+        self.published += 1
+        for subscription in self.subscriptions:
+            if subscription.wants(status):
+                subscription.offer(status, data)
+
+    def close(self, timeout: float = 0):
+        subscriptions = self.subscriptions
+        self.subscriptions = []
+        self.is_closed = True
+        # Remembered so reopen can restart the same subscriptions, keeping earlier handles valid
+        self.closed_subscriptions = subscriptions
+
+        deadline = time.monotonic() + timeout
+        for subscription in subscriptions:
+            if timeout > 0:
+                subscription.drain(max(0.0, deadline - time.monotonic()))
+            subscription.close()
+
+    def reopen(self):
+        subscriptions = self.closed_subscriptions
+        self.closed_subscriptions = []
+        self.is_closed = False
+        for subscription in subscriptions:
+            subscription.start()
+        self.subscriptions = self.subscriptions + subscriptions
+
+    def get_metrics(self) -> Dict[str, Any]:
+        subscribers = [subscription.get_metrics() for subscription in self.subscriptions]
+        return {
+            "published": self.published,
+            "subscribers": subscribers,
+            "slow_subscribers": [metrics["name"] for metrics in subscribers if metrics["slow"]]
+        }
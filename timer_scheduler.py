@@ -0,0 +1,149 @@
+import heapq
+import itertools
+import threading
+import time
+import logging
+from typing import Callable, Optional, Dict, Any
+
+
+class TimerHandle:
+    __slots__ = ("deadline", "sequence", "callback", "args", "interval", "cancelled", "name")
+
+    def __init__(self, deadline: float, sequence: int, callback: Callable, args: tuple,
+                 interval: Optional[float] = None, name: Optional[str] = None):
+        self.deadline = deadline
+        self.sequence = sequence
+        self.callback = callback
+        self.args = args
+        self.interval = interval
+        self.cancelled = False
+        self.name = name or getattr(callback, "__name__", "timer")
+
+    def cancel(self):
+        self.cancelled = True
+
+    def __lt__(self, other: "TimerHandle") -> bool:
+        return (self.deadline, self.sequence) < (other.deadline, other.sequence)
+
+
+class TimerScheduler:
+    def __init__(self, name: str = "timer-scheduler"):
+        self.name = name
+        self.condition = threading.Condition()
+        self.heap: list[TimerHandle] = []
+        self.sequence = itertools.count()
+        self.thread: Optional[threading.Thread] = None
+        self.is_running = False
+
+        self.fired_timers = 0
+        self.failed_timers = 0
+        self.cancelled_timers = 0
+
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        with self.condition:
+            if self.is_running and self.thread and self.thread.is_alive():
+                return
+            self.is_running = True
+            self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self.thread.start()
+
+        self.logger.info("Timer scheduler started")
+
+    def stop(self, timeout: float = 5):
+        with self.condition:
+            self.is_running = False
+            self.heap.clear()
+            self.condition.notify_all()
+
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout=timeout)
+        self.logger.info("Timer scheduler stopped")
+
+    def call_later(self, delay: float, callback: Callable, *args, name: Optional[str] = None) -> TimerHandle:
+        return self._schedule(delay, callback, args, None, name)
+
+    def call_every(self, interval: float, callback: Callable, *args, initial_delay: Optional[float] = None,
+                   name: Optional[str] = None) -> TimerHandle:
+        delay = interval if initial_delay is None else initial_delay
+        return self._schedule(delay, callback, args, interval, name)
+
+    def cancel(self, handle: Optional[TimerHandle]):
+        if handle is None or handle.cancelled:
+            return
+
+        with self.condition:
+            handle.cancel()
+            self.cancelled_timers += 1
+            # Wake the loop so a cancelled head-of-heap timer is dropped right away
+            self.condition.notify_all()
+
+    def _schedule(self, delay: float, callback: Callable, args: tuple, interval: Optional[float],
+                  name: Optional[str]) -> TimerHandle:
+        if not self.is_running:
+            self.start()
+
+        with self.condition:
+            handle = TimerHandle(time.monotonic() + max(delay, 0), next(self.sequence), callback, args, interval, name)
+            heapq.heappush(self.heap, handle)
+            if self.heap[0] is handle:
+                self.condition.notify_all()
+            return handle
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.is_running:
+                    while self.heap and self.heap[0].cancelled:
+                        heapq.heappop(self.heap)
+
+                    if not self.heap:
+                        self.condition.wait()
+                        continue
+
+                    remaining = self.heap[0].deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(timeout=remaining)
+
+                if not self.is_running:
+                    return
+
+                handle = heapq.heappop(self.heap)
+
+            try:
+                handle.callback(*handle.args)
+                self.fired_timers += 1
+            except Exception as e:
+                self.failed_timers += 1
+                self.logger.error(f"Error in timer '{handle.name}': {e}")
+
+            if handle.interval is not None and not handle.cancelled:
+                with self.condition:
+                    handle.deadline = time.monotonic() + handle.interval
+                    handle.sequence = next(self.sequence)
+                    heapq.heappush(self.heap, handle)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.condition:
+            pending = sum(1 for handle in self.heap if not handle.cancelled)
+
+        return {
+            "running": self.is_running,
+            "pending_timers": pending,
+            "fired_timers": self.fired_timers,
+            "failed_timers": self.failed_timers,
+            "cancelled_timers": self.cancelled_timers
+        }
+
+
+_timer_scheduler: Optional[TimerScheduler] = None
+_timer_scheduler_lock = threading.Lock()
+
+def get_timer_scheduler() -> TimerScheduler:
+    global _timer_scheduler
+    with _timer_scheduler_lock:
+        if _timer_scheduler is None:
+            _timer_scheduler = TimerScheduler()
+        return _timer_scheduler
@@ -1,36 +1,189 @@
-import queue
+import socket
 import threading
 import websocket
 import json
-from pymongo import MongoClient
 from dotenv import dotenv_values
 import os
 import time
 import logging
-from typing import Callable, Optional, Dict, Any
+import asyncio
+from typing import Callable, Optional, Dict, Any, Iterable, Union
+from connection_state_store import ConnectionStateStore, WriteBehindStateWriter
+from message_dispatcher import MessageDispatcher
+from message_router import MessageRouter
+from command_queue import CommandQueue, CONTROL_COMMANDS, POLICY_BLOCK, RESULT_CLOSED
+from command_worker import CommandWorker, DEFAULT_COMMAND_SLICE
+from outbound_batcher import OutboundBatcher, OutboundMessage
+from outbound_spool import OutboundSpool, SpooledForReplay
+from reconnect_policy import ReconnectPolicy, CIRCUIT_OPEN
+from heartbeat import Heartbeat, ACTION_PING, ACTION_DEAD
+from connection_status import (
+    ConnectionStatus, StatusPublisher, STATE_CONNECTING, STATE_CONNECTED, STATE_DISCONNECTED,
+    STATE_RECONNECTING, STATE_CIRCUIT_OPEN, STATE_STOPPED
+)
+from status_event_bus import StatusEventBus, StatusSubscription
+from metrics import MetricsRegistry, get_metrics_registry, start_metrics_server
+from logging_pipeline import setup_logging
+from compact_protocol import PROTOCOL_JSON, supported_protocols, is_compact, encode_message, decode_message
+from timer_scheduler import TimerScheduler, TimerHandle, get_timer_scheduler
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
+DEFAULT_DEVICE_NAME = "windows11"
+DEFAULT_WS_URL = "wss://15dcmwmsig.execute-api.ap-south-1.amazonaws.com/production"
+COMPRESSION_UNSUPPORTED = "unsupported"
+
 class WebSocketManager:
-    def __init__(self):
+    def __init__(self, device_name: Optional[str] = None, ws_url: Optional[str] = None,
+                 state_store: Optional[ConnectionStateStore] = None,
+                 state_writer: Optional[WriteBehindStateWriter] = None,
+                 dispatcher: Optional[MessageDispatcher] = None,
+                 scheduler: Optional[TimerScheduler] = None,
+                 command_worker: Optional[CommandWorker] = None,
+                 max_queued_messages: int = 1000, queue_overflow_policy: str = POLICY_BLOCK,
+                 batch_window: Optional[float] = None, batch_max_messages: int = 50,
+                 batch_max_bytes: int = 32 * 1024,
+                 spool_directory: Optional[str] = None, spool_max_bytes: int = 64 * 1024 * 1024,
+                 spool_max_age: Optional[float] = 24 * 60 * 60,
+                 reconnect_policy: Optional[ReconnectPolicy] = None,
+                 heartbeat: Optional[Heartbeat] = None,
+                 persist_connection_state: bool = True,
+                 metrics: Optional[MetricsRegistry] = None, metrics_port: Optional[int] = None,
+                 log_level: int = logging.INFO, trace: Optional[bool] = None,
+                 compact_protocol: bool = False):
         self.ws_instance: Optional[websocket.WebSocketApp] = None
         self.ws_thread: Optional[threading.Thread] = None
         self.command_thread: Optional[threading.Thread] = None
-        self.ping_thread: Optional[threading.Thread] = None
+        self.ping_timer: Optional[TimerHandle] = None
+        self.reconnect_timer: Optional[TimerHandle] = None
         
         self.lock = threading.Lock()
-        self.command_queue = queue.Queue()
+        self.command_queue = CommandQueue(
+            max_data_size=max_queued_messages,
+            overflow_policy=queue_overflow_policy,
+            control_commands=CONTROL_COMMANDS | {"flush_batch", "replay_spool"}
+        )
+        # With a shared worker, commands run on its threads instead of a per-manager command thread
+        self.command_worker = command_worker
+        self.command_runner = self._run_command_slice
+        if command_worker:
+            self.command_queue.listener = lambda: command_worker.schedule(self.command_runner)
+        
+        # Batching is opt-in: messages sent within batch_window share one frame
+        self.batcher: Optional[OutboundBatcher] = None
+        if batch_window:
+            self.batcher = OutboundBatcher(batch_window, batch_max_messages, batch_max_bytes)
+        self.batch_timer: Optional[TimerHandle] = None
+
         
         self.is_running = False
-        self.ping_thread_running = False
-        self.ping_interval = 420
-        self.connection_attempts = 0
+        self.heartbeat = heartbeat or Heartbeat()
+        # Client-side Mongo writes are skipped once the server registry owns the mapping
+        self.persist_connection_state = persist_connection_state
+        self.server_registered = False
+        # MessagePack is only offered at registration; every connection starts on JSON until the server agrees
+        self.compact_protocol = compact_protocol
+        self.wire_protocol = PROTOCOL_JSON
         self.max_connection_attempts = 5
         self.reconnect_delay = 5
-        self.status_callbacks: list[Callable] = []
+        self.reconnect_policy = reconnect_policy or ReconnectPolicy(
+            base_delay=self.reconnect_delay,
+            failure_threshold=self.max_connection_attempts
+        )
+        # Listeners run on their own consumers so a slow one never stalls the receive thread
+        self.status_events = StatusEventBus()
         
         self._load_config()
-        self._setup_logging()
+        self._setup_logging(log_level)
+        # Frame tracing formats every frame on the I/O thread, so it is opt-in
+        if trace is not None:
+            self.trace = trace
+        
+        if device_name:
+            self.device_name = device_name
+        if ws_url:
+            self.ws_url = ws_url
+        
+        self.status = StatusPublisher(ConnectionStatus(device_name=self.device_name))
+        
+        # Undeliverable frames are persisted here and replayed after registration
+        self.spool: Optional[OutboundSpool] = None
+        if spool_directory:
+            self.spool = OutboundSpool(
+                os.path.join(spool_directory, self.device_name),
+                max_total_bytes=spool_max_bytes,
+                max_age=spool_max_age
+            )
+        
+        # Shared components are owned (started/stopped) by whoever passed them in
+        self.owns_state_store = state_store is None and state_writer is None
+        self.owns_state_writer = state_writer is None
+        self.owns_dispatcher = dispatcher is None
+        
+        self.state_store = state_store or (state_writer.state_store if state_writer else ConnectionStateStore(self.MONGODB_URI))
+        self.state_writer = state_writer or WriteBehindStateWriter(self.state_store)
+        self.dispatcher = dispatcher or MessageDispatcher()
+        self.scheduler = scheduler or get_timer_scheduler()
+        
+        self.router = MessageRouter()
+        self.router.register("Save to Database", self._handle_save_to_database)
+        self.router.set_wildcard(self._handle_unhandled_message)
+        
+        self.metrics_port = metrics_port
+        self._setup_metrics(metrics or get_metrics_registry())
+        
+    def _setup_metrics(self, registry: MetricsRegistry):
+        self.metrics = registry
+        device = self.device_name
+        frames_sent = registry.counter("websocket_frames_sent_total", "Frames written to the websocket", ["device"])
+        bytes_sent = registry.counter("websocket_bytes_sent_total", "Payload bytes written to the websocket", ["device"])
+        send_errors = registry.counter("websocket_send_errors_total", "Frames that failed to send", ["device"])
+        frames_received = registry.counter("websocket_frames_received_total", "Frames received from the websocket", ["device"])
+        bytes_received = registry.counter("websocket_bytes_received_total", "Payload bytes received from the websocket", ["device"])
+        connects = registry.counter("websocket_connects_total", "Successful websocket opens", ["device"])
+        disconnects = registry.counter("websocket_disconnects_total", "Websocket closes", ["device"])
+        reconnects = registry.counter("websocket_reconnects_scheduled_total", "Reconnect attempts scheduled", ["device"])
+        ping_rtt = registry.histogram("websocket_ping_rtt_seconds", "Ping to pong round trip time", ["device"])
+        receive_time = registry.histogram(
+            "websocket_receive_handler_seconds", "Time the receive thread spends per inbound frame", ["device"],
+            buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+        )
+        connected = registry.gauge("websocket_connected", "1 while the websocket is connected", ["device"])
+        queue_depth = registry.gauge("command_queue_depth", "Commands waiting in the command queue", ["device"])
+        reconnect_attempts = registry.gauge("reconnect_attempts", "Consecutive reconnect attempts", ["device"])
+        # Kept so stop_manager can drop this device's children from the shared registry
+        self.metric_families = [
+            frames_sent, bytes_sent, send_errors, frames_received, bytes_received, connects, disconnects,
+            reconnects, ping_rtt, receive_time, connected, queue_depth, reconnect_attempts
+        ]
+
+        # Children are bound once so hot paths only pay for a locked add; binding records this
+        # manager as an owner, so a second manager for the same device keeps the series alive
+        self.metric_frames_sent = frames_sent.bind(self, device)
+        self.metric_bytes_sent = bytes_sent.bind(self, device)
+        self.metric_send_errors = send_errors.bind(self, device)
+        self.metric_frames_received = frames_received.bind(self, device)
+        self.metric_bytes_received = bytes_received.bind(self, device)
+        self.metric_connects = connects.bind(self, device)
+        self.metric_disconnects = disconnects.bind(self, device)
+        self.metric_reconnects = reconnects.bind(self, device)
+        self.metric_ping_rtt = ping_rtt.bind(self, device)
+        self.metric_receive_time = receive_time.bind(self, device)
+        connected.bind(self, device).set_function(lambda: 1 if self.status.current.connected else 0, owner=self)
+        queue_depth.bind(self, device).set_function(self.command_queue.qsize, owner=self)
+        reconnect_attempts.bind(self, device).set_function(lambda: self.reconnect_policy.attempts, owner=self)
+
+    def _remove_metrics(self):
+        # The gauge functions close over self, so leaving them registered would pin a stopped manager
+        for family in self.metric_families:
+            family.release(self, self.device_name)
+        
+    def get_metrics(self) -> Dict[str, Any]:
+        return self.metrics.get_metrics()
+        
+    @property
+    def connection_attempts(self) -> int:
+        return self.reconnect_policy.attempts
         
     def _load_config(self):
         try:
@@ -38,27 +191,24 @@ class WebSocketManager:
             env_values = dotenv_values(env_path)
 
             self.MONGODB_URI = env_values.get("MONGODB_URI")
-            self.device_name = "windows11"
-            self.ws_url = "wss://15dcmwmsig.execute-api.ap-south-1.amazonaws.com/production"
+            self.device_name = env_values.get("DEVICE_NAME") or DEFAULT_DEVICE_NAME
+            # WS_URL points the client at e.g. gateway_emulator.py instead of AWS
+            self.ws_url = env_values.get("WS_URL") or os.environ.get("WS_URL") or DEFAULT_WS_URL
+            self.trace = (env_values.get("WS_TRACE") or os.environ.get("WS_TRACE") or "").lower() in ("1", "true", "yes")
             
             if not self.MONGODB_URI:
                 raise ValueError("MONGODB_URI not found in .env file")
             
         except Exception as e:
             print(f"Configuration error: {e}")
-            self.device_name = "windows11"
-            self.ws_url = "wss://15dcmwmsig.execute-api.ap-south-1.amazonaws.com/production"
-            
-    def _setup_logging(self):
-        log_path = os.path.join(script_dir, "websocket_manager.log")
-        logging.basicConfig(
-            level=logging.INFO,
-            format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-            handlers=[
-                logging.FileHandler(log_path),
-                logging.StreamHandler()
-            ]
-        )
+            self.MONGODB_URI = getattr(self, "MONGODB_URI", None)
+            self.device_name = getattr(self, "device_name", DEFAULT_DEVICE_NAME)
+            self.ws_url = getattr(self, "ws_url", DEFAULT_WS_URL)
+            self.trace = getattr(self, "trace", False)
+            
+    def _setup_logging(self, level: int = logging.INFO):
+        # Records are queued here and written, rotated and compressed on a background thread
+        setup_logging(os.path.join(script_dir, "websocket_manager.log"), level=level, compress=True)
         self.logger = logging.getLogger(__name__)
         
     def start_manager(self) -> bool:
@@ -68,10 +218,27 @@ class WebSocketManager:
                 return True
             
             self.is_running = True
+            self.command_queue.open()
+            if self.status_events.is_closed:
+                self.status_events.reopen()
+            self.status.publish(running=True)
             self.logger.info("Starting WebSocketManager")
             
-        self.command_thread = threading.Thread(target=self._process_commands, daemon=True)
-        self.command_thread.start()
+        # A restart after stop_manager needs this device's children back in the registry
+        self._setup_metrics(self.metrics)
+        if self.metrics_port is not None:
+            start_metrics_server(self.metrics_port, registry=self.metrics)
+        if self.owns_state_writer:
+            self.state_writer.start()
+        if self.owns_dispatcher:
+            self.dispatcher.start()
+            
+        if self.command_worker:
+            if self.command_queue.qsize():
+                self.command_worker.schedule(self.command_runner)
+        else:
+            self.command_thread = threading.Thread(target=self._process_commands, daemon=True)
+            self.command_thread.start()
         
         return self._connect_websocket()
     
@@ -81,44 +248,112 @@ class WebSocketManager:
         with self.lock:
             self.is_running = False
             
+        self.scheduler.cancel(self.reconnect_timer)
+        self.reconnect_timer = None
+        self.command_queue.close()
+        
+        if self.command_worker:
+            idle = self.command_worker.wait_idle(self.command_runner, timeout=5)
+        else:
+            if self.command_thread and self.command_thread.is_alive():
+                self.command_thread.join(timeout=5)
+            idle = not (self.command_thread and self.command_thread.is_alive())
+            
+        if idle:
+            # Queued sends still get their last chance to go out, or to be spooled or failed
+            for command, data in self.command_queue.drain():
+                if command == "send_message" and data:
+                    self._queue_outbound_message(data if isinstance(data, OutboundMessage) else OutboundMessage(data))
+            
+        self._flush_outbound_batch()
         self._disconnect_websocket()
         
-        if self.command_thread and self.command_thread.is_alive():
-            self.command_thread.join(timeout=5)
+        if self.spool:
+            self.spool.close()
             
         if self.ws_thread and self.ws_thread.is_alive():
             self.ws_thread.join(timeout=5)
             
+        if self.owns_dispatcher:
+            self.dispatcher.stop()
+        if self.owns_state_writer:
+            self.state_writer.stop()
+        if self.owns_state_store:
+            self.state_store.close()
+            
+        self.status.publish(state=STATE_STOPPED, running=False, connection_id=None)
+        # Gives queued events a moment to reach subscribers before their dispatch threads exit
+        self.status_events.close(timeout=1.0)
+        self._remove_metrics()
         self.logger.info("WebSocketManager stopped")
         
-    def send_command(self, command: str, data: Any=None):
+    def send_command(self, command: str, data: Any=None) -> str:
         if self.is_running:
-            self.command_queue.put((command, data))
-        else:
-            self.logger.warning(f"Cannot send command '{command}' - manager not running")
+            return self.command_queue.put(command, data)
+        
+        self.logger.warning(f"Cannot send command '{command}' - manager not running")
+        return RESULT_CLOSED
+            
+    def try_send_command(self, command: str, data: Any=None) -> str:
+        if self.is_running:
+            return self.command_queue.try_put(command, data)
+        
+        self.logger.warning(f"Cannot send command '{command}' - manager not running")
+        return RESULT_CLOSED
+            
+    def get_command_queue_metrics(self) -> Dict[str, Any]:
+        return self.command_queue.get_metrics()
+        
+    def send_message(self, message: Dict[str, Any], callback: Optional[Callable[[bool, Optional[Exception]], None]]=None) -> str:
+        return self.send_command("send_message", OutboundMessage(message, callback))
+        
+    def get_batch_metrics(self) -> Optional[Dict[str, Any]]:
+        return self.batcher.get_metrics() if self.batcher else None
+        
+    def get_spool_metrics(self) -> Optional[Dict[str, Any]]:
+        return self.spool.get_metrics() if self.spool else None
             
-    def add_status_callback(self, callback: Callable[[str, Any], None]):
-        self.status_callbacks.append(callback)
+    def add_message_handler(self, message_type: str, handler: Callable[[Dict[str, Any]], None]):
+        self.router.register(message_type, handler)
+        
+    def add_action_handler(self, action: str, handler: Callable[[Dict[str, Any]], None]):
+        self.router.register_action(action, handler)
+        
+    def add_raw_message_handler(self, message_type: str, handler: Callable[[str], None]):
+        self.router.register_raw(message_type, handler)
+        
+    def remove_message_handler(self, message_type: str):
+        self.router.unregister(message_type)
+            
+    def add_status_callback(self, callback: Callable[[str, Any], None], events: Optional[Iterable[str]]=None,
+                            coalesce: Iterable[str]=(), loop: Optional[asyncio.AbstractEventLoop]=None) -> StatusSubscription:
+        return self.status_events.subscribe(callback, events=events, coalesce=coalesce, loop=loop)
         
     def remove_status_callback(self, callback: Callable[[str, Any], None]):
-        if callback in self.status_callbacks:
-            self.status_callbacks.remove(callback)
+        self.status_events.unsubscribe(callback)
+        
+    def get_status_event_metrics(self) -> Dict[str, Any]:
+        return self.status_events.get_metrics()
             
     def is_websocket_connected(self) -> bool:
-        with self.lock:
-            return (self.ws_instance and
-                    hasattr(self.ws_instance, "sock") and
-                    self.ws_instance.sock and
-                    self.ws_instance.sock.connected)
+        return self.status.current.connected
             
     def get_connection_status(self) -> Dict[str, Any]:
-        with self.lock:
-            return {
-                "connected": self.is_websocket_connected(),
-                "running": self.is_running,
-                "connection_attempts": self.connection_attempts,
-                "device_name": self.device_name
-            }
+        status = self.status.current.to_dict()
+        status["reconnect_policy"] = self.reconnect_policy.get_state()
+        status["heartbeat"] = self.heartbeat.get_state()
+        # websocket-client rejects RSV bits, so permessage-deflate is only on AsyncWebSocketClient
+        status["compression"] = COMPRESSION_UNSUPPORTED
+        return status
+            
+    def wait_for_state(self, state: Union[str, Iterable[str]], timeout: Optional[float]=None) -> bool:
+        return self.status.wait_for_state(state, timeout)
+            
+    def get_connection_diagnostics(self) -> Dict[str, Any]:
+        # A superset of get_connection_status, never a replacement for it
+        diagnostics = self.get_connection_status()
+        diagnostics["wire_protocol"] = self.wire_protocol
+        return diagnostics
             
     def _connect_websocket(self) -> bool:
         with self.lock:
@@ -128,9 +363,11 @@ class WebSocketManager:
             
             try:
                 self.logger.info(f"Connecting to WebSocket: {self.ws_url}")
+                self.status.publish(state=STATE_CONNECTING)
                 
-                websocket.enableTrace(True)
-                
+                if self.trace and not websocket.isEnabledForTrace():
+                    # NullHandler lets trace records propagate to the queued root handler
+                    websocket.enableTrace(True, handler=logging.NullHandler())
                 
                 self.ws_instance = websocket.WebSocketApp(
                     self.ws_url,
@@ -144,23 +381,28 @@ class WebSocketManager:
                 self.ws_thread = threading.Thread(target=self.ws_instance.run_forever, daemon=True)
                 self.ws_thread.start()
 
-                self.ping_thread = threading.Thread(target=self._ping_loop, daemon=True)
-                self.ping_thread.start()
+                self.scheduler.cancel(self.ping_timer)
+                self.ping_timer = self.scheduler.call_every(self.heartbeat.tick_interval, self._heartbeat_tick, name="heartbeat")
                 
                 self.logger.info("WebSocket connection thread started")
                 return True
             
             except Exception as e:
                 self.logger.error(f"Failed to start WebSocket connection: {e}")
+                self.status.publish(state=STATE_DISCONNECTED, last_error=str(e))
                 return False
 
     def _disconnect_websocket(self):
         with self.lock:
+            self.scheduler.cancel(self.ping_timer)
+            self.ping_timer = None
+            
             if self.ws_instance:
                 self.logger.info("Disconnecting WebSocket...")
                 try:
                     self.ws_instance.close()
                     self.ws_instance = None
+                    self.status.publish(state=STATE_DISCONNECTED, connection_id=None)
                 except Exception as e:
                     self.logger.error(f"Error closing WebSocket: {e}")
                     
@@ -172,70 +414,163 @@ class WebSocketManager:
         self.logger.info("Command processor started")
         
         while self.is_running:
-            try:
-                command, data = self.command_queue.get(timeout=1)
-                self.logger.debug(f"Processing command: {command}")
+            item = self.command_queue.get()
+            if item is None:
+                break
+            self._execute_command(*item)
+            
+    def _run_command_slice(self) -> bool:
+        # Runs on a shared CommandWorker thread; returning True asks for another slice
+        for _ in range(DEFAULT_COMMAND_SLICE):
+            if not self.is_running:
+                return False
+            item = self.command_queue.get(timeout=0)
+            if item is None:
+                return False
+            self._execute_command(*item)
+        return self.command_queue.qsize() > 0
                 
-                if command == "connect":
-                    self._connect_websocket()
-                elif command == "disconnect":
-                    self._disconnect_websocket()
-                elif command == "reconnect":
-                    self._disconnect_websocket()
-                    time.sleep(2)
-                    self._connect_websocket()
-                elif command == "send_message" and data:
-                    self._send_websocket_message(data)
-                # elif command == "ping":
-                #     self._send_ping()
-                    
-            except queue.Empty:
-                continue
-            except Exception as e:
-                self.logger.error(f"Command processing error: {e}")
+    def _execute_command(self, command: str, data: Any):
+        try:
+            self.logger.debug("Processing command: %s", command)
+            
+            if command == "connect":
+                self._connect_websocket()
+            elif command == "disconnect":
+                self._disconnect_websocket()
+            elif command == "reconnect":
+                self._disconnect_websocket()
+                self.scheduler.cancel(self.reconnect_timer)
+                self.reconnect_timer = self.scheduler.call_later(2, self._reconnect_due, name="reconnect")
+            elif command == "send_message" and data:
+                self._queue_outbound_message(data if isinstance(data, OutboundMessage) else OutboundMessage(data))
+            elif command == "flush_batch":
+                self._flush_outbound_batch()
+            elif command == "replay_spool":
+                self._replay_spool()
+            elif command == "ping":
+                self._send_ping()
+                
+        except Exception as e:
+            self.logger.error(f"Command processing error: {e}")
+            
+    def _queue_outbound_message(self, outbound: OutboundMessage):
+        frame = encode_message(outbound.payload, self.wire_protocol)
+        
+        if not self.batcher:
+            self._deliver_outbound(frame, [outbound])
+            return
+        
+        if self.batcher.has_pending() and not self.batcher.fits(frame):
+            self._flush_outbound_batch()
+            
+        if self.batcher.add(outbound, frame):
+            self._flush_outbound_batch()
+        elif self.batch_timer is None:
+            self.batch_timer = self.scheduler.call_later(self.batcher.window, self.send_command, "flush_batch", name="flush_batch")
+            
+    def _flush_outbound_batch(self):
+        if not self.batcher:
+            return
+        
+        self.scheduler.cancel(self.batch_timer)
+        self.batch_timer = None
+        
+        frame, messages = self.batcher.drain(self.wire_protocol)
+        if frame is not None:
+            self._deliver_outbound(frame, messages)
+            
+    def _deliver_outbound(self, frame: str, messages: list[OutboundMessage]):
+        error = self._send_websocket_frame(frame)
+        
+        # Replay happens before the next negotiation, so spooled frames are always JSON
+        if error is not None and self.spool and self.spool.append(self._replay_frame(frame, messages)):
+            self.logger.info(f"Message spooled for replay ({len(messages)} message(s))")
+            # Not delivered, but not lost either: callers must not retry, or replay sends it twice
+            error = SpooledForReplay(error)
+        
+        for message in messages:
+            if message.callback:
+                try:
+                    message.callback(error is None, error)
+                except Exception as e:
+                    self.logger.error(f"Error in send callback: {e}")
                 
-    def _send_websocket_message(self, message: Dict[str, Any]):
+    def _replay_frame(self, frame: str, messages: list[OutboundMessage]) -> str:
+        if not is_compact(frame):
+            return frame
+        payload = messages[0].payload if len(messages) == 1 else self.batcher.envelope(messages)
+        return json.dumps(payload)
+            
+    def _replay_spool(self):
+        if self.spool:
+            self.spool.replay(lambda frame: self._send_websocket_frame(frame) is None)
+            
+    def _send_websocket_message(self, message: Dict[str, Any]) -> bool:
+        return self._send_websocket_frame(encode_message(message, self.wire_protocol)) is None
+    
+    def _send_websocket_frame(self, frame: str) -> Optional[Exception]:
         with self.lock:
             if self.ws_instance and hasattr(self.ws_instance, "sock") and self.ws_instance.sock and self.ws_instance.sock.connected:
                 try:
-                    self.ws_instance.send(json.dumps(message))
-                    self.logger.debug(f"Message sent: {message}")
+                    self.ws_instance.send(frame)
+                    self.metric_frames_sent.inc()
+                    self.metric_bytes_sent.inc(len(frame))
+                    self.logger.debug("Message sent: %s", frame)
+                    return None
                 except Exception as e:
+                    self.metric_send_errors.inc()
                     self.logger.error(f"Error sending message: {e}")
+                    return e
             else:
                 self.logger.warning("Cannot send message - WebSocket not connected")
+                return ConnectionError("WebSocket not connected")
 
-    def _ping_loop(self):
-        while self.is_running:
-            time.sleep(self.ping_interval)
-            if self.is_websocket_connected():
-                self.ws_instance.ping()
-                
     def _send_ping(self):
         with self.lock:
             if self.ws_instance and hasattr(self.ws_instance, "sock") and self.ws_instance.sock and self.ws_instance.sock.connected:
                 try:
-                    self.ws_instance.ping()
+                    self.ws_instance.sock.ping()
+                    self.heartbeat.record_ping_sent()
                     self.logger.debug("Ping sent")
                 except Exception as e:
                     self.logger.error(f"Error sending ping: {e}")
                     
-    def _notify_status_callbacks(self, status: str, data: Any=None):
-        for callback in self.status_callbacks:
+    def _heartbeat_tick(self):
+        ws = self.ws_instance
+        if not (ws and ws.sock and ws.sock.connected):
+            return
+            
+        action = self.heartbeat.poll()
+        if action == ACTION_PING:
+            self.send_command("ping")
+        elif action == ACTION_DEAD:
+            self.logger.warning(f"No pong after {self.heartbeat.max_missed_pongs} pings - dropping dead connection")
+            self._notify_status_callbacks("dead_peer", self.heartbeat.get_state())
+            # A half-open TCP socket never delivers a close frame, so cut it and let on_close reconnect
             try:
-                callback(status, data)
-            except Exception as e:
-                self.logger.error(f"Error in status callback: {e}")
-                
+                ws.sock.sock.shutdown(socket.SHUT_RDWR)
+            except (OSError, AttributeError) as e:
+                self.logger.error(f"Error shutting down dead socket: {e}")
+                    
+    def _notify_status_callbacks(self, status: str, data: Any=None):
+        self.status_events.publish(status, data)
+        
     def _on_open(self, ws):
         self.logger.info("WebSocket connection opened")
-        self.connection_attempts = 0
+        self.reconnect_policy.record_success()
+        self.heartbeat.reset()
+        self.metric_connects.inc()
+        self.status.publish(state=STATE_CONNECTED, connection_attempts=self.connection_attempts, last_error=None)
+        self.wire_protocol = PROTOCOL_JSON
         
         registration_msg = {
             "action": "register_device",
             "message": "Connection Established",
             "device_name": self.device_name
         }
+        if self.compact_protocol:
+            registration_msg["protocols"] = supported_protocols()
         
         try:
             ws.send(json.dumps(registration_msg))
@@ -243,26 +578,48 @@ class WebSocketManager:
         except Exception as e:
             self.logger.error(f"Error sending registration message: {e}")
         
+        if self.spool:
+            self.send_command("replay_spool")
+        
         self._notify_status_callbacks("connected", None)
         
     def _on_message(self, ws, message: str):
+        started = time.perf_counter()
+        self.heartbeat.record_activity()
+        self.metric_frames_received.inc()
+        self.metric_bytes_received.inc(len(message))
         try:
-            self.logger.debug(f"Received message: {message}")
-            message_data = json.loads(message)
-            self._handle_received_message(message_data)
+            self.logger.debug("Received message: %s", message)
+            if is_compact(message):
+                payload = decode_message(message)
+                handler = self.router.resolve(payload)
+            else:
+                handler, payload = self.router.resolve_frame(message)
+            if handler:
+                # Keyed by device so state updates stay ordered with _on_close
+                self.dispatcher.dispatch(handler, payload, key=self.device_name)
         except json.JSONDecodeError as e:
             self.logger.error(f"Invalid JSON message received: {e}")
         except Exception as e:
             self.logger.error(f"Error processing message: {e}")
+        finally:
+            elapsed = time.perf_counter() - started
+            self.dispatcher.record_receive_blocked(elapsed)
+            self.metric_receive_time.observe(elapsed)
             
     def _on_error(self, ws, error):
         self.logger.error(f"WebSocket error: {error}")
+        self.status.publish(last_error=str(error))
         self._notify_status_callbacks("error", error)
         
     def _on_close(self, ws, close_status_code: int, close_msg: str):
         self.logger.warning(f"WebSocket connection closed: {close_status_code} - {close_msg}")
+        self.reconnect_policy.record_disconnect()
+        self.metric_disconnects.inc()
+        self.status.publish(state=STATE_DISCONNECTED, connection_id=None)
         
-        self._update_database_disconnect()
+        if self.persist_connection_state and not self.server_registered:
+            self.dispatcher.dispatch(self._update_database_disconnect, key=self.device_name)
         
         self._notify_status_callbacks("disconnected", (close_status_code, close_msg))
         
@@ -270,111 +627,72 @@ class WebSocketManager:
             self._schedule_reconnect()
             
     def _on_pong(self, ws, message: str):
-        self.logger.debug(f"Pong received: {message}")
+        rtt = self.heartbeat.record_pong()
+        if rtt is not None:
+            self.metric_ping_rtt.observe(rtt)
+            self.status.publish(last_rtt_ms=rtt * 1000)
+            self.logger.debug("Pong received - RTT %.1f ms, next ping in %.0f seconds", rtt * 1000, self.heartbeat.interval)
+        else:
+            self.logger.debug("Pong received: %s", message)
+        
+    def _handle_save_to_database(self, message_data: Dict[str, Any]):
+        connection_id = message_data.get("connection_id", "")
+        self.logger.info(f"Received connection ID: {connection_id}")
+        self.status.publish(connection_id=connection_id)
+        
+        if self.compact_protocol:
+            protocol = message_data.get("protocol")
+            self.wire_protocol = protocol if protocol in supported_protocols() else PROTOCOL_JSON
+            self.logger.info(f"Wire protocol negotiated: {self.wire_protocol}")
         
-    def _handle_received_message(self, message_data: Dict[str, Any]):
-        if message_data.get("message") == "Save to Database":
-            connection_id = message_data.get("connection_id", "")
-            self.logger.info(f"Received connection ID: {connection_id}")
+        self.server_registered = bool(message_data.get("registered"))
+        if self.server_registered:
+            self.logger.info("Connection registered server-side - skipping client database write")
+        elif self.persist_connection_state:
             self._update_database_connection(connection_id)
-        else:
-            self.logger.debug(f"Unhandled message type: {message_data}")
+        
+    def _handle_unhandled_message(self, message_data: Dict[str, Any]):
+        self.logger.debug("Unhandled message type: %s", message_data)
             
     def _schedule_reconnect(self):
-        if self.connection_attempts < self.max_connection_attempts:
-            self.connection_attempts += 1
-            delay = min(self.reconnect_delay * self.connection_attempts, 60)
-            
-            self.logger.info(f"Scheduling reconnect attempt {self.connection_attempts} in {delay} seconds")
-            
-            def delayed_reconnect():
-                time.sleep(delay)
-                if self.is_running:
-                    self.send_command("reconnect")
-            
-            reconnect_thread = threading.Thread(target=delayed_reconnect, daemon=True)
-            reconnect_thread.start()
-        else:
-            self.logger.error("Max reconnection attempts reached")
-            self._notify_status_callbacks("max_reconnects_reached", self.max_connection_attempts)
+        was_open = self.reconnect_policy.state == CIRCUIT_OPEN
+        delay = self.reconnect_policy.next_delay()
+        self.metric_reconnects.inc()
+        
+        if self.reconnect_policy.state == CIRCUIT_OPEN and not was_open:
+            self.logger.error(f"Reconnect circuit opened after {self.connection_attempts - 1} failed attempts")
+            self._notify_status_callbacks("circuit_open", self.reconnect_policy.get_state())
+            
+        self.logger.info(f"Scheduling reconnect attempt {self.connection_attempts} in {delay:.1f} seconds")
+        self.status.publish(
+            state=STATE_CIRCUIT_OPEN if self.reconnect_policy.state == CIRCUIT_OPEN else STATE_RECONNECTING,
+            connection_attempts=self.connection_attempts
+        )
+        
+        self.scheduler.cancel(self.reconnect_timer)
+        self.reconnect_timer = self.scheduler.call_later(delay, self._reconnect_due, name="reconnect")
             
-    def _get_database_connection(self) -> Optional[MongoClient]:
-        try:
-            if not self.MONGODB_URI:
-                self.logger.error("MongoDB URI not configured")
-                return None
-            
-            mongo_client = MongoClient(
-                self.MONGODB_URI, 
-                serverSelectionTimeoutMS=5000,
-                maxPoolSize=10,
-                retryWrites=True
-            )
+    def _reconnect_due(self):
+        self.reconnect_timer = None
+        if self.is_running:
+            self.reconnect_policy.on_attempt()
+            self.send_command("connect")
             
-            mongo_client.server_info()
-            return mongo_client
+    def get_database_health(self) -> Dict[str, Any]:
+        health = self.state_store.get_health()
+        health["write_behind"] = self.state_writer.get_stats()
+        return health
         
-        except Exception as e:
-            self.logger.error(f"Database connection error: {e}")
-            return None
+    def get_dispatcher_metrics(self) -> Dict[str, Any]:
+        return self.dispatcher.get_metrics()
         
     def _update_database_connection(self, connection_id: str):
-        mongo_client = self._get_database_connection()
-        if not mongo_client:
-            return
-        
-        try:
-            mongo_db = mongo_client["AWS_Webhook"]
-            mongo_collection = mongo_db["Webhook_Details"]
-            
-            data = {
-                "device_name": self.device_name,
-                "connection_id": connection_id,
-                "is_connected": bool(connection_id),
-                "last_updated": time.time()
-            }
-            
-            result = mongo_collection.update_one(
-                {"_id": self.device_name}, 
-                {"$set": data}, 
-                upsert=True
-            )
-            
-            self.logger.info(f"Database updated - Connection ID: {connection_id}")
-            
-        except Exception as e:
-            self.logger.error(f"Database update error: {e}")
-        finally:
-            mongo_client.close()
+        self.state_writer.submit(self.device_name, connection_id)
+        self.logger.info(f"Database update queued - Connection ID: {connection_id}")
             
     def _update_database_disconnect(self):
-        mongo_client = self._get_database_connection()
-        if not mongo_client:
-            return
-            
-        try:
-            mongo_db = mongo_client["AWS_Webhook"]
-            mongo_collection = mongo_db["Webhook_Details"]
-            
-            data = {
-                "device_name": self.device_name,
-                "connection_id": "",
-                "is_connected": False,
-                "last_updated": time.time()
-            }
-            
-            mongo_collection.update_one(
-                {"_id": self.device_name}, 
-                {"$set": data}, 
-                upsert=True
-            )
-            
-            self.logger.info("Database updated - Disconnected")
-            
-        except Exception as e:
-            self.logger.error(f"Database disconnect update error: {e}")
-        finally:
-            mongo_client.close()
+        self.state_writer.submit(self.device_name, "")
+        self.logger.info("Database update queued - Disconnected")
 
 
 class WebSocketClient:
@@ -390,24 +708,34 @@ class WebSocketClient:
     def reconnect(self):
         self.manager.send_command("reconnect")
         
-    def send_message(self, message: Dict[str, Any]):
-        self.manager.send_command("send_message", message)
+    def send_message(self, message: Dict[str, Any], callback: Optional[Callable[[bool, Optional[Exception]], None]]=None) -> str:
+        return self.manager.send_message(message, callback)
+        
+    def try_send_message(self, message: Dict[str, Any], callback: Optional[Callable[[bool, Optional[Exception]], None]]=None) -> str:
+        return self.manager.try_send_command("send_message", OutboundMessage(message, callback))
         
     def is_connected(self) -> bool:
         return self.manager.is_websocket_connected()
         
-    def add_status_listener(self, callback: Callable[[str, Any], None]):
-        self.manager.add_status_callback(callback)
+    def wait_for_state(self, state: Union[str, Iterable[str]], timeout: Optional[float]=None) -> bool:
+        return self.manager.wait_for_state(state, timeout)
+        
+    def add_status_listener(self, callback: Callable[[str, Any], None], events: Optional[Iterable[str]]=None,
+                            coalesce: Iterable[str]=(), loop: Optional[asyncio.AbstractEventLoop]=None) -> StatusSubscription:
+        return self.manager.add_status_callback(callback, events=events, coalesce=coalesce, loop=loop)
         
     def get_status(self) -> Dict[str, Any]:
         return self.manager.get_connection_status()
+        
+    def get_metrics(self) -> Dict[str, Any]:
+        return self.manager.get_metrics()
     
 _ws_manager: Optional[WebSocketManager] = None
 
 def get_websocket_manager() -> WebSocketManager:
     global _ws_manager
     if _ws_manager is None:
-        _ws_manager = WebSocketManager()
+        _ws_manager = WebSocketManager(spool_directory=os.path.join(script_dir, "outbound_spool"))
     return _ws_manager
 
 def websocket_run() -> bool:
@@ -426,6 +754,10 @@ def get_websocket_status() -> Dict[str, Any]:
     manager = get_websocket_manager()
     return manager.get_connection_status()
 
+def wait_for_websocket_state(state: Union[str, Iterable[str]], timeout: Optional[float]=None) -> bool:
+    manager = get_websocket_manager()
+    return manager.wait_for_state(state, timeout)
+
 def main():
     print("Starting robust WebSocket client...")
     
@@ -444,13 +776,13 @@ def main():
     
     while True:
         try:
-            status = websocket_client.get_status()
-            if not status["connected"]:
+            if websocket_client.wait_for_state(STATE_CONNECTED, timeout=30):
+                # Block until the connection leaves the connected state instead of polling
+                websocket_client.wait_for_state((STATE_DISCONNECTED, STATE_RECONNECTING, STATE_CIRCUIT_OPEN, STATE_STOPPED))
+            else:
                 print("Connection lost, attempting to reconnect...")
                 websocket_client.reconnect()
             
-            time.sleep(30)
-            
         except Exception as e:
             print(f"Error in monitoring loop: {e}")
             print("Continuing monitoring...")
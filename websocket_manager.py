@@ -3,11 +3,19 @@ import threading
 import json
 import logging
 import os
+import socket
+from message_router import MessageRouter
+from heartbeat import Heartbeat, ACTION_PING, ACTION_DEAD
+from timer_scheduler import get_timer_scheduler
+from logging_pipeline import setup_logging
+from connection_status import (
+    ConnectionStatus, StatusPublisher, STATE_CONNECTING, STATE_CONNECTED, STATE_DISCONNECTED, STATE_STOPPED
+)
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
 class WebSocketManager:
-    def __init__(self):
+    def __init__(self, log_level=logging.INFO, trace=False):
         self.lock = threading.Lock()
         self.is_running = False
         self.ws_instance = None
@@ -15,19 +23,24 @@ class WebSocketManager:
         self.device_name = "windows11"
         self.ws_url = "wss://15dcmwmsig.execute-api.ap-south-1.amazonaws.com/production/"
         
-        self.setup_logging()
+        self.heartbeat = Heartbeat()
+        self.scheduler = get_timer_scheduler()
+        self.heartbeat_timer = None
+        # Pings go out on this manager's own thread; the shared scheduler thread only requests them
+        self.ping_requested = threading.Event()
+        self.ping_thread = None
+        self.status = StatusPublisher(ConnectionStatus(device_name=self.device_name))
+        self.trace = trace
         
-    def setup_logging(self):
-        log_path = os.path.join(script_dir, "websocket_manager.log")
+        self.setup_logging(log_level)
+        
+        self.router = MessageRouter()
+        self.router.register("Save to Database", self.handle_save_to_database)
+        self.router.set_wildcard(self.handle_unhandled_message)
         
-        logging.basicConfig(
-            level=logging.DEBUG,
-            format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-            handlers=[
-                logging.FileHandler(log_path),
-                logging.StreamHandler()
-            ]
-        )
+    def setup_logging(self, level=logging.INFO):
+        log_path = os.path.join(script_dir, "websocket_manager.log")
+        setup_logging(log_path, level=level, compress=True)
         
         self.logger = logging.getLogger(__name__)
         
@@ -38,8 +51,13 @@ class WebSocketManager:
                 return True
             
             self.is_running = True
+            self.status.publish(running=True)
             self.logger.info("Starting WebSocketManager")
             
+            self.ping_requested.clear()
+            self.ping_thread = threading.Thread(target=self.ping_loop, name="websocket-ping", daemon=True)
+            self.ping_thread.start()
+            
         return self.connect_websocket()
     
     def stop_websocket(self):
@@ -54,7 +72,13 @@ class WebSocketManager:
         if self.ws_thread and self.ws_thread.is_alive():
             self.ws_thread.join(timeout=5)
             self.logger.info("WebSocket thread stopped")
+            
+        self.ping_requested.set()
+        if self.ping_thread and self.ping_thread.is_alive():
+            self.ping_thread.join(timeout=5)
+        self.ping_thread = None
 
+        self.status.publish(state=STATE_STOPPED, running=False, connection_id=None)
         self.logger.info("WebSocketManager stopped")
             
     def connect_websocket(self):
@@ -65,29 +89,39 @@ class WebSocketManager:
             
             try:
                 self.logger.info(f"Connecting to WebSocket: {self.ws_url}")
+                self.status.publish(state=STATE_CONNECTING)
                 
-                websocket.enableTrace(True)
+                if self.trace and not websocket.isEnabledForTrace():
+                    websocket.enableTrace(True, handler=logging.NullHandler())
                 
                 self.ws_instance = websocket.WebSocketApp(
                     self.ws_url,
                     on_open=self.on_open,
                     on_message=self.on_message,
                     on_error=self.on_error,
-                    on_close=self.on_close
+                    on_close=self.on_close,
+                    on_pong=self.on_pong
                 )
                 
-                self.ws_thread = threading.Thread(target=lambda: self.ws_instance.run_forever(ping_interval=80, ping_timeout=10), daemon=True)
+                self.ws_thread = threading.Thread(target=self.ws_instance.run_forever, daemon=True)
                 self.ws_thread.start()
                 
+                self.scheduler.cancel(self.heartbeat_timer)
+                self.heartbeat_timer = self.scheduler.call_every(self.heartbeat.tick_interval, self.ping_pong, name="heartbeat")
+                
                 self.logger.info("WebSocket connection thread started")
                 return True
             
             except Exception as e:
                 self.logger.error(f"Failed to start WebSocket connection: {e}")
+                self.status.publish(state=STATE_DISCONNECTED, last_error=str(e))
                 return False
             
     def disconnect_websocket(self):
         self.logger.info("Starting disconnect_websocket()")
+        self.scheduler.cancel(self.heartbeat_timer)
+        self.heartbeat_timer = None
+        
         if self.ws_instance and hasattr(self.ws_instance, "sock") and self.ws_instance.sock and self.ws_instance.sock.connected:
             self.logger.info("Sending unregister message before disconnecting WebSocket...")
             
@@ -110,37 +144,77 @@ class WebSocketManager:
                 self.ws_instance.close()
                 self.logger.info("Websocket Disconnected")
                 self.ws_instance = None
+                self.status.publish(state=STATE_DISCONNECTED, connection_id=None)
             except Exception as e:
                 self.logger.error(f"Error closing WebSocket: {e}")
 
     def ping_pong(self):
-        if self.ws_instance and hasattr(self.ws_instance, "sock") and self.ws_instance.sock and self.ws_instance.sock.connected:
-            pass
+        ws = self.ws_instance
+        if not (ws and ws.sock and ws.sock.connected):
+            return
+            
+        action = self.heartbeat.poll()
+        if action == ACTION_PING:
+            # ws.sock.ping() can block on a full send buffer, which would stall every shared timer
+            self.ping_requested.set()
+        elif action == ACTION_DEAD:
+            self.logger.warning("Peer stopped answering pings - reconnecting")
+            with self.lock:
+                self.ws_instance = None
+            ws.keep_running = False
+            try:
+                ws.sock.sock.shutdown(socket.SHUT_RDWR)
+            except (OSError, AttributeError) as e:
+                self.logger.error(f"Error shutting down dead socket: {e}")
+            if self.is_running:
+                self.scheduler.call_later(1, self.connect_websocket, name="reconnect")
+                    
+    def ping_loop(self):
+        while True:
+            self.ping_requested.wait()
+            self.ping_requested.clear()
+            if not self.is_running:
+                return
+            
+            ws = self.ws_instance
+            if not (ws and ws.sock and ws.sock.connected):
+                continue
+            try:
+                ws.sock.ping()
+                self.heartbeat.record_ping_sent()
+            except Exception as e:
+                self.logger.error(f"Error sending ping: {e}")
                     
     def is_websocket_connected(self) -> bool:
-        with self.lock:
-            return (self.ws_instance and
-                    hasattr(self.ws_instance, "sock") and
-                    self.ws_instance.sock and
-                    self.ws_instance.sock.connected)
+        return self.status.current.connected
             
     def get_connection_status(self):
-        with self.lock:
-            return {
-                "connected": self.is_websocket_connected(),
-                "running": self.is_running,
-                "device_name": self.device_name
-            }
+        return self.status.current.to_dict()
+        
+    def wait_for_state(self, state, timeout=None):
+        return self.status.wait_for_state(state, timeout)
+                    
+    def add_message_handler(self, message_type, handler):
+        self.router.register(message_type, handler)
+        
+    def add_action_handler(self, action, handler):
+        self.router.register_action(action, handler)
+        
+    def add_raw_message_handler(self, message_type, handler):
+        self.router.register_raw(message_type, handler)
                     
-    def handle_received_message(self, message_data):
-        if message_data.get("message") == "Save to Database":
-            connection_id = message_data.get("connection_id", "")
-            self.logger.info(f"Received connection ID: {connection_id}")
-        else:
-            self.logger.debug(f"Unhandled message type: {message_data}")
+    def handle_save_to_database(self, message_data):
+        connection_id = message_data.get("connection_id", "")
+        self.logger.info(f"Received connection ID: {connection_id}")
+        self.status.publish(connection_id=connection_id)
+        
+    def handle_unhandled_message(self, message_data):
+        self.logger.debug("Unhandled message type: %s", message_data)
                     
     def on_open(self, ws):
         self.logger.info("WebSocket connection opened")
+        self.heartbeat.reset()
+        self.status.publish(state=STATE_CONNECTED, last_error=None)
         
         registration_msg = {
             "action": "register_device",
@@ -156,16 +230,24 @@ class WebSocketManager:
             
     def on_message(self, ws, message):
         try:
-            self.logger.debug(f"Received message: {message}")
-            message_data = json.loads(message)
-            self.handle_received_message(message_data)
+            self.heartbeat.record_activity()
+            self.logger.debug("Received message: %s", message)
+            self.router.route_frame(message)
         except json.JSONDecodeError as e:
             self.logger.error(f"Invalid JSON message received: {e}")
         except Exception as e:
             self.logger.error(f"Error processing message: {e}")
             
+    def on_pong(self, ws, message):
+        rtt = self.heartbeat.record_pong()
+        if rtt is not None:
+            self.status.publish(last_rtt_ms=rtt * 1000)
+            self.logger.debug("Pong received - RTT %.1f ms", rtt * 1000)
+            
     def on_error(self, ws, error):
         self.logger.error(f"WebSocket error: {error}")
+        self.status.publish(last_error=str(error))
         
     def on_close(self, ws, close_status_code: int, close_msg: str):
-        self.logger.info(f"Websocket connection closed: {close_status_code} - {close_msg}")
\ No newline at end of file
+        self.logger.info(f"Websocket connection closed: {close_status_code} - {close_msg}")
+        self.status.publish(state=STATE_DISCONNECTED, connection_id=None)
\ No newline at end of file
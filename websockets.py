@@ -1,74 +1,453 @@
 import json
-import boto3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from connection_registry import create_connection_registry
+from connection_resolver import ConnectionResolver
+from compact_protocol import PROTOCOL_JSON, PROTOCOL_MSGPACK, negotiate_protocol, is_compact, encode_message, decode_message
 
-def websocket_handler(event, context):
-    if "requestContext" not in event:
-        print(f"Malformed event, missing requestContext: {json.dumps(event)}")
-        return {"statusCode": 400, "body": "Bad event structure: missing requestContext."}
-
-    route_key = event["requestContext"]["routeKey"]
-    connection_id = event["requestContext"]["connectionId"]
-    domain_name = event["requestContext"]["domainName"]
-    stage = event["requestContext"]["stage"]
+FANOUT_MAX_WORKERS = 32
 
-    print(f"connection id: {connection_id}\n route key: {route_key}")
+# Management API clients survive across warm invocations, one per endpoint
+_apigw_clients = {}
+_apigw_clients_lock = threading.Lock()
+apigw_client_factory = None
 
-    apigw_client = boto3.client(
+def _create_apigw_client(endpoint_url):
+    import boto3
+    from botocore.config import Config
+    # Fan-out threads share this client, so its HTTP pool must be as wide as the pool
+    return boto3.client(
         "apigatewaymanagementapi",
-        endpoint_url=f"https://{domain_name}/{stage}"
+        endpoint_url=endpoint_url,
+        config=Config(max_pool_connections=FANOUT_MAX_WORKERS)
     )
 
-    if route_key == "$connect":
-        print(f"New connection: {connection_id}")
-        return {"statusCode": 200}
+def get_apigw_client(domain_name, stage):
+    key = f"{domain_name}/{stage}"
+    client = _apigw_clients.get(key)
+    if client is None:
+        with _apigw_clients_lock:
+            client = _apigw_clients.get(key)
+            if client is None:
+                factory = apigw_client_factory or _create_apigw_client
+                client = factory(f"https://{key}")
+                _apigw_clients[key] = client
+    return client
+
+def clear_apigw_clients():
+    with _apigw_clients_lock:
+        _apigw_clients.clear()
+
+# Server-side device<->connection registry, selected by the CONNECTION_REGISTRY env var
+connection_registry = None
+_connection_registry_loaded = False
+
+def get_connection_registry():
+    global connection_registry, _connection_registry_loaded
+    if not _connection_registry_loaded:
+        if connection_registry is None:
+            connection_registry = create_connection_registry()
+        _connection_registry_loaded = True
+    return connection_registry
+
+# Other containers learn about disconnects only via TTL expiry or GoneException
+_connection_resolver = None
+
+def get_connection_resolver():
+    global _connection_resolver
+    registry = get_connection_registry()
+    if registry is None:
+        return None
+    if _connection_resolver is None or _connection_resolver.source is not registry:
+        _connection_resolver = ConnectionResolver(registry)
+    return _connection_resolver
+
+# Hooks for whichever store knows which device holds which connection, default to the registry
+device_connection_resolver = None
+connection_lister = None
+stale_connection_handler = None
+# Decides who may fan out; by default only connections that completed register_device
+fanout_authorizer = None
+
+_fanout_executor = None
+_fanout_executor_lock = threading.Lock()
+
+def _get_fanout_executor():
+    global _fanout_executor
+    if _fanout_executor is None:
+        with _fanout_executor_lock:
+            if _fanout_executor is None:
+                _fanout_executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix="fanout")
+    return _fanout_executor
+
+def _post_one(apigw_client, connection_id, data):
+    try:
+        apigw_client.post_to_connection(ConnectionId=connection_id, Data=data)
+        return "sent"
+    except apigw_client.exceptions.GoneException:
+        return "gone"
+    except Exception as e:
+        return f"error: {e}"
+
+def post_to_connections(apigw_client, connection_ids, payload):
+    # Serialized once, every target gets the same bytes
+    data = json.dumps(payload).encode("utf-8")
+    connection_ids = list(dict.fromkeys(connection_ids))
+
+    if len(connection_ids) == 1:
+        return {connection_ids[0]: _post_one(apigw_client, connection_ids[0], data)}
+
+    executor = _get_fanout_executor()
+    futures = {
+        connection_id: executor.submit(_post_one, apigw_client, connection_id, data)
+        for connection_id in connection_ids
+    }
+    return {connection_id: future.result() for connection_id, future in futures.items()}
+
+def authorize_fanout(request):
+    if fanout_authorizer is not None:
+        return fanout_authorizer(request)
+    registry = get_connection_registry()
+    return bool(registry and registry.get_devices([request.connection_id]))
+
+def resolve_fanout_targets(route_key, body, sender_id=None):
+    targets = {}
+    unresolved = []
+
+    registry = get_connection_registry()
+    connection_ids = body.get("connection_ids", [])
+    if connection_ids:
+        # Raw connection ids are only honoured for the caller itself or registered devices
+        known = registry.get_devices(connection_ids) if registry else {}
+        for target_id in connection_ids:
+            if target_id in known or target_id == sender_id:
+                targets[target_id] = known.get(target_id)
+            else:
+                unresolved.append(target_id)
+
+    connection_resolver = get_connection_resolver()
+    resolver = device_connection_resolver or (connection_resolver.resolve_many if connection_resolver else None)
+    lister = connection_lister or (registry.list_connections if registry else None)
+
+    device_names = body.get("device_names", [])
+    if device_names:
+        resolved = resolver(device_names) if resolver else {}
+        for device_name in device_names:
+            target_id = resolved.get(device_name)
+            if target_id:
+                targets[target_id] = device_name
+            else:
+                unresolved.append(device_name)
+
+    # Only a broadcast naming no targets at all goes to every device; explicit targets that
+    # fail to resolve must never widen into a global send
+    explicit = "connection_ids" in body or "device_names" in body
+    if route_key == "broadcast" and not explicit and lister:
+        for device_name, target_id in lister():
+            targets[target_id] = device_name
+
+    return targets, unresolved
+
+def handle_fanout(route_key, body, sender_id, domain_name, stage):
+    payload = body.get("data")
+    if payload is None:
+        return {"statusCode": 400, "body": json.dumps({"error": "Missing data"})}
+
+    targets, unresolved = resolve_fanout_targets(route_key, body, sender_id)
+    if not body.get("include_sender", False):
+        targets.pop(sender_id, None)
+
+    if not targets:
+        return {"statusCode": 404 if unresolved else 400,
+                "body": json.dumps({"error": "No target connections", "unresolved": unresolved})}
+
+    outcomes = post_to_connections(get_apigw_client(domain_name, stage), targets.keys(), payload)
+
+    results = []
+    stale = []
+    for target_id, outcome in outcomes.items():
+        results.append({"connection_id": target_id, "device_name": targets[target_id], "status": outcome})
+        if outcome == "gone":
+            stale.append(target_id)
+
+    if stale:
+        print(f"Stale connections: {len(stale)}")
+        connection_resolver = get_connection_resolver()
+        if connection_resolver:
+            connection_resolver.invalidate_connections(stale)
+
+        registry = get_connection_registry()
+        cleanup = stale_connection_handler or (registry.remove_connections if registry else None)
+        if cleanup:
+            try:
+                cleanup(stale)
+            except Exception as e:
+                print(f"Error cleaning up stale connections: {e}")
+
+    sent = sum(1 for result in results if result["status"] == "sent")
+    print(f"{route_key}: sent {sent}/{len(results)}")
+
+    return {"statusCode": 200, "body": json.dumps({
+        "sent": sent,
+        "stale": stale,
+        "unresolved": unresolved,
+        "results": results
+    })}
+
+def encode_data(payload, protocol=PROTOCOL_JSON):
+    return encode_message(payload, protocol).encode("utf-8")
+
+class LambdaRequest:
+    __slots__ = ("event", "context", "route_key", "connection_id", "domain_name", "stage", "protocol", "_body")
+
+    def __init__(self, event, context, route_key=None, body=None):
+        request_context = event["requestContext"]
+        self.event = event
+        self.context = context
+        self.route_key = route_key or request_context["routeKey"]
+        self.connection_id = request_context["connectionId"]
+        self.domain_name = request_context["domainName"]
+        self.stage = request_context["stage"]
+        # Compact MessagePack messages arrive as prefixed base64 text frames
+        raw_body = event.get("body")
+        self.protocol = PROTOCOL_MSGPACK if isinstance(raw_body, str) and is_compact(raw_body) else PROTOCOL_JSON
+        self._body = body
+
+    @property
+    def body(self):
+        # Parsed at most once, and only by routes that read it
+        if self._body is None:
+            try:
+                self._body = decode_message(self.event.get("body") or "{}")
+            except Exception:
+                self._body = {}
+            if not isinstance(self._body, dict):
+                self._body = {}
+        return self._body
 
-    elif route_key == "$disconnect":
-        print(f"Disconnected: {connection_id}")
+    @property
+    def apigw_client(self):
+        return get_apigw_client(self.domain_name, self.stage)
 
+
+class Route:
+    __slots__ = ("handler", "validator")
+
+    def __init__(self, handler, validator=None):
+        self.handler = handler
+        self.validator = validator
+
+
+ROUTES = {}
+middlewares = []
+_pipeline = None
+
+def route(*route_keys, schema=None):
+    validator = compile_validator(schema) if schema else None
+
+    def decorator(handler):
+        for route_key in route_keys:
+            ROUTES[route_key] = Route(handler, validator)
+        return handler
+    return decorator
+
+def compile_validator(schema):
+    # schema maps field -> type or (type, required); checks are bound once at import time
+    checks = []
+    for field, spec in schema.items():
+        expected, required = spec if isinstance(spec, tuple) else (spec, False)
+        checks.append((field, expected, required))
+
+    def validate(body):
+        for field, expected, required in checks:
+            if field not in body:
+                if required:
+                    return f"Missing field: {field}"
+            elif not isinstance(body[field], expected):
+                return f"Invalid field: {field}"
+        return None
+    return validate
+
+def response(status_code, body=None):
+    if body is None:
+        return {"statusCode": status_code}
+    return {"statusCode": status_code, "body": body if isinstance(body, str) else json.dumps(body)}
+
+def add_middleware(middleware):
+    global _pipeline
+    middlewares.append(middleware)
+    _pipeline = None
+
+def error_middleware(request, call_next):
+    try:
+        return call_next(request)
+    except Exception as e:
+        print(f"Error handling route {request.route_key}: {e}")
+        return response(500, {"error": "Internal error"})
+
+def timing_middleware(request, call_next):
+    started = time.perf_counter()
+    try:
+        return call_next(request)
+    finally:
+        print(f"route {request.route_key} took {(time.perf_counter() - started) * 1000:.2f} ms")
+
+def auth_middleware(authorize, routes=None):
+    def middleware(request, call_next):
+        if (routes is None or request.route_key in routes) and not authorize(request):
+            return response(403, {"error": "Forbidden"})
+        return call_next(request)
+    return middleware
+
+def dispatch(request):
+    entry = ROUTES.get(request.route_key)
+    if entry is None:
+        print(f"Unhandled route: {request.route_key}")
+        return response(200)
+
+    if entry.validator:
+        error = entry.validator(request.body)
+        if error:
+            return response(400, {"error": error})
+
+    return entry.handler(request)
+
+def _get_pipeline():
+    global _pipeline
+    if _pipeline is None:
+        pipeline = dispatch
+        for middleware in reversed([error_middleware] + middlewares):
+            pipeline = (lambda middleware, call_next: lambda request: middleware(request, call_next))(middleware, pipeline)
+        _pipeline = pipeline
+    return _pipeline
+
+def websocket_handler(event, context):
+    request_context = event.get("requestContext")
+    if not isinstance(request_context, dict) or "routeKey" not in request_context:
+        print(f"Malformed event, missing requestContext. Keys: {sorted(event)}")
+        return response(400, "Bad event structure: missing requestContext.")
+
+    request = LambdaRequest(event, context)
+    if request.protocol == PROTOCOL_MSGPACK and request.route_key == "$default":
+        # $request.body.action cannot be evaluated on a compact body, so API Gateway sends it to $default
+        action = request.body.get("action")
+        if isinstance(action, str) and action in ROUTES and not action.startswith("$"):
+            request.route_key = action
+    print(f"connection id: {request.connection_id}\n route key: {request.route_key}")
+    return _get_pipeline()(request)
+
+
+@route("$connect")
+def handle_connect(request):
+    print(f"New connection: {request.connection_id}")
+    registry = get_connection_registry()
+    if registry:
+        registry.record_connect(request.connection_id)
+    return response(200)
+
+@route("$disconnect")
+def handle_disconnect(request):
+    connection_id = request.connection_id
+    print(f"Disconnected: {connection_id}")
+
+    registry = get_connection_registry()
+    if registry:
+        # The socket is already gone, so there is nobody left to tell
+        device_name = registry.unregister_connection(connection_id)
+        get_connection_resolver().invalidate_connection(connection_id)
+        print(f"Unregistered device: {device_name}")
+        return response(200)
+
+    apigw_client = request.apigw_client
+    try:
+        apigw_client.post_to_connection(
+            ConnectionId=connection_id,
+            Data=json.dumps({
+                "message": "Remove from Database",
+                "connection_id": connection_id
+            }).encode("utf-8")
+        )
+
+    except apigw_client.exceptions.GoneException:
+        print(f"Connection {connection_id} is gone")
+    except Exception as e:
+        print(f"Error sending message: {e}")
+    return response(200)
+
+@route("$default")
+def handle_default(request):
+    return response(200)
+
+@route("register_device", schema={"message": str, "device_name": str, "protocols": list})
+def handle_register_device(request):
+    body = request.body
+    connection_id = request.connection_id
+
+    if body.get("message") == "Connection Established":
+        registered = False
+        registry = get_connection_registry()
+        if registry and body.get("device_name"):
+            registered = registry.register(body["device_name"], connection_id)
+            get_connection_resolver().prime(body["device_name"], connection_id)
+
+        reply = {
+            "message": "Save to Database",
+            "connection_id": connection_id,
+            "registered": registered
+        }
+        protocol = request.protocol
+        if "protocols" in body:
+            # The reply is already sent in the negotiated format, which is how the client learns it
+            protocol = negotiate_protocol(body["protocols"])
+            reply["protocol"] = protocol
+
+        apigw_client = request.apigw_client
         try:
-            apigw_client.post_to_connection(
-                ConnectionId=connection_id,
-                Data=json.dumps({
-                    "message": "Remove from Database",
-                    "connection_id": connection_id
-                }).encode("utf-8")
-            )
+            # registered tells the client the server already stored the mapping
+            apigw_client.post_to_connection(ConnectionId=connection_id, Data=encode_data(reply, protocol))
 
         except apigw_client.exceptions.GoneException:
             print(f"Connection {connection_id} is gone")
         except Exception as e:
             print(f"Error sending message: {e}")
-        return {"statusCode": 200}
+    return response(200)
 
-    elif route_key == "$default":
-        try:
-            body = json.loads(event.get("body", "{}"))
-        except json.JSONDecodeError:
-            body = {}
-        return {"statusCode": 200}
+@route("unregister_device")
+def handle_unregister_device(request):
+    registry = get_connection_registry()
+    if registry:
+        registry.unregister_connection(request.connection_id)
+        get_connection_resolver().invalidate_connection(request.connection_id)
+    return response(200)
 
-    elif route_key == "register_device":
-        try:
-            body = json.loads(event.get("body", "{}"))
-        except json.JSONDecodeError:
-            body = {}
+@route("broadcast", "send_to_devices", schema={
+    "data": (object, True),
+    "connection_ids": list,
+    "device_names": list,
+    "include_sender": bool
+})
+def handle_fanout_route(request):
+    # Enforced here rather than in opt-in middleware, so fan-out is never open by default
+    if not authorize_fanout(request):
+        return response(403, {"error": "Forbidden"})
+    return handle_fanout(request.route_key, request.body, request.connection_id, request.domain_name, request.stage)
 
-        if body.get("message") == "Connection Established":
-            try:
-                apigw_client.post_to_connection(
-                    ConnectionId=connection_id,
-                    Data=json.dumps({
-                        "message": "Save to Database",
-                        "connection_id": connection_id
-                    }).encode("utf-8")
-                )
-
-            except apigw_client.exceptions.GoneException:
-                print(f"Connection {connection_id} is gone")
-            except Exception as e:
-                print(f"Error sending message: {e}")
-        return {"statusCode": 200}
+@route("batch", schema={"messages": (list, True)})
+def handle_batch(request):
+    results = []
+    pipeline = _get_pipeline()
+    for message in request.body["messages"]:
+        action = message.get("action") if isinstance(message, dict) else None
+        # Lifecycle routes are only reachable from API Gateway itself, and batches do not nest
+        if not isinstance(message, dict) or (action is not None and (
+                not isinstance(action, str) or action == "batch" or action.startswith("$"))):
+            results.append(400)
+            continue
+
+        # Inner messages are already parsed, no need to round-trip them through json,
+        # but they pass through the same middleware (auth included) as top-level requests
+        inner = LambdaRequest(request.event, request.context, action or "$default", message)
+        results.append(pipeline(inner).get("statusCode", 200))
 
-    else:
-        print(f"Unhandled route: {route_key}")
-        return {"statusCode": 200}
\ No newline at end of file
+    return response(200, {"results": results})
@@ -0,0 +1,319 @@
+import asyncio
+import base64
+import hashlib
+import os
+import struct
+import zlib
+from urllib.parse import urlparse
+from typing import Optional, Dict, Any, List, Tuple
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+CLOSE_NORMAL = 1000
+CLOSE_GOING_AWAY = 1001
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_UNSUPPORTED_DATA = 1003
+CLOSE_INVALID_PAYLOAD = 1007
+CLOSE_MESSAGE_TOO_BIG = 1009
+
+DEFAULT_MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+PERMESSAGE_DEFLATE = "permessage-deflate"
+DEFAULT_COMPRESSION_THRESHOLD = 256
+DEFLATE_TAIL = b"\x00\x00\xff\xff"
+
+
+class WebSocketProtocolError(Exception):
+    pass
+
+
+def parse_ws_url(url: str) -> Tuple[str, int, str, bool]:
+    parsed = urlparse(url)
+    if parsed.scheme not in ("ws", "wss"):
+        raise WebSocketProtocolError(f"Unsupported WebSocket URL scheme: {parsed.scheme}")
+
+    use_ssl = parsed.scheme == "wss"
+    port = parsed.port or (443 if use_ssl else 80)
+    path = parsed.path or "/"
+    if parsed.query:
+        path = f"{path}?{parsed.query}"
+    return parsed.hostname, port, path, use_ssl
+
+
+def create_handshake_key() -> str:
+    return base64.b64encode(os.urandom(16)).decode("ascii")
+
+
+def compute_accept_key(key: str) -> str:
+    digest = hashlib.sha1((key + WS_GUID).encode("ascii")).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+def build_client_handshake(host: str, port: int, path: str, key: str,
+                           extra_headers: Optional[Dict[str, str]] = None) -> bytes:
+    host_header = host if port in (80, 443) else f"{host}:{port}"
+    lines = [
+        f"GET {path} HTTP/1.1",
+        f"Host: {host_header}",
+        "Upgrade: websocket",
+        "Connection: Upgrade",
+        f"Sec-WebSocket-Key: {key}",
+        "Sec-WebSocket-Version: 13"
+    ]
+    for name, value in (extra_headers or {}).items():
+        lines.append(f"{name}: {value}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("ascii")
+
+
+def build_server_handshake(key: str, extra_headers: Optional[Dict[str, str]] = None) -> bytes:
+    lines = [
+        "HTTP/1.1 101 Switching Protocols",
+        "Upgrade: websocket",
+        "Connection: Upgrade",
+        f"Sec-WebSocket-Accept: {compute_accept_key(key)}"
+    ]
+    for name, value in (extra_headers or {}).items():
+        lines.append(f"{name}: {value}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("ascii")
+
+
+def parse_http_head(raw: bytes) -> Tuple[str, Dict[str, str]]:
+    lines = raw.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return lines[0], headers
+
+
+def apply_mask(payload: bytes, mask: bytes) -> bytes:
+    length = len(payload)
+    if not length:
+        return payload
+
+    # XOR the whole payload as one big integer instead of byte by byte
+    key = (mask * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(length, "big")
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool, fin: bool = True, rsv1: bool = False) -> bytes:
+    first = (0x80 if fin else 0) | (0x40 if rsv1 else 0) | opcode
+    length = len(payload)
+    mask_bit = 0x80 if mask else 0
+
+    if length < 126:
+        header = struct.pack("!BB", first, mask_bit | length)
+    elif length < 65536:
+        header = struct.pack("!BBH", first, mask_bit | 126, length)
+    else:
+        header = struct.pack("!BBQ", first, mask_bit | 127, length)
+
+    if mask:
+        mask_key = os.urandom(4)
+        return header + mask_key + apply_mask(payload, mask_key)
+    return header + payload
+
+
+def encode_close_payload(code: int = CLOSE_NORMAL, reason: str = "") -> bytes:
+    return struct.pack("!H", code) + reason.encode("utf-8")
+
+
+def decode_close_payload(payload: bytes) -> Tuple[Optional[int], str]:
+    if len(payload) < 2:
+        return None, ""
+    return struct.unpack("!H", payload[:2])[0], payload[2:].decode("utf-8", errors="replace")
+
+
+def parse_extensions(header: Optional[str]) -> List[Tuple[str, Dict[str, Optional[str]]]]:
+    extensions = []
+    for extension in (header or "").split(","):
+        name, *params = [part.strip() for part in extension.split(";")]
+        if not name:
+            continue
+        parsed = {}
+        for param in params:
+            key, _, value = param.partition("=")
+            parsed[key.strip().lower()] = value.strip().strip('"') or None
+        extensions.append((name.lower(), parsed))
+    return extensions
+
+
+class PerMessageDeflate:
+    def __init__(self, is_client: bool = True, threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+                 context_takeover: bool = True, level: int = 6):
+        self.is_client = is_client
+        self.threshold = threshold
+        # Reusing the LZ77 window across messages compresses repetitive JSON far better, at ~32KB per direction
+        self.context_takeover = context_takeover
+        self.level = level
+
+        self.enabled = False
+        self.local_context_takeover = context_takeover
+        self.remote_context_takeover = True
+        self.local_window_bits = 15
+        self.compressor = None
+        self.decompressor = None
+
+        self.messages_compressed = 0
+        self.messages_skipped = 0
+        self.bytes_before_compression = 0
+        self.bytes_after_compression = 0
+        self.messages_decompressed = 0
+        self.bytes_before_decompression = 0
+        self.bytes_after_decompression = 0
+
+    def offer(self) -> str:
+        params = [PERMESSAGE_DEFLATE]
+        if not self.context_takeover:
+            params += ["client_no_context_takeover", "server_no_context_takeover"]
+        return "; ".join(params)
+
+    def accept_offer(self, header: Optional[str]) -> Optional[str]:
+        # Server side: accept the first offer whose parameters are understood, otherwise fall back to no compression
+        self.enabled = False
+        for name, params in parse_extensions(header):
+            if name != PERMESSAGE_DEFLATE:
+                continue
+            if set(params) - {"server_no_context_takeover", "client_no_context_takeover",
+                              "server_max_window_bits", "client_max_window_bits"}:
+                continue
+
+            server_bits = params.get("server_max_window_bits")
+            if server_bits is not None and not (server_bits.isdigit() and 9 <= int(server_bits) <= 15):
+                continue
+
+            response = [PERMESSAGE_DEFLATE]
+            self.local_context_takeover = self.context_takeover and "server_no_context_takeover" not in params
+            if not self.local_context_takeover:
+                response.append("server_no_context_takeover")
+            self.remote_context_takeover = "client_no_context_takeover" not in params
+            if not self.remote_context_takeover:
+                response.append("client_no_context_takeover")
+            self.local_window_bits = int(server_bits) if server_bits else 15
+            if server_bits:
+                response.append(f"server_max_window_bits={server_bits}")
+
+            self._reset()
+            return "; ".join(response)
+        return None
+
+    def accept_response(self, header: Optional[str]) -> bool:
+        # Client side: a missing header means the server declined and frames stay uncompressed
+        self.enabled = False
+        extensions = parse_extensions(header)
+        if not extensions:
+            return False
+        if len(extensions) != 1 or extensions[0][0] != PERMESSAGE_DEFLATE:
+            raise WebSocketProtocolError(f"Server negotiated unsupported extensions: {header}")
+
+        params = extensions[0][1]
+        # client_max_window_bits is never offered, so the server may not constrain our window
+        if set(params) - {"server_no_context_takeover", "client_no_context_takeover", "server_max_window_bits"}:
+            raise WebSocketProtocolError(f"Server returned unsupported permessage-deflate parameters: {header}")
+        server_bits = params.get("server_max_window_bits")
+        if server_bits is not None and not (server_bits.isdigit() and 8 <= int(server_bits) <= 15):
+            raise WebSocketProtocolError(f"Invalid permessage-deflate window bits: {header}")
+
+        self.local_context_takeover = self.context_takeover and "client_no_context_takeover" not in params
+        self.remote_context_takeover = "server_no_context_takeover" not in params
+        self.local_window_bits = 15
+
+        self._reset()
+        return True
+
+    def _reset(self):
+        self.enabled = True
+        self.compressor = self._new_compressor()
+        self.decompressor = self._new_decompressor()
+
+    def _new_compressor(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, -self.local_window_bits)
+
+    def _new_decompressor(self):
+        # A full-size window inflates streams produced with any smaller window
+        return zlib.decompressobj(-15)
+
+    def compress(self, payload: bytes) -> Tuple[bytes, bool]:
+        if not self.enabled or len(payload) < self.threshold:
+            self.messages_skipped += 1
+            return payload, False
+
+        if not self.local_context_takeover:
+            self.compressor = self._new_compressor()
+        data = self.compressor.compress(payload) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data.endswith(DEFLATE_TAIL):
+            data = data[:-4]
+
+        self.messages_compressed += 1
+        self.bytes_before_compression += len(payload)
+        self.bytes_after_compression += len(data)
+        return data, True
+
+    def decompress(self, payload: bytes, max_size: int = DEFAULT_MAX_FRAME_SIZE) -> bytes:
+        if not self.enabled:
+            raise WebSocketProtocolError("Compressed frame received without permessage-deflate")
+
+        if not self.remote_context_takeover:
+            self.decompressor = self._new_decompressor()
+        try:
+            data = self.decompressor.decompress(payload + DEFLATE_TAIL, max_size)
+        except zlib.error as e:
+            raise WebSocketProtocolError(f"Invalid compressed message: {e}")
+        if self.decompressor.unconsumed_tail:
+            raise WebSocketProtocolError(f"Decompressed message exceeds limit of {max_size}")
+
+        self.messages_decompressed += 1
+        self.bytes_before_decompression += len(payload)
+        self.bytes_after_decompression += len(data)
+        return data
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "context_takeover": self.local_context_takeover,
+            "messages_compressed": self.messages_compressed,
+            "messages_skipped": self.messages_skipped,
+            "bytes_before_compression": self.bytes_before_compression,
+            "bytes_after_compression": self.bytes_after_compression,
+            "compression_ratio": (self.bytes_after_compression / self.bytes_before_compression
+                                  if self.bytes_before_compression else 1.0),
+            "messages_decompressed": self.messages_decompressed,
+            "bytes_before_decompression": self.bytes_before_decompression,
+            "bytes_after_decompression": self.bytes_after_decompression,
+            "decompression_ratio": (self.bytes_before_decompression / self.bytes_after_decompression
+                                    if self.bytes_after_decompression else 1.0)
+        }
+
+
+async def read_frame(reader: asyncio.StreamReader, max_size: int = DEFAULT_MAX_FRAME_SIZE) -> Tuple[bool, int, bytes, bool]:
+    first, second = await reader.readexactly(2)
+    fin = bool(first & 0x80)
+    rsv1 = bool(first & 0x40)
+    opcode = first & 0x0F
+    masked = bool(second & 0x80)
+    length = second & 0x7F
+
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+
+    if length > max_size:
+        raise WebSocketProtocolError(f"Frame of {length} bytes exceeds limit of {max_size}")
+
+    mask_key = await reader.readexactly(4) if masked else None
+    payload = await reader.readexactly(length) if length else b""
+    if mask_key:
+        payload = apply_mask(payload, mask_key)
+
+    return fin, opcode, payload, rsv1